@@ -31,6 +31,7 @@ from neutron.agent.linux import external_process
 from neutron.agent.linux import interface
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import iptables_manager
+from neutron.agent.linux import netns_cleaner
 from neutron.agent.linux import ra
 from neutron.agent import rpc as agent_rpc
 from neutron.common import config as common_config
@@ -495,6 +496,10 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                     help=_("Allow running metadata proxy.")),
         cfg.BoolOpt('router_delete_namespaces', default=False,
                     help=_("Delete namespace after removing a router.")),
+        cfg.IntOpt('namespace_cleanup_workers',
+                   default=netns_cleaner.DEFAULT_WORKERS,
+                   help=_("Number of stale router namespaces destroyed "
+                          "concurrently when the agent starts.")),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
@@ -627,26 +632,28 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         The argumenet router_namespaces is a list of stale router namespaces
 
         As some stale router namespaces may not be able to be deleted, only
-        one attempt will be made to delete them.
+        one attempt will be made to delete them. They are destroyed
+        concurrently, each one with a single listing of its devices.
         """
-        for ns in router_namespaces:
+        def destroy(ns, devices):
             ra.disable_ipv6_ra(ns[len(NS_PREFIX):], ns, self.root_helper)
-            try:
-                self._destroy_namespace(ns)
-            except RuntimeError:
-                LOG.exception(_('Failed to destroy stale router namespace '
-                                '%s'), ns)
+            self._destroy_namespace(ns, devices)
+
+        cleaner = netns_cleaner.NamespaceCleaner(
+            self.root_helper, destroy,
+            workers=self.conf.namespace_cleanup_workers)
+        cleaner.clean(router_namespaces)
         self._clean_stale_namespaces = False
 
-    def _destroy_namespace(self, ns):
+    def _destroy_namespace(self, ns, devices=None):
         if ns.startswith(NS_PREFIX):
             if self.conf.enable_metadata_proxy:
                 self._destroy_metadata_proxy(ns[len(NS_PREFIX):], ns)
-            self._destroy_router_namespace(ns)
+            self._destroy_router_namespace(ns, devices)
         elif ns.startswith(FIP_NS_PREFIX):
-            self._destroy_fip_namespace(ns)
+            self._destroy_fip_namespace(ns, devices)
         elif ns.startswith(SNAT_NS_PREFIX):
-            self._destroy_snat_namespace(ns)
+            self._destroy_snat_namespace(ns, devices)
 
     def _delete_namespace(self, ns_ip, ns):
         try:
@@ -655,10 +662,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             msg = _('Failed trying to delete namespace: %s') % ns
             LOG.exception(msg)
 
-    def _destroy_snat_namespace(self, ns):
+    def _destroy_snat_namespace(self, ns, devices=None):
         ns_ip = ip_lib.IPWrapper(self.root_helper, namespace=ns)
+        if devices is None:
+            devices = ns_ip.get_devices(exclude_loopback=True)
         # delete internal interfaces
-        for d in ns_ip.get_devices(exclude_loopback=True):
+        for d in devices:
             if d.name.startswith(SNAT_INT_DEV_PREFIX):
                 LOG.debug('Unplugging DVR device %s', d.name)
                 self.driver.unplug(d.name, namespace=ns,
@@ -669,9 +678,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         if self.conf.router_delete_namespaces:
             self._delete_namespace(ns_ip, ns)
 
-    def _destroy_fip_namespace(self, ns):
+    def _destroy_fip_namespace(self, ns, devices=None):
         ns_ip = ip_lib.IPWrapper(self.root_helper, namespace=ns)
-        for d in ns_ip.get_devices(exclude_loopback=True):
+        if devices is None:
+            devices = ns_ip.get_devices(exclude_loopback=True)
+        for d in devices:
             if d.name.startswith(FIP_2_ROUTER_DEV_PREFIX):
                 # internal link between IRs and FIP NS
                 ns_ip.del_veth(d.name)
@@ -689,9 +700,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             self._delete_namespace(ns_ip, ns)
         self.agent_gateway_port = None
 
-    def _destroy_router_namespace(self, ns):
+    def _destroy_router_namespace(self, ns, devices=None):
         ns_ip = ip_lib.IPWrapper(self.root_helper, namespace=ns)
-        for d in ns_ip.get_devices(exclude_loopback=True):
+        if devices is None:
+            devices = ns_ip.get_devices(exclude_loopback=True)
+        for d in devices:
             if d.name.startswith(INTERNAL_DEV_PREFIX):
                 # device is on default bridge
                 self.driver.unplug(d.name, namespace=ns,
@@ -1916,7 +1929,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         eventlet.spawn_n(self._process_routers_loop)
         LOG.info(_("L3 agent started"))
 
-    def _update_routing_table(self, ri, operation, route):
+    def _update_routing_table(self, ri, operation, route, batch=None):
+        if batch is not None:
+            batch.add('route', operation, 'to', route['destination'],
+                      'via', route['nexthop'])
+            return
         cmd = ['ip', 'route', operation, 'to', route['destination'],
                'via', route['nexthop']]
         ip_wrapper = ip_lib.IPWrapper(self.root_helper,
@@ -1932,17 +1949,21 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         old_routes = ri.routes
         adds, removes = common_utils.diff_list_of_dict(old_routes,
                                                        new_routes)
-        for route in adds:
-            LOG.debug(_("Added route entry is '%s'"), route)
-            # remove replaced route from deleted route
-            for del_route in removes:
-                if route['destination'] == del_route['destination']:
-                    removes.remove(del_route)
-            #replace success even if there is no existing route
-            self._update_routing_table(ri, 'replace', route)
-        for route in removes:
-            LOG.debug(_("Removed route entry is '%s'"), route)
-            self._update_routing_table(ri, 'delete', route)
+        ip_wrapper = ip_lib.IPWrapper(self.root_helper, namespace=ri.ns_name)
+        # Apply all the route changes with one ip process, failures are
+        # ignored as they were when running one command per route.
+        with ip_wrapper.batch(check_exit_code=False) as batch:
+            for route in adds:
+                LOG.debug(_("Added route entry is '%s'"), route)
+                # remove replaced route from deleted route
+                for del_route in removes:
+                    if route['destination'] == del_route['destination']:
+                        removes.remove(del_route)
+                #replace success even if there is no existing route
+                self._update_routing_table(ri, 'replace', route, batch)
+            for route in removes:
+                LOG.debug(_("Removed route entry is '%s'"), route)
+                self._update_routing_table(ri, 'delete', route, batch)
         ri.routes = new_routes
 
     def _update_portforwardings(self, ri, operation, portfwd):
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import re
+
 import netaddr
 from oslo.config import cfg
 
@@ -34,6 +37,9 @@ VLAN_INTERFACE_DETAIL = ['vlan protocol 802.1q',
                          'vlan protocol 802.1Q',
                          'vlan id']
 
+# ip -batch reports each failed line as "Command failed <file>:<line>"
+BATCH_FAILURE_RE = re.compile(r'^Command failed .*:(\d+)$')
+
 
 class SubProcessBase(object):
     def __init__(self, root_helper=None, namespace=None,
@@ -121,6 +127,17 @@ class IPWrapper(SubProcessBase):
                                        self.namespace))
         return retval
 
+    @contextlib.contextmanager
+    def batch(self, check_exit_code=True):
+        """Queue ip commands and run them with a single ip -batch process.
+
+        Commands issued through the devices of the yielded IpBatch are run
+        when the block exits, and dropped if it raises.
+        """
+        batch = IpBatch(self, check_exit_code=check_exit_code)
+        yield batch
+        batch.flush()
+
     def add_tuntap(self, name, mode='tap'):
         self._as_root('', 'tuntap', ('add', name, 'mode', mode))
         return IPDevice(name, self.root_helper, self.namespace)
@@ -357,30 +374,33 @@ class IpAddrCommand(IpDeviceCommandBase):
             line = line.strip()
             if not line.startswith('inet'):
                 continue
-            parts = line.split()
-            if parts[0] == 'inet6':
-                version = 6
-                scope = parts[3]
-                broadcast = '::'
-            else:
-                version = 4
-                if parts[2] == 'brd':
-                    broadcast = parts[3]
-                    scope = parts[5]
-                else:
-                    # sometimes output of 'ip a' might look like:
-                    # inet 192.168.100.100/24 scope global eth0
-                    # and broadcast needs to be calculated from CIDR
-                    broadcast = str(netaddr.IPNetwork(parts[1]).broadcast)
-                    scope = parts[3]
-
-            retval.append(dict(cidr=parts[1],
-                               broadcast=broadcast,
-                               scope=scope,
-                               ip_version=version,
-                               dynamic=('dynamic' == parts[-1])))
+            retval.append(self._parse_inet(line.split()))
         return retval
 
+    @staticmethod
+    def _parse_inet(parts):
+        if parts[0] == 'inet6':
+            version = 6
+            scope = parts[3]
+            broadcast = '::'
+        else:
+            version = 4
+            if parts[2] == 'brd':
+                broadcast = parts[3]
+                scope = parts[5]
+            else:
+                # sometimes output of 'ip a' might look like:
+                # inet 192.168.100.100/24 scope global eth0
+                # and broadcast needs to be calculated from CIDR
+                broadcast = str(netaddr.IPNetwork(parts[1]).broadcast)
+                scope = parts[3]
+
+        return dict(cidr=parts[1],
+                    broadcast=broadcast,
+                    scope=scope,
+                    ip_version=version,
+                    dynamic=('dynamic' == parts[-1]))
+
 
 class IpRouteCommand(IpDeviceCommandBase):
     COMMAND = 'route'
@@ -533,7 +553,8 @@ class IpNetnsCommand(IpCommandBase):
         self._as_root('delete', name, use_root_namespace=True)
 
     def execute(self, cmds, addl_env={}, check_exit_code=True,
-                extra_ok_codes=None):
+                extra_ok_codes=None, process_input=None,
+                return_stderr=False):
         ns_params = []
         if self._parent.namespace:
             if not self._parent.root_helper:
@@ -547,7 +568,8 @@ class IpNetnsCommand(IpCommandBase):
         return utils.execute(
             ns_params + env_params + list(cmds),
             root_helper=self._parent.root_helper,
-            check_exit_code=check_exit_code, extra_ok_codes=extra_ok_codes)
+            check_exit_code=check_exit_code, extra_ok_codes=extra_ok_codes,
+            process_input=process_input, return_stderr=return_stderr)
 
     def exists(self, name):
         output = self._parent._execute('o', 'netns', ['list'])
@@ -558,6 +580,202 @@ class IpNetnsCommand(IpCommandBase):
         return False
 
 
+class IpBatch(object):
+    """ip commands of a namespace run together by one ip -batch process.
+
+    Obtained from IPWrapper.batch(). The devices returned by device() queue
+    their link, addr, route and neigh changes instead of running them, and
+    serve address listings from a snapshot of the namespace loaded once.
+    The snapshot follows the queued address and link changes.
+
+    Every queued line is run even if some fail. The failed ones are kept in
+    failures as (line, error) and raised with IpBatchCommandFailed unless
+    check_exit_code is False. When the ip process fails as a whole, e.g.
+    the namespace is missing, all the lines are failures. A failure to
+    load the snapshot raises RuntimeError like any other read.
+    """
+
+    def __init__(self, wrapper, check_exit_code=True):
+        self.wrapper = wrapper
+        self.namespace = wrapper.namespace
+        self.check_exit_code = check_exit_code
+        self.lines = []
+        self.failures = []
+        self._queued = []
+        self._devices = None
+        self._addresses = None
+        self._routes = None
+
+    def device(self, name):
+        return IpBatchDevice(name, self)
+
+    def add(self, command, *args):
+        """Queue a raw ip command, e.g. add('route', 'prepend', ...)."""
+        args = [str(arg) for arg in args]
+        self.lines.append(' '.join([command] + args))
+        self._queued.append((command, args))
+        if self._devices is not None:
+            self._track(command, args)
+
+    def _execute(self, lines, options, extra_ok_codes=None):
+        return self.wrapper.netns.execute(
+            ['ip'] + options + ['-batch', '-'],
+            process_input='\n'.join(lines) + '\n',
+            extra_ok_codes=extra_ok_codes, return_stderr=True)
+
+    def flush(self):
+        """Run the queued commands, returns the list of failures."""
+        lines, self.lines = self.lines, []
+        self._queued = []
+        if not lines:
+            return []
+        # ip exits with 1 when some lines failed, any other code means
+        # that the batch couldn't run, e.g. the namespace is missing.
+        try:
+            _stdout, stderr = self._execute(lines, ['-force'],
+                                            extra_ok_codes=[1])
+        except RuntimeError as e:
+            stderr = None
+            error = [str(e).strip()]
+        else:
+            error = []
+
+        failures = []
+        for line in (stderr or '').splitlines():
+            match = BATCH_FAILURE_RE.match(line.strip())
+            if match:
+                failures.append((lines[int(match.group(1)) - 1],
+                                 ' '.join(error)))
+                error = []
+            elif line.strip():
+                error.append(line.strip())
+        if error and not failures:
+            # None of the lines could be run
+            errors = ' '.join(error)
+            failures = [(line, errors) for line in lines]
+        else:
+            errors = '; '.join('%s: %s' % failure for failure in failures)
+
+        self.failures.extend(failures)
+        if failures and self.check_exit_code:
+            raise exceptions.IpBatchCommandFailed(namespace=self.namespace,
+                                                  errors=errors)
+        return failures
+
+    def _load_snapshot(self):
+        stdout, _stderr = self._execute(
+            ['link show', 'addr show', 'route show'], ['-oneline'])
+        self._devices = []
+        self._addresses = {}
+        self._routes = []
+        for line in stdout.splitlines():
+            # Drop the lifetimes continuation of -oneline addresses
+            parts = line.partition('\\')[0].split()
+            if not parts:
+                continue
+            if parts[0].endswith(':') and parts[1].endswith(':'):
+                # 2: tap0@if7: <BROADCAST,MULTICAST,UP> mtu 1500 ...
+                self._devices.append(parts[1][:-1].partition('@')[0])
+            elif parts[0].endswith(':'):
+                # 2: tap0    inet 10.0.0.2/24 brd 10.0.0.255 scope global
+                if parts[2] in ('inet', 'inet6'):
+                    self._addresses.setdefault(parts[1], []).append(
+                        IpAddrCommand._parse_inet(parts[2:]))
+            else:
+                route = {'destination': parts[0], 'via': None, 'dev': None}
+                for key in ('via', 'dev'):
+                    if key in parts[:-1]:
+                        route[key] = parts[parts.index(key) + 1]
+                self._routes.append(route)
+        for command, args in self._queued:
+            self._track(command, args)
+
+    def _track(self, command, args):
+        # Keep the snapshot in line with the queued changes
+        if command == 'addr' and 'dev' in args:
+            addresses = self._addresses.setdefault(
+                args[args.index('dev') + 1], [])
+            if args[0] == 'add':
+                net = netaddr.IPNetwork(args[1])
+                addresses.append(dict(cidr=args[1],
+                                      broadcast=str(net.broadcast),
+                                      scope=(args[args.index('scope') + 1]
+                                             if 'scope' in args
+                                             else 'global'),
+                                      ip_version=net.version,
+                                      dynamic=False))
+            elif args[0] in ('del', 'delete'):
+                addresses[:] = [addr for addr in addresses
+                                if addr['cidr'] != args[1]]
+        elif command == 'addr' and args[0] == 'flush':
+            self._addresses.pop(args[1], None)
+        elif command == 'link' and args[0] in ('del', 'delete'):
+            if args[1] in self._devices:
+                self._devices.remove(args[1])
+            self._addresses.pop(args[1], None)
+
+    def get_devices(self, exclude_loopback=False):
+        """Get the device names of the namespace from the snapshot."""
+        if self._devices is None:
+            self._load_snapshot()
+        return [name for name in self._devices
+                if not (exclude_loopback and name == LOOPBACK_DEVNAME)]
+
+    def get_addresses(self, name):
+        """Get the addresses of a device, as IpAddrCommand.list does."""
+        if self._devices is None:
+            self._load_snapshot()
+        return list(self._addresses.get(name, []))
+
+    def get_routes(self):
+        """Get the main table routes of the namespace as dicts with
+        destination, via and dev keys, from the snapshot.
+        """
+        if self._devices is None:
+            self._load_snapshot()
+        return list(self._routes)
+
+
+class IpBatchDevice(IPDevice):
+    """An IPDevice whose changes are queued in an IpBatch."""
+
+    # The address family options are implied by the addresses given in
+    # the commands, others can't be passed to a single batch line.
+    BATCH_OPTIONS = (4, 6, '4', '6')
+
+    def __init__(self, name, batch):
+        super(IpBatchDevice, self).__init__(name, batch.wrapper.root_helper,
+                                            batch.namespace)
+        self.batch = batch
+        self.addr = IpBatchAddrCommand(self)
+
+    def _as_root(self, options, command, args, use_root_namespace=False):
+        if use_root_namespace or [option for option in options
+                                  if option not in self.BATCH_OPTIONS]:
+            return super(IpBatchDevice, self)._as_root(options, command,
+                                                       args,
+                                                       use_root_namespace)
+        self.batch.add(command, *args)
+
+    def _run(self, options, command, args):
+        # Reads can't wait for the batch, they run at once in the namespace
+        # and don't see the changes still queued.
+        if self.namespace:
+            return super(IpBatchDevice, self)._as_root(options, command, args)
+        return super(IpBatchDevice, self)._run(options, command, args)
+
+
+class IpBatchAddrCommand(IpAddrCommand):
+
+    def list(self, scope=None, to=None, filters=None):
+        if to or [f for f in filters or [] if f != 'permanent']:
+            return super(IpBatchAddrCommand, self).list(scope, to, filters)
+        permanent = 'permanent' in (filters or [])
+        return [addr for addr in self._parent.batch.get_addresses(self.name)
+                if (not scope or addr['scope'] == scope) and
+                not (permanent and addr['dynamic'])]
+
+
 def device_exists(device_name, root_helper=None, namespace=None):
     """Return True if the device exists in the namespace."""
     try:
@@ -58,6 +58,21 @@ def get_chain_name(chain_name, wrap=True):
         return chain_name[:MAX_CHAIN_LEN_NOWRAP]
 
 
+def _get_line_key(line):
+    """Return the normalized text of an iptables-save chain or rule line.
+
+    Chains are keyed by ':<name>' and rules by their '-A ...' text, so
+    that [packet:byte] counters and chain policies are ignored. Any other
+    line (table header, COMMIT, comments) has no key.
+    """
+    if line.startswith(':'):
+        return line.split(' ', 1)[0]
+    elif line.startswith('['):
+        return line.split('] ', 1)[-1].strip()
+    elif line.startswith('-A '):
+        return line
+
+
 class IptablesRule(object):
     """An iptables rule.
 
@@ -102,6 +117,25 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # Change tracking used by IptablesManager to restore only what
+        # changed since the last successful apply. Wrapped chains are ours
+        # alone and can be replaced one by one; any other change (unwrapped
+        # or built-in chains, chain removal) requires rewriting the table.
+        self.dirty_chains = set()
+        self.flush_needed = True
+
+    def _mark_chain_dirty(self, name, wrap):
+        if wrap:
+            self.dirty_chains.add('%s-%s' % (self.wrap_name, name))
+        else:
+            self.flush_needed = True
+
+    def is_dirty(self):
+        return self.flush_needed or bool(self.dirty_chains)
+
+    def clear_dirty(self):
+        self.dirty_chains.clear()
+        self.flush_needed = False
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -116,10 +150,10 @@ class IptablesTable(object):
 
         """
         name = get_chain_name(name, wrap)
-        if wrap:
-            self.chains.add(name)
-        else:
-            self.unwrapped_chains.add(name)
+        chain_set = self._select_chain_set(wrap)
+        if name not in chain_set:
+            chain_set.add(name)
+            self._mark_chain_dirty(name, wrap)
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -158,6 +192,7 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self.flush_needed = True
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -203,6 +238,7 @@ class IptablesTable(object):
 
         self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name,
                                        tag))
+        self._mark_chain_dirty(chain, wrap)
 
     def _wrap_target_chain(self, s, wrap):
         if s.startswith('$'):
@@ -226,6 +262,7 @@ class IptablesTable(object):
 
             self.rules.remove(IptablesRule(chain, rule, wrap, top,
                                            self.wrap_name))
+            self._mark_chain_dirty(chain, wrap)
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
                                                       self.wrap_name))
@@ -248,6 +285,8 @@ class IptablesTable(object):
         chained_rules = self._get_chain_rules(chain, wrap)
         for rule in chained_rules:
             self.rules.remove(rule)
+        if chained_rules:
+            self._mark_chain_dirty(get_chain_name(chain, wrap), wrap)
 
     def clear_rules_by_tag(self, tag):
         if not tag:
@@ -255,6 +294,7 @@ class IptablesTable(object):
         rules = [rule for rule in self.rules if rule.tag == tag]
         for rule in rules:
             self.rules.remove(rule)
+            self._mark_chain_dirty(rule.chain, rule.wrap)
 
 
 class IptablesManager(object):
@@ -397,32 +437,59 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        Only the tables changed since the last successful apply are saved
+        and restored. When every change is confined to our own wrapped
+        chains, only those chains are replaced using --noflush.
+
         """
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
+            # Traverse tables in sorted order for predictable dump output
+            dirty_tables = [table_name for table_name in sorted(tables)
+                            if tables[table_name].is_dirty()]
+            if not dirty_tables:
+                LOG.debug(_('No %s tables changed, skipping restore'), cmd)
+                continue
+            noflush = not any(tables[table_name].flush_needed
+                              for table_name in dirty_tables)
+
             args = ['%s-save' % (cmd,), '-c']
+            if len(dirty_tables) == 1:
+                args += ['-t', dirty_tables[0]]
             if self.namespace:
                 args = ['ip', 'netns', 'exec', self.namespace] + args
             all_tables = self.execute(args, root_helper=self.root_helper)
             all_lines = all_tables.split('\n')
-            # Traverse tables in sorted order for predictable dump output
-            for table_name in sorted(tables):
+            new_lines = []
+            for table_name in dirty_tables:
                 table = tables[table_name]
                 start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
+                table_lines = self._modify_rules(
                     all_lines[start:end], table, table_name)
+                if noflush:
+                    table_lines = self._select_dirty_chains(table_lines,
+                                                            table)
+                new_lines += table_lines
 
             args = ['%s-restore' % (cmd,), '-c']
+            if noflush:
+                args.append('--noflush')
             if self.namespace:
                 args = ['ip', 'netns', 'exec', self.namespace] + args
             try:
-                self.execute(args, process_input='\n'.join(all_lines),
+                self.execute(args, process_input='\n'.join(new_lines),
                              root_helper=self.root_helper)
             except RuntimeError as r_error:
                 with excutils.save_and_reraise_exception():
+                    # The kernel state is unknown, e.g. it was wiped by an
+                    # iptables service restart, rewrite the tables fully
+                    # on the next apply instead of resending the same
+                    # partial restore
+                    for table_name in dirty_tables:
+                        tables[table_name].flush_needed = True
                     try:
                         line_no = int(re.search(
                             'iptables-restore: line ([0-9]+?) failed',
@@ -433,17 +500,38 @@ class IptablesManager(object):
                     except AttributeError:
                         # line error wasn't found, print all lines instead
                         log_start = 0
-                        log_end = len(all_lines)
+                        log_end = len(new_lines)
                     log_lines = ('%7d. %s' % (idx, l)
                                  for idx, l in enumerate(
-                                     all_lines[log_start:log_end],
+                                     new_lines[log_start:log_end],
                                      log_start + 1)
                                  )
                     LOG.error(_("IPTablesManager.apply failed to apply the "
                                 "following set of iptables rules:\n%s"),
                               '\n'.join(log_lines))
+            for table_name in dirty_tables:
+                tables[table_name].clear_dirty()
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _select_dirty_chains(self, lines, table):
+        """Keep only the declarations and rules of the changed chains.
+
+        With --noflush, iptables-restore flushes every user-defined chain
+        that is declared, so the chains that did not change are left out.
+        """
+        selected = []
+        for line in lines:
+            key = _get_line_key(line)
+            if key:
+                if key.startswith(':'):
+                    chain = key[1:]
+                else:
+                    chain = key.split(' ', 2)[1]
+                if chain not in table.dirty_chains:
+                    continue
+            selected.append(line)
+        return selected
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -473,13 +561,6 @@ class IptablesManager(object):
 
         return rules_index
 
-    def _find_last_entry(self, filter_list, match_str):
-        # find a matching entry, starting from the bottom
-        for s in reversed(filter_list):
-            s = s.strip()
-            if match_str in s:
-                return s
-
     def _modify_rules(self, current_lines, table, table_name):
         # Chains are stored as sets to avoid duplicates.
         # Sort the output chains here to make their order predictable.
@@ -495,149 +576,85 @@ class IptablesManager(object):
                           '# Completed by iptables_manager']
             current_lines = fake_table
 
-        # Fill old_filter with any chains or rules we might have added,
-        # they could have a [packet:byte] count we want to preserve.
-        # Fill new_filter with any chains or rules without our name in them.
-        old_filter, new_filter = [], []
+        # Index every chain and rule of the saved table by its normalized
+        # text in a single pass. Lines carrying our wrap name go to
+        # old_index, anything else to new_index; the last occurrence wins
+        # since it could have a [packet:byte] count we want to preserve.
+        old_index, new_index = {}, {}
+        new_filter = []
         for line in current_lines:
-            (old_filter if self.wrap_name in line else
-             new_filter).append(line.strip())
-
-        rules_index = self._find_rules_index(new_filter)
-
-        all_chains = [':%s' % name for name in unwrapped_chains]
-        all_chains += [':%s-%s' % (self.wrap_name, name) for name in chains]
-
-        # Iterate through all the chains, trying to find an existing
-        # match.
-        our_chains = []
-        for chain in all_chains:
-            chain_str = str(chain).strip()
-
-            old = self._find_last_entry(old_filter, chain_str)
-            if not old:
-                dup = self._find_last_entry(new_filter, chain_str)
-            new_filter = [s for s in new_filter if chain_str not in s.strip()]
-
-            # if no old or duplicates, use original chain
-            if old or dup:
-                chain_str = str(old or dup)
+            line = line.strip()
+            key = _get_line_key(line)
+            if self.wrap_name in line:
+                if key:
+                    old_index[key] = line
             else:
-                # add-on the [packet:bytes]
-                chain_str += ' - [0:0]'
+                if key:
+                    new_index[key] = line
+                new_filter.append(line)
 
-            our_chains += [chain_str]
+        # Pick up the saved line (and so its counters) for every chain and
+        # rule we own, or start it with a zero count.
+        our_keys = set()
+        our_chains = []
+        for name in unwrapped_chains:
+            key = ':' + name
+            our_keys.add(key)
+            our_chains.append(new_index.get(key) or
+                              old_index.get(key) or
+                              '%s - [0:0]' % key)
+        for name in chains:
+            key = ':%s-%s' % (self.wrap_name, name)
+            our_keys.add(key)
+            our_chains.append(old_index.get(key) or
+                              new_index.get(key) or
+                              '%s - [0:0]' % key)
 
-        # Iterate through all the rules, trying to find an existing
-        # match.
         our_rules = []
         bot_rules = []
         for rule in rules:
-            rule_str = str(rule).strip()
-            # Further down, we weed out duplicates from the bottom of the
-            # list, so here we remove the dupes ahead of time.
-
-            old = self._find_last_entry(old_filter, rule_str)
-            if not old:
-                dup = self._find_last_entry(new_filter, rule_str)
-            new_filter = [s for s in new_filter if rule_str not in s.strip()]
-
-            # if no old or duplicates, use original rule
-            if old or dup:
-                rule_str = str(old or dup)
-                # backup one index so we write the array correctly
-                if not old:
-                    rules_index -= 1
-            else:
-                # add-on the [packet:bytes]
-                rule_str = '[0:0] ' + rule_str
-
+            key = str(rule).strip()
+            our_keys.add(key)
+            rule_str = (old_index.get(key) or new_index.get(key) or
+                        '[0:0] ' + key)
             if rule.top:
                 # rule.top == True means we want this rule to be at the top.
-                our_rules += [rule_str]
+                our_rules.append(rule_str)
             else:
-                bot_rules += [rule_str]
+                bot_rules.append(rule_str)
 
         our_rules += bot_rules
 
-        new_filter[rules_index:rules_index] = our_rules
-        new_filter[rules_index:rules_index] = our_chains
-
-        def _strip_packets_bytes(line):
-            # strip any [packet:byte] counts at start or end of lines
-            if line.startswith(':'):
-                # it's a chain, for example, ":neutron-billing - [0:0]"
-                line = line.split(':')[1]
-                line = line.split(' - [', 1)[0]
-            elif line.startswith('['):
-                # it's a rule, for example, "[0:0] -A neutron-billing..."
-                line = line.split('] ', 1)[1]
-            line = line.strip()
-            return line
-
-        seen_chains = set()
-
-        def _weed_out_duplicate_chains(line):
-            # ignore [packet:byte] counts at end of lines
-            if line.startswith(':'):
-                line = _strip_packets_bytes(line)
-                if line in seen_chains:
-                    return False
-                else:
-                    seen_chains.add(line)
-
-            # Leave it alone
-            return True
-
-        seen_rules = set()
-
-        def _weed_out_duplicate_rules(line):
-            if line.startswith('['):
-                line = _strip_packets_bytes(line)
-                if line in seen_rules:
-                    return False
-                else:
-                    seen_rules.add(line)
-
-            # Leave it alone
-            return True
+        # Drop the lines we are going to write back ourselves, then insert
+        # our chains and rules right after the remaining chain declarations.
+        new_filter = [line for line in new_filter
+                      if _get_line_key(line) not in our_keys]
+        rules_index = self._find_rules_index(new_filter)
+        new_filter[rules_index:rules_index] = our_chains + our_rules
 
-        def _weed_out_removes(line):
-            # We need to find exact matches here
-            if line.startswith(':'):
-                line = _strip_packets_bytes(line)
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
-            elif line.startswith('['):
-                line = _strip_packets_bytes(line)
-                for rule in remove_rules:
-                    rule_str = _strip_packets_bytes(str(rule))
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
-
-            # Leave it alone
-            return True
+        removed_keys = set(':' + name for name in remove_chains)
+        removed_keys.update(str(rule).strip() for rule in remove_rules)
 
         # We filter duplicates.  Go through the chains and rules, letting
         # the *last* occurrence take precedence since it could have a
         # non-zero [packet:byte] count we want to preserve.  We also filter
         # out anything in the "remove" list.
-        new_filter.reverse()
-        new_filter = [line for line in new_filter
-                      if _weed_out_duplicate_chains(line) and
-                      _weed_out_duplicate_rules(line) and
-                      _weed_out_removes(line)]
-        new_filter.reverse()
+        seen_keys = set()
+        filtered = []
+        for line in reversed(new_filter):
+            key = _get_line_key(line)
+            if key:
+                if key in seen_keys or key in removed_keys:
+                    continue
+                seen_keys.add(key)
+            filtered.append(line)
+        filtered.reverse()
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
-        return new_filter
+        return filtered
 
     def _get_traffic_counters_cmd_tables(self, chain, wrap=True):
         name = get_chain_name(chain, wrap)
@@ -0,0 +1,111 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+import eventlet
+
+from neutron.agent.linux import ip_lib
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 16
+
+# Seconds between two progress reports
+PROGRESS_INTERVAL = 10
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class NamespaceCleaner(object):
+    """Tear down namespaces concurrently.
+
+    Each namespace is handled by one green thread of a pool of at most
+    workers threads. Its devices are listed once and handed over with it
+    to destroy(namespace, devices), which removes them and the namespace.
+    If list_devices is False, destroy lists them itself and gets None.
+    A namespace failing doesn't stop the others, the state of each one is
+    kept in states and the progress and overall throughput are logged.
+    """
+
+    def __init__(self, root_helper, destroy, workers=DEFAULT_WORKERS,
+                 list_devices=True):
+        self.root_helper = root_helper
+        self.destroy = destroy
+        self.workers = workers
+        self.list_devices = list_devices
+        self.states = {}
+        self._start = None
+        self._last_report = None
+
+    def get_progress(self):
+        """Get the number of namespaces in each state."""
+        progress = dict((state, 0)
+                        for state in (PENDING, RUNNING, DONE, FAILED))
+        for state in self.states.itervalues():
+            progress[state] += 1
+        return progress
+
+    def _report_progress(self):
+        now = time.time()
+        if now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        progress = self.get_progress()
+        LOG.info(_("Namespace cleanup: %(done)d done, %(failed)d failed, "
+                   "%(running)d running, %(pending)d pending"), progress)
+
+    def _clean(self, namespace):
+        self.states[namespace] = RUNNING
+        try:
+            devices = None
+            if self.list_devices:
+                ip = ip_lib.IPWrapper(self.root_helper, namespace)
+                devices = ip.get_devices(exclude_loopback=True)
+            self.destroy(namespace, devices)
+        except Exception:
+            LOG.exception(_("Failed to clean up namespace %s"), namespace)
+            self.states[namespace] = FAILED
+        else:
+            self.states[namespace] = DONE
+        self._report_progress()
+
+    def clean(self, namespaces):
+        """Clean up namespaces and wait for all of them to be handled.
+
+        Returns the dict of namespace to DONE or FAILED.
+        """
+        self.states = dict((namespace, PENDING) for namespace in namespaces)
+        if not self.states:
+            return {}
+        self._start = self._last_report = time.time()
+
+        pool = eventlet.GreenPool(self.workers)
+        for namespace in self.states.keys():
+            pool.spawn_n(self._clean, namespace)
+        pool.waitall()
+
+        elapsed = time.time() - self._start
+        progress = self.get_progress()
+        LOG.info(_("Cleaned up %(done)d of %(total)d namespaces in "
+                   "%(elapsed).1f seconds (%(rate).1f namespaces/s), "
+                   "%(failed)d failed"),
+                 {'done': progress[DONE], 'failed': progress[FAILED],
+                  'total': len(self.states), 'elapsed': elapsed,
+                  'rate': len(self.states) / max(elapsed, 0.001)})
+        return dict(self.states)
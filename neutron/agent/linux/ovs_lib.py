@@ -15,10 +15,13 @@
 
 import itertools
 import operator
+import re
+import string
 
 from oslo.config import cfg
 
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import ovsdb_client
 from neutron.agent.linux import utils
 from neutron.common import exceptions
 from neutron.openstack.common import excutils
@@ -32,16 +35,86 @@ DEFAULT_OVS_VSCTL_TIMEOUT = 10
 # Special return value for an invalid OVS ofport
 INVALID_OFPORT = '-1'
 
+DEFAULT_OVSDB_CONNECTION = 'unix:/var/run/openvswitch/db.sock'
+
 OPTS = [
     cfg.IntOpt('ovs_vsctl_timeout',
                default=DEFAULT_OVS_VSCTL_TIMEOUT,
                help=_('Timeout in seconds for ovs-vsctl commands')),
+    cfg.StrOpt('ovsdb_interface',
+               default='vsctl',
+               help=_("The interface for interacting with the OVSDB. "
+                      "'vsctl' forks ovs-vsctl for every request, 'native' "
+                      "keeps a persistent OVSDB connection and serves "
+                      "reads from a local replica of the database")),
+    cfg.StrOpt('ovsdb_connection',
+               default=DEFAULT_OVSDB_CONNECTION,
+               help=_("The OVSDB connection used by the native interface, "
+                      "e.g. unix:/var/run/openvswitch/db.sock or "
+                      "tcp:127.0.0.1:6640")),
 ]
 cfg.CONF.register_opts(OPTS)
 
 LOG = logging.getLogger(__name__)
 
 
+# Set once the native OVSDB connection failed, later callers then go
+# straight to ovs-vsctl instead of waiting for the same timeout again.
+_ovsdb_failed = False
+
+# Strings ovs-vsctl prints without quotes, see string_needs_quotes() in
+# ovsdb-data.c
+_BARE_STRING_START = string.ascii_letters + '_'
+_BARE_STRING_CHARS = string.ascii_letters + '_-.'
+_UUID_RE = re.compile(r'^[0-9a-fA-F]{8}-([0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}$')
+
+
+def get_ovsdb_connection():
+    """Return the native OVSDB connection, or None to use ovs-vsctl."""
+    global _ovsdb_failed
+    if cfg.CONF.ovsdb_interface != 'native' or _ovsdb_failed:
+        return
+    try:
+        return ovsdb_client.get_connection(cfg.CONF.ovsdb_connection,
+                                           cfg.CONF.ovs_vsctl_timeout)
+    except Exception as e:
+        _ovsdb_failed = True
+        LOG.warn(_("Unable to use native OVSDB connection %(conn)s, "
+                   "falling back to ovs-vsctl: %(error)s"),
+                 {'conn': cfg.CONF.ovsdb_connection, 'error': e})
+
+
+def _vsctl_atom_str(atom, atom_type):
+    if atom_type == 'string':
+        if (not atom or atom[0] not in _BARE_STRING_START or
+                atom.strip(_BARE_STRING_CHARS) or
+                atom in ('true', 'false') or _UUID_RE.match(atom)):
+            return jsonutils.dumps(atom, ensure_ascii=False)
+        return atom
+    elif isinstance(atom, bool):
+        return 'true' if atom else 'false'
+    return '%s' % atom
+
+
+def _vsctl_str(value, column_type):
+    """Format a replicated value the way 'ovs-vsctl get' prints it.
+
+    :param column_type: the column type from ovsdb_client.COLUMN_TYPES
+    """
+    key_type, value_type, multi = column_type
+    if value_type:
+        return '{%s}' % ', '.join(
+            '%s=%s' % (_vsctl_atom_str(k, key_type),
+                       _vsctl_atom_str(v, value_type))
+            for k, v in sorted(value.iteritems()))
+    # A set holding a single value is replicated as that bare value
+    values = sorted(ovsdb_client.as_list(value))
+    if multi or not values:
+        return '[%s]' % ', '.join(_vsctl_atom_str(v, key_type)
+                                  for v in values)
+    return _vsctl_atom_str(values[0], key_type)
+
+
 class VifPort:
     def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
         self.port_name = port_name
@@ -62,11 +135,17 @@ class BaseOVS(object):
     def __init__(self, root_helper):
         self.root_helper = root_helper
         self.vsctl_timeout = cfg.CONF.ovs_vsctl_timeout
+        self.ovsdb = get_ovsdb_connection()
 
     def run_vsctl(self, args, check_error=False):
         full_args = ["ovs-vsctl", "--timeout=%d" % self.vsctl_timeout] + args
         try:
-            return utils.execute(full_args, root_helper=self.root_helper)
+            output = utils.execute(full_args, root_helper=self.root_helper)
+            if self.ovsdb:
+                # The command may have written to the database, make the
+                # next read from the replica wait for its update.
+                self.ovsdb.mark_stale()
+            return output
         except Exception as e:
             with excutils.save_and_reraise_exception() as ctxt:
                 LOG.error(_("Unable to execute %(cmd)s. "
@@ -83,6 +162,8 @@ class BaseOVS(object):
         self.run_vsctl(["--", "--if-exists", "del-br", bridge_name])
 
     def bridge_exists(self, bridge_name):
+        if self.ovsdb:
+            return self.ovsdb.get_row('Bridge', bridge_name) is not None
         try:
             self.run_vsctl(['br-exists', bridge_name], check_error=True)
         except RuntimeError as e:
@@ -93,6 +174,8 @@ class BaseOVS(object):
         return True
 
     def get_bridge_name_for_port_name(self, port_name):
+        if self.ovsdb:
+            return self.ovsdb.get_bridge_for_port(port_name)
         try:
             return self.run_vsctl(['port-to-br', port_name], check_error=True)
         except RuntimeError as e:
@@ -249,7 +332,24 @@ class OVSBridge(BaseOVS):
                         "type=patch", "options:peer=%s" % remote_name])
         return self.get_port_ofport(local_name)
 
+    def _db_get_native(self, table, record, column):
+        """Read a column from the replica.
+
+        Returns a (found, value) tuple. Unknown rows are left to ovs-vsctl
+        so that error handling stays the same.
+        """
+        if (not self.ovsdb or
+                column not in ovsdb_client.MONITORED_TABLES.get(table, ())):
+            return False, None
+        row = self.ovsdb.get_row(table, record)
+        if row is None:
+            return False, None
+        return True, row[column]
+
     def db_get_map(self, table, record, column, check_error=False):
+        found, value = self._db_get_native(table, record, column)
+        if found:
+            return dict(value) if isinstance(value, dict) else {}
         output = self.run_vsctl(["get", table, record, column], check_error)
         if output:
             output_str = output.rstrip("\n\r")
@@ -257,6 +357,10 @@ class OVSBridge(BaseOVS):
         return {}
 
     def db_get_val(self, table, record, column, check_error=False):
+        found, value = self._db_get_native(table, record, column)
+        if found:
+            return _vsctl_str(value,
+                              ovsdb_client.COLUMN_TYPES[table][column])
         output = self.run_vsctl(["get", table, record, column], check_error)
         if output:
             return output.rstrip("\n\r")
@@ -272,6 +376,10 @@ class OVSBridge(BaseOVS):
         return ret
 
     def get_port_name_list(self):
+        if self.ovsdb:
+            port_names = self.ovsdb.get_bridge_port_names(self.br_name)
+            if port_names is not None:
+                return port_names
         res = self.run_vsctl(["list-ports", self.br_name], check_error=True)
         if res:
             return res.strip().split("\n")
@@ -315,19 +423,27 @@ class OVSBridge(BaseOVS):
 
         return edge_ports
 
-    def get_vif_port_set(self):
-        port_names = self.get_port_name_list()
-        edge_ports = set()
+    def _list_interfaces(self):
+        """Return (name, external_ids, ofport) for every Interface row."""
+        if self.ovsdb:
+            return [(row['name'], row['external_ids'], row['ofport'])
+                    for row in self.ovsdb.get_rows('Interface')]
         args = ['--format=json', '--', '--columns=name,external_ids,ofport',
                 'list', 'Interface']
         result = self.run_vsctl(args, check_error=True)
         if not result:
-            return edge_ports
-        for row in jsonutils.loads(result)['data']:
+            return []
+        return [(row[0], dict(row[1][1]), row[2])
+                for row in jsonutils.loads(result)['data']]
+
+    def get_vif_port_set(self):
+        port_names = set(self.get_port_name_list())
+        edge_ports = set()
+        for row in self._list_interfaces():
             name = row[0]
             if name not in port_names:
                 continue
-            external_ids = dict(row[1][1])
+            external_ids = row[1]
             # Do not consider VIFs which aren't yet ready
             # This can happen when ofport values are either [] or ["set", []]
             # We will therefore consider only integer values for ofport
@@ -368,22 +484,56 @@ class OVSBridge(BaseOVS):
         in the "Interface" table queried by the get_vif_port_set() method.
 
         """
-        port_names = self.get_port_name_list()
-        args = ['--format=json', '--', '--columns=name,tag', 'list', 'Port']
-        result = self.run_vsctl(args, check_error=True)
+        port_names = set(self.get_port_name_list())
         port_tag_dict = {}
-        if not result:
-            return port_tag_dict
-        for name, tag in jsonutils.loads(result)['data']:
+        if self.ovsdb:
+            rows = [(row['name'], row['tag'])
+                    for row in self.ovsdb.get_rows('Port')]
+        else:
+            args = ['--format=json', '--', '--columns=name,tag',
+                    'list', 'Port']
+            result = self.run_vsctl(args, check_error=True)
+            if not result:
+                return port_tag_dict
+            # 'tag' can be [u'set', []] or an integer
+            rows = [(name, tag[1] if isinstance(tag, list) else tag)
+                    for name, tag in jsonutils.loads(result)['data']]
+        for name, tag in rows:
             if name not in port_names:
                 continue
-            # 'tag' can be [u'set', []] or an integer
-            if isinstance(tag, list):
-                tag = tag[1]
             port_tag_dict[name] = tag
         return port_tag_dict
 
+    def _get_vif_port_by_id_native(self, port_id):
+        for row in self.ovsdb.get_rows('Interface'):
+            if row['external_ids'].get('iface-id') == port_id:
+                break
+        else:
+            return
+        port_name = row['name']
+        switch = self.ovsdb.get_bridge_for_iface(port_name)
+        if switch != self.br_name:
+            LOG.info(_("Port: %(port_name)s is on %(switch)s,"
+                       " not on %(br_name)s"), {'port_name': port_name,
+                                                'switch': switch,
+                                                'br_name': self.br_name})
+            return
+        ofport = row['ofport']
+        if not isinstance(ofport, int) or ofport == -1:
+            LOG.warn(_("ofport: %(ofport)s for VIF: %(vif)s is not a "
+                       "positive integer"), {'ofport': ofport,
+                                             'vif': port_id})
+            return
+        vif_mac = row['external_ids'].get('attached-mac')
+        if vif_mac is None:
+            LOG.warn(_("Unable to parse interface details. Exception: %s"),
+                     _('attached-mac missing'))
+            return
+        return VifPort(port_name, ofport, port_id, vif_mac, self)
+
     def get_vif_port_by_id(self, port_id):
+        if self.ovsdb:
+            return self._get_vif_port_by_id_native(port_id)
         args = ['--format=json', '--', '--columns=external_ids,name,ofport',
                 'find', 'Interface',
                 'external_ids:iface-id="%s"' % port_id]
@@ -426,15 +576,80 @@ class OVSBridge(BaseOVS):
             LOG.warn(_("Unable to parse interface details. Exception: %s"), e)
             return
 
+    def get_vifs_by_ids(self, port_ids):
+        """Return a dict of iface-id to VifPort for the given iface-ids.
+
+        All the ids are resolved from a single Interface listing. Ids which
+        are not on this bridge or whose ofport is not valid yet are left
+        out of the result.
+        """
+        port_ids = set(port_ids)
+        if not port_ids:
+            return {}
+        port_names = set(self.get_port_name_list())
+        vifs = {}
+        for name, external_ids, ofport in self._list_interfaces():
+            port_id = external_ids.get('iface-id')
+            if port_id not in port_ids:
+                continue
+            if name not in port_names:
+                LOG.info(_("Port: %(port_name)s is not on %(br_name)s"),
+                         {'port_name': name, 'br_name': self.br_name})
+                continue
+            if not isinstance(ofport, int) or ofport == -1:
+                LOG.warn(_("ofport: %(ofport)s for VIF: %(vif)s is not a "
+                           "positive integer"), {'ofport': ofport,
+                                                 'vif': port_id})
+                continue
+            vif_mac = external_ids.get('attached-mac')
+            if not vif_mac:
+                LOG.warn(_("No attached-mac found for VIF: %s"), port_id)
+                continue
+            vifs[port_id] = VifPort(name, ofport, port_id, vif_mac, self)
+        return vifs
+
     def delete_ports(self, all_ports=False):
         if all_ports:
             port_names = self.get_port_name_list()
         else:
-            port_names = (port.port_name for port in self.get_vif_ports())
+            port_names = [port.port_name for port in self.get_vif_ports()]
 
+        if self.ovsdb and self._delete_ports_native(port_names):
+            return
         for port_name in port_names:
             self.delete_port(port_name)
 
+    def _delete_ports_native(self, port_names):
+        """Remove all the ports from the bridge in a single transaction."""
+        bridge = self.ovsdb.get_row('Bridge', self.br_name)
+        if bridge is None:
+            return False
+        port_uuids = []
+        for port_name in port_names:
+            port = self.ovsdb.get_row('Port', port_name)
+            if port is not None:
+                port_uuids.append(ovsdb_client.uuid_ref(port['_uuid']))
+        if not port_uuids:
+            return True
+        operations = [
+            {'op': 'mutate', 'table': 'Bridge',
+             'where': [['_uuid', '==',
+                        ovsdb_client.uuid_ref(bridge['_uuid'])]],
+             'mutations': [['ports', 'delete', ['set', port_uuids]]]},
+            # Ports rows are garbage collected by ovsdb-server, bumping
+            # next_cfg makes ovs-vswitchd apply the change.
+            {'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+             'mutations': [['next_cfg', '+=', 1]]},
+        ]
+        try:
+            self.ovsdb.transact(operations)
+        except ovsdb_client.OvsdbError as e:
+            LOG.warn(_("Unable to delete ports from %(br)s in one OVSDB "
+                       "transaction: %(error)s"),
+                     {'br': self.br_name, 'error': e})
+            return False
+        return True
+
     def get_local_port_mac(self):
         """Retrieve the mac of the bridge's local port."""
         address = ip_lib.IPDevice(self.br_name, self.root_helper).link.address
@@ -524,6 +739,9 @@ class DeferredOVSBridge(object):
 
 
 def get_bridge_for_iface(root_helper, iface):
+    ovsdb = get_ovsdb_connection()
+    if ovsdb:
+        return ovsdb.get_bridge_for_iface(iface)
     args = ["ovs-vsctl", "--timeout=%d" % cfg.CONF.ovs_vsctl_timeout,
             "iface-to-br", iface]
     try:
@@ -534,6 +752,9 @@ def get_bridge_for_iface(root_helper, iface):
 
 
 def get_bridges(root_helper):
+    ovsdb = get_ovsdb_connection()
+    if ovsdb:
+        return sorted(row['name'] for row in ovsdb.get_rows('Bridge'))
     args = ["ovs-vsctl", "--timeout=%d" % cfg.CONF.ovs_vsctl_timeout,
             "list-br"]
     try:
@@ -0,0 +1,417 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Native OVSDB JSON-RPC client.
+
+A Connection keeps a single socket open to ovsdb-server and maintains an
+in-memory replica of the monitored tables, so that reads do not need to
+fork ovs-vsctl through rootwrap.
+"""
+
+import itertools
+import json
+import socket
+
+import eventlet
+from eventlet import event
+from eventlet import semaphore
+
+from neutron.common import exceptions
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_DATABASE = 'Open_vSwitch'
+
+RECV_SIZE = 65536
+
+RECONNECT_INTERVAL = 1
+
+# Columns replicated from each table, with their type in vswitch.ovsschema
+# as (key type, value type or None if not a map, whether it holds more than
+# one value). Interface statistics are left out on purpose: they change every
+# few seconds and would flood the monitor.
+COLUMN_TYPES = {
+    'Open_vSwitch': {'bridges': ('uuid', None, True),
+                     'cur_cfg': ('integer', None, False),
+                     'next_cfg': ('integer', None, False)},
+    'Bridge': {'name': ('string', None, False),
+               'ports': ('uuid', None, True),
+               'datapath_id': ('string', None, False),
+               'external_ids': ('string', 'string', True),
+               'fail_mode': ('string', None, False),
+               'protocols': ('string', None, True)},
+    'Port': {'name': ('string', None, False),
+             'interfaces': ('uuid', None, True),
+             'tag': ('integer', None, False),
+             'qos': ('uuid', None, False),
+             'external_ids': ('string', 'string', True)},
+    'Interface': {'name': ('string', None, False),
+                  'type': ('string', None, False),
+                  'ofport': ('integer', None, False),
+                  'external_ids': ('string', 'string', True),
+                  'options': ('string', 'string', True),
+                  'ingress_policing_rate': ('integer', None, False),
+                  'ingress_policing_burst': ('integer', None, False)},
+    'QoS': {'type': ('string', None, False),
+            'queues': ('integer', 'uuid', True),
+            'other_config': ('string', 'string', True),
+            'external_ids': ('string', 'string', True)},
+    'Queue': {'dscp': ('integer', None, False),
+              'other_config': ('string', 'string', True),
+              'external_ids': ('string', 'string', True)},
+}
+
+MONITORED_TABLES = dict((table, sorted(columns))
+                        for table, columns in COLUMN_TYPES.iteritems())
+
+
+class OvsdbError(exceptions.NeutronException):
+    message = _("OVSDB request %(method)s failed: %(error)s")
+
+
+def from_json(value):
+    """Convert an OVSDB JSON value to the matching python value.
+
+    Sets become lists, maps become dicts and uuids become strings.
+    """
+    if isinstance(value, list) and len(value) == 2:
+        kind, data = value
+        if kind == 'set':
+            return [from_json(v) for v in data]
+        elif kind == 'map':
+            return dict((from_json(k), from_json(v)) for k, v in data)
+        elif kind in ('uuid', 'named-uuid'):
+            return data
+    return value
+
+
+def to_json(value):
+    """Convert a python value to OVSDB JSON notation."""
+    if isinstance(value, dict):
+        return ['map', [[k, to_json(v)] for k, v in value.iteritems()]]
+    elif isinstance(value, (list, tuple, set)):
+        return ['set', [to_json(v) for v in value]]
+    return value
+
+
+def uuid_ref(uuid):
+    return ['uuid', uuid]
+
+
+def as_list(value):
+    """Return a set column value as a list.
+
+    OVSDB encodes a set holding a single element as that bare element.
+    """
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+class Connection(object):
+    """A persistent, monitored connection to ovsdb-server.
+
+    :param connection: 'unix:<path>' or 'tcp:<host>:<port>'
+    :param timeout: seconds to wait for any single request
+    :param tables: dict of table name to the list of replicated columns
+    """
+
+    def __init__(self, connection, timeout, database=DEFAULT_DATABASE,
+                 tables=None):
+        self.connection = connection
+        self.timeout = timeout
+        self.database = database
+        self.tables = tables or MONITORED_TABLES
+        self.rows = dict((table, {}) for table in self.tables)
+        self._names = dict((table, {}) for table in self.tables
+                           if 'name' in self.tables[table])
+        self._socket = None
+        self._chunks = []
+        self._decoder = json.JSONDecoder()
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._monitor_id = None
+        self._synced = event.Event()
+        self._send_lock = semaphore.Semaphore()
+        self._thread = None
+        self._stale = False
+
+    def start(self):
+        """Connect, fetch the initial tables contents and start listening.
+
+        Raises OvsdbError if the replica can't be filled within timeout.
+        """
+        if self._thread is not None:
+            return
+        self._connect()
+        self._thread = eventlet.spawn(self._run)
+        with eventlet.Timeout(self.timeout,
+                              OvsdbError(method='monitor',
+                                         error=_('timed out'))):
+            self._synced.wait()
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+        self._close(_('connection stopped'))
+
+    def _connect(self):
+        proto, _sep, address = self.connection.partition(':')
+        if proto == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            target = address
+        elif proto == 'tcp':
+            host, _sep, port = address.rpartition(':')
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            target = (host, int(port))
+        else:
+            raise OvsdbError(method='connect',
+                             error=_('unsupported connection %s') %
+                             self.connection)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(target)
+        except socket.error as e:
+            sock.close()
+            raise OvsdbError(method='connect', error=e)
+        sock.settimeout(None)
+        self._socket = sock
+        self._chunks = []
+        self._monitor_id = next(self._ids)
+        requests = dict((table, {'columns': columns})
+                        for table, columns in self.tables.iteritems())
+        self._send({'method': 'monitor',
+                    'params': [self.database, None, requests],
+                    'id': self._monitor_id})
+
+    def _close(self, reason):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except socket.error:
+                pass
+            self._socket = None
+        pending, self._pending = self._pending, {}
+        for ev in pending.itervalues():
+            ev.send_exception(OvsdbError(method='request', error=reason))
+
+    def _run(self):
+        while True:
+            try:
+                if self._socket is None:
+                    self._connect()
+                self._receive()
+            except Exception as e:
+                LOG.warn(_("Lost connection to ovsdb-server at %(conn)s: "
+                           "%(error)s"),
+                         {'conn': self.connection, 'error': e})
+                self._close(e)
+                eventlet.sleep(RECONNECT_INTERVAL)
+
+    def _receive(self):
+        while True:
+            data = self._socket.recv(RECV_SIZE)
+            if not data:
+                raise OvsdbError(method='recv',
+                                 error=_('connection closed by server'))
+            self._chunks.append(data)
+            # Messages are not delimited, only try to decode once the
+            # received data may end a JSON object to avoid reparsing a
+            # large partial message on every chunk.
+            if data.rstrip().endswith('}'):
+                for msg in self._decode_messages():
+                    self._dispatch(msg)
+
+    def _decode_messages(self):
+        messages = []
+        buf = ''.join(self._chunks)
+        idx = 0
+        while True:
+            while idx < len(buf) and buf[idx].isspace():
+                idx += 1
+            if idx == len(buf):
+                break
+            try:
+                msg, idx = self._decoder.raw_decode(buf, idx)
+            except ValueError:
+                # Partial message, wait for the rest of it
+                break
+            messages.append(msg)
+        self._chunks = [buf[idx:]]
+        return messages
+
+    def _send(self, msg):
+        with self._send_lock:
+            self._socket.sendall(json.dumps(msg))
+
+    def _dispatch(self, msg):
+        method = msg.get('method')
+        if method == 'echo':
+            self._send({'id': msg['id'], 'result': msg['params'],
+                        'error': None})
+        elif method == 'update':
+            self._apply_updates(msg['params'][1])
+        elif method is None:
+            if msg.get('id') == self._monitor_id:
+                if msg.get('error'):
+                    raise OvsdbError(method='monitor', error=msg['error'])
+                self._reset(msg['result'])
+                return
+            ev = self._pending.pop(msg.get('id'), None)
+            if ev is not None:
+                ev.send(msg)
+
+    def _reset(self, table_updates):
+        for table in self.rows:
+            self.rows[table].clear()
+        for names in self._names.itervalues():
+            names.clear()
+        self._apply_updates(table_updates)
+        self._stale = False
+        if not self._synced.ready():
+            self._synced.send()
+
+    def _apply_updates(self, table_updates):
+        for table, updates in table_updates.iteritems():
+            rows = self.rows.setdefault(table, {})
+            names = self._names.get(table)
+            for uuid, update in updates.iteritems():
+                old = rows.pop(uuid, None)
+                if names is not None and old is not None:
+                    names.pop(old.get('name'), None)
+                new = update.get('new')
+                if new is None:
+                    continue
+                row = dict((column, from_json(value))
+                           for column, value in new.iteritems())
+                row['_uuid'] = uuid
+                rows[uuid] = row
+                if names is not None and 'name' in row:
+                    names[row['name']] = uuid
+
+    def call(self, method, params):
+        if self._socket is None:
+            raise OvsdbError(method=method, error=_('not connected'))
+        req_id = next(self._ids)
+        ev = event.Event()
+        self._pending[req_id] = ev
+        try:
+            self._send({'method': method, 'params': params, 'id': req_id})
+            with eventlet.Timeout(self.timeout,
+                                  OvsdbError(method=method,
+                                             error=_('timed out'))):
+                reply = ev.wait()
+        finally:
+            self._pending.pop(req_id, None)
+        if reply.get('error'):
+            raise OvsdbError(method=method, error=reply['error'])
+        return reply['result']
+
+    def transact(self, operations):
+        """Run all the operations in one OVSDB transaction.
+
+        Returns the list of per-operation results. Raises OvsdbError if any
+        operation or the commit itself failed, in which case OVSDB has
+        rolled back the whole transaction.
+        """
+        results = self.call('transact', [self.database] + list(operations))
+        for result in results:
+            if result and 'error' in result:
+                raise OvsdbError(method='transact',
+                                 error='%s: %s' % (result['error'],
+                                                   result.get('details')))
+        self._stale = True
+        return results
+
+    def mark_stale(self):
+        """Flag the replica as possibly lagging behind an external write."""
+        self._stale = True
+
+    def sync(self):
+        """Wait for the replica to reflect every write committed so far.
+
+        ovsdb-server flushes monitor updates for a session before replying
+        to its next request, so one echo round-trip is enough.
+        """
+        if self._stale:
+            self.call('echo', [])
+            self._stale = False
+
+    def get_row(self, table, record):
+        """Return the row of table identified by name or uuid, or None."""
+        self.sync()
+        rows = self.rows[table]
+        names = self._names.get(table)
+        if names is not None and record in names:
+            return rows.get(names[record])
+        return rows.get(record)
+
+    def get_rows(self, table):
+        self.sync()
+        return self.rows[table].values()
+
+    def get_bridge_port_names(self, bridge_name):
+        """Return the sorted port names of a bridge, or None."""
+        bridge = self.get_row('Bridge', bridge_name)
+        if bridge is None:
+            return
+        ports = self.rows['Port']
+        return sorted(ports[uuid]['name'] for uuid in as_list(bridge['ports'])
+                      if uuid in ports)
+
+    def _get_bridge_for_port_row(self, port):
+        for bridge in self.rows['Bridge'].itervalues():
+            if port['_uuid'] in as_list(bridge['ports']):
+                return bridge['name']
+
+    def get_bridge_for_port(self, port_name):
+        """Return the name of the bridge holding port_name, or None."""
+        port = self.get_row('Port', port_name)
+        if port is not None:
+            return self._get_bridge_for_port_row(port)
+
+    def get_bridge_for_iface(self, iface_name):
+        """Return the name of the bridge holding iface_name, or None."""
+        iface = self.get_row('Interface', iface_name)
+        if iface is None:
+            return
+        iface_uuid = iface['_uuid']
+        # Ports are normally named after their single interface
+        port = self.rows['Port'].get(self._names['Port'].get(iface_name))
+        if port is None or iface_uuid not in as_list(port['interfaces']):
+            for port in self.rows['Port'].itervalues():
+                if iface_uuid in as_list(port['interfaces']):
+                    break
+            else:
+                return
+        return self._get_bridge_for_port_row(port)
+
+
+_connection = None
+
+
+def get_connection(connection, timeout):
+    """Return the process wide connection, starting it on first use."""
+    global _connection
+    if _connection is None:
+        conn = Connection(connection, timeout)
+        try:
+            conn.start()
+        except Exception:
+            conn.stop()
+            raise
+        _connection = conn
+    return _connection
@@ -15,6 +15,8 @@
 import eventlet
 
 from neutron.agent.linux import async_process
+from neutron.agent.linux import ovsdb_client
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
@@ -52,23 +54,46 @@ class OvsdbMonitor(async_process.AsyncProcess):
             # stop the monitor.
 
 
+# Row actions reported by 'ovsdb-client monitor'
+OVSDB_ACTION_INITIAL = 'initial'
+OVSDB_ACTION_INSERT = 'insert'
+OVSDB_ACTION_DELETE = 'delete'
+OVSDB_ACTION_NEW = 'new'
+
+DEVICE_ADDED = 'added'
+DEVICE_REMOVED = 'removed'
+DEVICE_MODIFIED = 'modified'
+
+ACTION_EVENTS = {OVSDB_ACTION_INITIAL: DEVICE_ADDED,
+                 OVSDB_ACTION_INSERT: DEVICE_ADDED,
+                 OVSDB_ACTION_DELETE: DEVICE_REMOVED,
+                 OVSDB_ACTION_NEW: DEVICE_MODIFIED}
+
+
 class SimpleInterfaceMonitor(OvsdbMonitor):
     """Monitors the Interface table of the local host's ovsdb for changes.
 
     The has_updates() method indicates whether changes to the ovsdb
     Interface table have been detected since the monitor started or
     since the previous access.
+
+    The row deltas are parsed into device events which are returned by
+    get_events().
     """
 
     def __init__(self, root_helper=None, respawn_interval=None):
         super(SimpleInterfaceMonitor, self).__init__(
             'Interface',
-            columns=['name', 'ofport'],
+            columns=['name', 'ofport', 'external_ids'],
             format='json',
             root_helper=root_helper,
             respawn_interval=respawn_interval,
         )
         self.data_received = False
+        self.new_events = []
+        # Events can't be trusted until the monitor has been running
+        # without interruption since the last call to get_events()
+        self.events_lost = True
 
     @property
     def is_active(self):
@@ -85,7 +110,50 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         the absence of updates at the expense of potential false
         positives.
         """
-        return bool(list(self.iter_stdout())) or not self.is_active
+        self.process_events()
+        if not self.is_active:
+            self.events_lost = True
+        return bool(self.new_events) or not self.is_active
+
+    def process_events(self):
+        """Parse the monitor output received so far into device events."""
+        for line in self.iter_stdout():
+            try:
+                output = jsonutils.loads(line)
+                headings = output['headings']
+                rows = output['data']
+            except (ValueError, KeyError, TypeError):
+                LOG.warn(_("Unable to parse ovsdb monitor output: %s"), line)
+                self.events_lost = True
+                continue
+            for row in rows:
+                row = dict(zip(headings, row))
+                event = ACTION_EVENTS.get(row.get('action'))
+                if event is None:
+                    # 'old' rows only hold the previous value of the
+                    # modified columns, the matching 'new' row follows.
+                    continue
+                self.new_events.append(
+                    (event,
+                     {'name': row.get('name'),
+                      'ofport': ovsdb_client.from_json(row.get('ofport')),
+                      'external_ids': ovsdb_client.from_json(
+                          row.get('external_ids')) or {}}))
+
+    def get_events(self):
+        """Return the device events received since the previous call.
+
+        Each event is an (event type, device) tuple in the order they were
+        received, the device being a dict with the 'name', 'ofport' and
+        'external_ids' of the interface. None is returned if some events
+        may have been missed, in which case a full rescan is required.
+        """
+        self.process_events()
+        events, self.new_events = self.new_events, []
+        if self.events_lost or not self.is_active:
+            self.events_lost = False
+            return
+        return events
 
     def start(self, block=False, timeout=5):
         super(SimpleInterfaceMonitor, self).start()
@@ -96,6 +164,7 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
 
     def _kill(self, *args, **kwargs):
         self.data_received = False
+        self.events_lost = True
         super(SimpleInterfaceMonitor, self)._kill(*args, **kwargs)
 
     def _read_stdout(self):
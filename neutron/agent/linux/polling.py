@@ -79,6 +79,14 @@ class BasePollingManager(object):
 
         return polling_required
 
+    def get_events(self):
+        """Return the device events detected since the previous call.
+
+        None means that changes can't be tracked and that the caller has
+        to do a full scan.
+        """
+        return
+
 
 class AlwaysPoll(BasePollingManager):
 
@@ -110,3 +118,6 @@ class InterfacePollingMinimizer(BasePollingManager):
         # collect output.
         eventlet.sleep()
         return self._monitor.has_updates
+
+    def get_events(self):
+        return self._monitor.get_events()
@@ -26,6 +26,7 @@ from neutron.agent import l3_agent
 from neutron.agent.linux import dhcp
 from neutron.agent.linux import interface
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import netns_cleaner
 from neutron.agent.linux import ovs_lib
 from neutron.api.v2 import attributes
 from neutron.common import config
@@ -57,6 +58,10 @@ def setup_conf():
         cfg.BoolOpt('force',
                     default=False,
                     help=_('Delete the namespace by removing all devices.')),
+        cfg.IntOpt('workers',
+                   default=netns_cleaner.DEFAULT_WORKERS,
+                   help=_('Number of namespaces checked and destroyed '
+                          'concurrently.')),
     ]
 
     conf = cfg.CONF
@@ -116,26 +121,40 @@ def unplug_device(conf, device):
             LOG.debug(_('Unable to find bridge for device: %s'), device.name)
 
 
-def destroy_namespace(conf, namespace, force=False):
+def _destroy_namespace(conf, namespace, force=False, devices=None):
+    root_helper = agent_config.get_root_helper(conf)
+    ip = ip_lib.IPWrapper(root_helper, namespace)
+
+    if force:
+        kill_dhcp(conf, namespace)
+        # NOTE: The dhcp driver will remove the namespace if is it empty,
+        # so a second check is required here.
+        if not ip.netns.exists(namespace):
+            return
+        # Devices listed before kill_dhcp may be gone already
+        for device in ip.get_devices(exclude_loopback=True):
+            unplug_device(conf, device)
+        # Only delete the namespace if every device could be removed
+        devices = None
+
+    if devices is None:
+        ip.garbage_collect_namespace()
+    elif not devices:
+        # The namespace was just found empty, no need to list it again
+        ip.netns.delete(namespace)
+
+
+def destroy_namespace(conf, namespace, force=False, devices=None):
     """Destroy a given namespace.
 
     If force is True, then dhcp (if it exists) will be disabled and all
-    devices will be forcibly removed.
+    devices will be forcibly removed. devices is the list of devices of the
+    namespace, when the caller already listed them. It is ignored if force
+    is True, as disabling dhcp changes the devices.
     """
 
     try:
-        root_helper = agent_config.get_root_helper(conf)
-        ip = ip_lib.IPWrapper(root_helper, namespace)
-
-        if force:
-            kill_dhcp(conf, namespace)
-            # NOTE: The dhcp driver will remove the namespace if is it empty,
-            # so a second check is required here.
-            if ip.netns.exists(namespace):
-                for device in ip.get_devices(exclude_loopback=True):
-                    unplug_device(conf, device)
-
-        ip.garbage_collect_namespace()
+        _destroy_namespace(conf, namespace, force, devices)
     except Exception:
         LOG.exception(_('Error unable to destroy namespace: %s'), namespace)
 
@@ -163,12 +182,22 @@ def main():
 
     root_helper = agent_config.get_root_helper(conf)
     # Identify namespaces that are candidates for deletion.
-    candidates = [ns for ns in
-                  ip_lib.IPWrapper.get_namespaces(root_helper)
-                  if eligible_for_deletion(conf, ns, conf.force)]
+    namespaces = ip_lib.IPWrapper.get_namespaces(root_helper)
+    pool = eventlet.GreenPool(conf.workers)
+    candidates = [ns for ns, eligible in
+                  zip(namespaces,
+                      pool.imap(lambda ns: eligible_for_deletion(
+                          conf, ns, conf.force), namespaces))
+                  if eligible]
 
     if candidates:
         eventlet.sleep(2)
 
-        for namespace in candidates:
-            destroy_namespace(conf, namespace, conf.force)
+        def destroy(namespace, devices):
+            _destroy_namespace(conf, namespace, conf.force, devices)
+
+        # Forced cleanups list the devices once dhcp is disabled
+        cleaner = netns_cleaner.NamespaceCleaner(
+            root_helper, destroy, workers=conf.workers,
+            list_devices=not conf.force)
+        cleaner.clean(candidates)
@@ -80,6 +80,7 @@ class PluginApi(n_rpc.RpcProxy):
         1.3 - get_device_details rpc signature upgrade to obtain 'host' and
               return value to include fixed_ips and device_owner for
               the device port
+        1.4 - update_device_list to report the status of several devices
     '''
 
     BASE_RPC_API_VERSION = '1.1'
@@ -126,6 +127,48 @@ class PluginApi(n_rpc.RpcProxy):
                          self.make_msg('update_device_up', device=device,
                                        agent_id=agent_id, host=host))
 
+    def update_device_list(self, context, devices_up, devices_down,
+                           agent_id, host=None):
+        """Report several devices up and down in a single call.
+
+        Returns a dict with the 'devices_up', 'failed_devices_up',
+        'devices_down' and 'failed_devices_down' lists. Entries of
+        'devices_down' are the update_device_down results.
+        """
+        try:
+            return self.call(context,
+                             self.make_msg('update_device_list',
+                                           devices_up=devices_up,
+                                           devices_down=devices_down,
+                                           agent_id=agent_id,
+                                           host=host),
+                             version='1.4')
+        except messaging.UnsupportedVersion:
+            LOG.warn(_('Batched device status reporting requires a server '
+                       'upgrade, reporting devices one at a time.'))
+        res = {'devices_up': [], 'failed_devices_up': [],
+               'devices_down': [], 'failed_devices_down': []}
+        for device in devices_up:
+            try:
+                self.update_device_up(context, device, agent_id, host)
+            except Exception as e:
+                LOG.debug("update_device_up failed for %(device)s: %(e)s",
+                          {'device': device, 'e': e})
+                res['failed_devices_up'].append(device)
+            else:
+                res['devices_up'].append(device)
+        for device in devices_down:
+            try:
+                details = self.update_device_down(context, device,
+                                                  agent_id, host)
+            except Exception as e:
+                LOG.debug("update_device_down failed for %(device)s: %(e)s",
+                          {'device': device, 'e': e})
+                res['failed_devices_down'].append(device)
+            else:
+                res['devices_down'].append(details)
+        return res
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None):
         return self.call(context,
                          self.make_msg('tunnel_sync', tunnel_ip=tunnel_ip,
@@ -14,6 +14,9 @@
 #    under the License.
 #
 
+import collections
+import time
+
 from oslo.config import cfg
 from oslo import messaging
 
@@ -190,6 +193,8 @@ class SecurityGroupAgentRpcMixin(object):
         self._use_enhanced_rpc = None
         #security group for router
         self.firewall_router={}
+        # router firewall drivers shared by all ports of a namespace
+        self.firewall_namespaces = {}
 
     @property
     def use_enhanced_rpc(self):
@@ -214,10 +219,45 @@ class SecurityGroupAgentRpcMixin(object):
         if port['device_owner'] == 'network:router_gateway':
             return NS_PREFIX + port['device_id']
 
+    def _get_router_firewall(self, port):
+        ns_name = self._get_namespace(port)
+        sg_router = self.firewall_namespaces.get(ns_name)
+        if sg_router is None:
+            sg_router = iptables_firewall.OVSHybridIptablesFirewallDriver(
+                namespace=ns_name)
+            self.firewall_namespaces[ns_name] = sg_router
+        self.firewall_router[port['id']] = sg_router
+        return sg_router
+
+    def _apply_port_filters(self, port_batches, action,
+                            security_groups=None,
+                            security_group_member_ips=None):
+        """Apply filters for batches of ports grouped by namespace.
+
+        port_batches maps (namespace, firewall) to the ports to process.
+        Every firewall, i.e. the host one or the one of a router namespace,
+        is updated inside a single deferred transaction, so iptables is
+        saved and restored once per namespace instead of once per port.
+        """
+        for (ns_name, sg_fw), ports in port_batches.items():
+            start = time.time()
+            with sg_fw.defer_apply():
+                for port in ports:
+                    action(sg_fw, port)
+                if security_groups is not None:
+                    self._update_security_group_info(
+                        security_groups, security_group_member_ips,
+                        sg_router=sg_fw)
+            LOG.info(_("Applied filters for %(count)d devices in namespace "
+                       "%(namespace)s in %(elapsed).3f seconds"),
+                     {'count': len(ports), 'namespace': ns_name,
+                      'elapsed': time.time() - start})
+
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
+        security_groups = security_group_member_ips = None
         if self.use_enhanced_rpc:
             devices_info = self.plugin_rpc.security_group_info_for_devices(
                 self.context, list(device_ids))
@@ -228,26 +268,24 @@ class SecurityGroupAgentRpcMixin(object):
             devices = self.plugin_rpc.security_group_rules_for_devices(
                 self.context, list(device_ids))
 
+        port_batches = collections.OrderedDict()
         for port in devices.values():
             if 'device_owner' not in port or port['device_owner'].startswith('compute:'):
-                with self.firewall.defer_apply():
-                    self.firewall.prepare_port_filter(port)
-                    if self.use_enhanced_rpc:
-                        self._update_security_group_info(
-                            security_groups, security_group_member_ips)
+                port_batches.setdefault((None, self.firewall),
+                                        []).append(port)
             elif port['device_owner'] == 'network:router_gateway':
                 if not cfg.CONF.use_namespaces or port.get('device_id', None) is None:
                     LOG.warn("sg is not surrported for this port as namespace is disable or port does not have device_id")
                     continue
 
-                ns_name = self._get_namespace(port)
-                sg_router = iptables_firewall.OVSHybridIptablesFirewallDriver(namespace=ns_name)
-                self.firewall_router[port['id']] = sg_router
-                with sg_router.defer_apply():
-                    sg_router.prepare_port_filter(port)
-                    if self.use_enhanced_rpc:
-                        self._update_security_group_info(
-                            security_groups, security_group_member_ips,sg_router=sg_router)
+                sg_router = self._get_router_firewall(port)
+                port_batches.setdefault(
+                    (self._get_namespace(port), sg_router), []).append(port)
+
+        self._apply_port_filters(
+            port_batches,
+            lambda sg_fw, port: sg_fw.prepare_port_filter(port),
+            security_groups, security_group_member_ips)
 
     def _update_security_group_info(self, security_groups,
                                         security_group_member_ips,sg_router=None):
@@ -316,21 +354,28 @@ class SecurityGroupAgentRpcMixin(object):
         if not device_ids:
             return
         LOG.info(_("Remove device filter for %r"), device_ids)
+        port_batches = collections.OrderedDict()
         for device_id in device_ids:
-            if self.firewall_router.get(device_id, None) is None:
-                device = self.firewall.ports.get(device_id)
-                if not device:
-                     continue
-                with self.firewall.defer_apply():
-                    self.firewall.remove_port_filter(device)
-            else:
-                device = self.firewall_router[device_id].ports.get(device_id)
-                if not device:
-                     continue
-
-                with self.firewall_router[device_id].defer_apply():
-                    self.firewall_router[device_id].remove_port_filter(device)
-
+            sg_fw = self.firewall_router.get(device_id, self.firewall)
+            device = sg_fw.ports.get(device_id)
+            if not device:
+                continue
+            ns_name = None if sg_fw is self.firewall else (
+                self._get_namespace(device))
+            port_batches.setdefault((ns_name, sg_fw), []).append(device)
+
+        self._apply_port_filters(
+            port_batches,
+            lambda sg_fw, port: sg_fw.remove_port_filter(port))
+
+        for ns_name, sg_fw in port_batches:
+            if sg_fw is self.firewall:
+                continue
+            for device in port_batches[(ns_name, sg_fw)]:
+                self.firewall_router.pop(device['id'], None)
+            if not sg_fw.ports:
+                # No port of the namespace is filtered anymore
+                self.firewall_namespaces.pop(ns_name, None)
 
     def refresh_firewall(self, device_ids=None):
         LOG.info("Refresh firewall rules, device_ids:%s" % device_ids)
@@ -343,6 +388,7 @@ class SecurityGroupAgentRpcMixin(object):
                 LOG.info(_("No ports here to refresh firewall"))
                 return
 
+        security_groups = security_group_member_ips = None
         if self.use_enhanced_rpc:
             devices_info = self.plugin_rpc.security_group_info_for_devices(
                 self.context, device_ids)
@@ -353,21 +399,25 @@ class SecurityGroupAgentRpcMixin(object):
             devices = self.plugin_rpc.security_group_rules_for_devices(
                 self.context, device_ids)
 
+        port_batches = collections.OrderedDict()
         for port in devices.values():
             if 'id' not in port or  self.firewall_router.get(port['id'], None) is None:
-                with self.firewall.defer_apply():
-                    LOG.debug(_("Update port filter for %s"), port)
-                    self.firewall.update_port_filter(port)
-                    if self.use_enhanced_rpc:
-                        self._update_security_group_info(
-                            security_groups, security_group_member_ips)
+                port_batches.setdefault((None, self.firewall),
+                                        []).append(port)
             else:
                 sg_router = self.firewall_router[port['id']]
-                with sg_router.defer_apply():
-                    sg_router.prepare_port_filter(port)
-                    if self.use_enhanced_rpc:
-                        self._update_security_group_info(
-                            security_groups, security_group_member_ips,sg_router=sg_router)
+                port_batches.setdefault(
+                    (self._get_namespace(port), sg_router), []).append(port)
+
+        def _refresh_port_filter(sg_fw, port):
+            if sg_fw is self.firewall:
+                LOG.debug(_("Update port filter for %s"), port)
+                sg_fw.update_port_filter(port)
+            else:
+                sg_fw.prepare_port_filter(port)
+
+        self._apply_port_filters(port_batches, _refresh_port_filter,
+                                 security_groups, security_group_member_ips)
 
     def firewall_refresh_needed(self):
         return self.global_refresh_firewall or self.devices_to_refilter
@@ -126,27 +126,28 @@ class Controller(object):
                                     % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_sorting_attr_name, False)
 
-    def _exclude_attributes_by_policy(self, context, data):
+    def _exclude_attributes_by_policy(self, context, data, checker=None):
         """Identifies attributes to exclude according to authZ policies.
 
         Return a list of attribute names which should be stripped from the
         response returned to the user because the user is not authorized
-        to see them.
+        to see them. A policy.Checker can be passed to share its results
+        with other checks of the same request.
         """
+        visible_attributes = []
         attributes_to_exclude = []
         for attr_name in data.keys():
             attr_data = self._attr_info.get(attr_name)
             if attr_data and attr_data['is_visible']:
-                if policy.check(
-                    context,
-                    '%s:%s' % (self._plugin_handlers[self.SHOW], attr_name),
-                    data,
-                    might_not_exist=True):
-                    # this attribute is visible, check next one
-                    continue
-            # if the code reaches this point then either the policy check
-            # failed or the attribute was not visible in the first place
-            attributes_to_exclude.append(attr_name)
+                visible_attributes.append(attr_name)
+            else:
+                attributes_to_exclude.append(attr_name)
+        if checker is None:
+            checker = policy.Checker(context)
+        # the attributes which are visible but the user is not authorized
+        # to see
+        attributes_to_exclude.extend(checker.get_refused_attributes(
+            self._plugin_handlers[self.SHOW], visible_attributes, data))
         return attributes_to_exclude
 
     def _view(self, context, data, fields_to_strip=None):
@@ -242,16 +243,14 @@ class Controller(object):
         obj_list = obj_getter(request.context, **kwargs)
         obj_list = sorting_helper.sort(obj_list)
         obj_list = pagination_helper.paginate(obj_list)
+        checker = policy.Checker(request.context)
         # Check authz
         if do_authz:
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
-                                        self._plugin_handlers[self.SHOW],
-                                        obj,
-                                        plugin=self._plugin)]
+            obj_list = checker.filter(self._plugin_handlers[self.SHOW],
+                                      obj_list)
         # Use the first element in the list for discriminating which attributes
         # should be filtered out because of authZ policies
         # fields_to_add contains a list of attributes added for request policy
@@ -260,7 +259,7 @@ class Controller(object):
         fields_to_strip = fields_to_add or []
         if obj_list:
             fields_to_strip += self._exclude_attributes_by_policy(
-                request.context, obj_list[0])
+                request.context, obj_list[0], checker)
         collection = {self._collection:
                       [self._filter_attributes(
                           request.context, obj,
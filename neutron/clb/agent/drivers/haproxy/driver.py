@@ -1,9 +1,12 @@
+import hashlib
 import os
 import shutil
 import socket
 
+import eventlet
 from oslo.config.cfg import CONF
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import netns_cleaner
 from neutron.agent.linux import utils as agent_utils
 from neutron.openstack.common import log
 from neutron.clb.common import constants
@@ -26,6 +29,9 @@ class HaproxyDriver(object):
         self.ip_wrap = ip_lib.IPWrapper(self.root_helper)
         self.vif = vif_driver.VIF()
 
+        # backend_id => last health state reported to plugin
+        self.backend_health_states = {}
+
         utils.ensure_state_dir()
         
     @staticmethod
@@ -40,30 +46,41 @@ class HaproxyDriver(object):
             except Exception as e:
                 LOG.warn("lb-%s: remove directory failed: %s" % (lb_id, e))
 
-    def _lb_netns_clean_up(self, lb_id):
+    def _lb_netns_clean_up(self, lb_id, device_names=None):
+        """Remove the interfaces and the namespace of a load balancer.
+        :param device_names: devices of the namespace when already listed,
+            the namespace is then known to exist
+        """
         netns = utils.get_namespace(lb_id)
+        ip_wrap = ip_lib.IPWrapper(self.root_helper, netns)
 
-        if not self.ip_wrap.netns.exists(netns):
-            return
+        if device_names is None:
+            if not self.ip_wrap.netns.exists(netns):
+                return
 
-        ip_wrap = ip_lib.IPWrapper(self.root_helper, netns)
-        # remove unexpected remained interfaces
-        try:
-            device_names = ip_wrap.get_devices(exclude_loopback=True)
-        except Exception as e:
-            LOG.warn("lb-%s: get network devices failed: %s" % (lb_id, e))
-            return
+            # remove unexpected remained interfaces
+            try:
+                device_names = ip_wrap.get_devices(exclude_loopback=True)
+            except Exception as e:
+                LOG.warn("lb-%s: get network devices failed: %s" % (lb_id, e))
+                return
 
+        all_removed = True
         for dev_name in device_names:
             try:
                 LOG.info("lb-%s: remove network device %s" % (lb_id, dev_name))
                 self.vif.unplug(netns, dev_name)
             except Exception as e:
+                all_removed = False
                 LOG.warn("lb-%s: remove network device %s failed: %s"
                          % (lb_id, dev_name, e))
 
+        if not all_removed:
+            # Only empty namespaces are removed
+            return
         try:
-            ip_wrap.garbage_collect_namespace()
+            # Every listed device is gone, no need to list them again
+            ip_wrap.netns.delete(netns)
         except Exception as e:
             LOG.warn("lb-%s: remove network namespace failed: %s" % (lb_id, e))
 
@@ -204,25 +221,37 @@ class HaproxyDriver(object):
                 _clean_up_pid_file(lb['id'])
                 return
 
+        if need_start:
+            config_files = _render_config_files(lb)
+            config_hash = _get_config_hash(config_files)
+
         if need_start and not process_exist:
             # spawn a new process
-            _save_certificates(lb)
-            _save_haproxy_config(lb)
+            _save_config_files(lb['id'], config_files)
             if self._lb_process_spawn(lb['id']) == 0:
+                _save_config_hash(lb['id'], config_hash)
                 return
 
         if need_start and process_exist:
-            _save_certificates(lb)
-            _save_haproxy_config(lb)
+            if config_hash == _load_config_hash(lb['id']):
+                # running process already uses this configuration
+                LOG.debug("lb-%s: configuration unchanged, skip reloading"
+                          % lb['id'])
+                return
+
+            _save_config_files(lb['id'], config_files)
             # try to reload new configuration
             if self._lb_process_reload(lb['id']) == 0:
+                _save_config_hash(lb['id'], config_hash)
                 return
 
             # if failed, kill old process and spawn a new one
             if self._lb_process_kill(lb['id']) == 0:
                 if self._lb_process_spawn(lb['id']) == 0:
+                    _save_config_hash(lb['id'], config_hash)
                     return
 
+        _clean_up_cfg_hash_file(lb['id'])
         raise RuntimeError
 
     def sync_load_balancer(self, lb):
@@ -243,13 +272,14 @@ class HaproxyDriver(object):
 
         LOG.debug("sync_load_balancer(%(id)s).end" % lb)
 
-    def set_default_gateway(self, lb):
-        netns = utils.get_namespace(lb['id'])
-
-        vifs = [vif for vif in lb['interfaces']
+    def _get_active_vifs(self, lb):
+        return [vif for vif in lb['interfaces']
                 if (vif['state'] != constants.STATE_ERROR and
                     vif['task_state'] != constants.TASK_DELETING)]
 
+    def _get_default_gateway(self, lb):
+        vifs = self._get_active_vifs(lb)
+
         public_vifs = [vif for vif in vifs if vif['is_public']]
 
         if public_vifs:
@@ -258,8 +288,7 @@ class HaproxyDriver(object):
                 for fixed_ip in port['fixed_ips']:
                     gateway_ip = fixed_ip['subnet'].get('gateway_ip')
                     if gateway_ip:
-                        self.vif.add_default_route(netns, gateway_ip)
-                        return
+                        return gateway_ip
             LOG.warn("lb-%(id)s: not any gateway ip found in public interfaces"
                      % lb)
         else:
@@ -269,19 +298,23 @@ class HaproxyDriver(object):
                 for fixed_ip in port['fixed_ips']:
                     gateway_ip = fixed_ip['subnet'].get('gateway_ip')
                     if gateway_ip:
-                        self.vif.add_default_route(netns, gateway_ip)
-                        return
+                        return gateway_ip
             LOG.warn("lb-%(id)s: default gateway ip could not be set" % lb)
 
+    def set_default_gateway(self, lb):
+        netns = utils.get_namespace(lb['id'])
+        gateway_ip = self._get_default_gateway(lb)
+        if gateway_ip:
+            self.vif.add_default_route(netns, gateway_ip)
+
     def refresh_routes(self, lb):
         netns = utils.get_namespace(lb['id'])
-        for vif in lb['interfaces']:
-            if (vif['state'] != constants.STATE_ERROR and
-                vif['task_state'] != constants.TASK_DELETING):
-                port = vif['port']
-                vif_name = self.vif.get_vif_name(self, port)
-                self.vif.add_route(netns, vif_name, port)
-        self.set_default_gateway(lb)
+        # Routes of every interface and the default route in one batch
+        vifs = [(self.vif.get_vif_name(vif['port']), vif['port'])
+                for vif in self._get_active_vifs(lb)]
+        self.vif.setup_l3(netns, vifs,
+                          default_gateway=self._get_default_gateway(lb),
+                          addresses=False)
 
     def ensure_interface(self, lb, vif):
         """Ensure existence and configuration of load balancer interface.
@@ -297,10 +330,10 @@ class HaproxyDriver(object):
         # If interface already exists, call vif.plug
         # will just do nothing.
         self.vif.plug(netns, vif_name, port)
-        self.vif.setup_ip_addresses(netns, vif_name, port)
-        self.vif.add_routes(netns, vif_name, port)
+        # Addresses, routes and default route in one batch
+        self.vif.setup_l3(netns, [(vif_name, port)],
+                          default_gateway=self._get_default_gateway(lb))
         self.vif.setup_rate_limit(netns, vif)
-        self.set_default_gateway(lb)
 
         LOG.debug("ensure_interface(%(id)s).end" % vif)
 
@@ -322,15 +355,35 @@ class HaproxyDriver(object):
 
     def collect_stats(self):
         """Collect statistic data for all Haproxy processes. In this Havana
-        release we only use the data to update backend health state."""
+        release we only use the data to update backend health state.
+        Haproxy sockets are read concurrently by a bounded green thread pool,
+        and only the backends whose health state flipped since the last
+        successful report are sent to plugin, in a single RPC call."""
         lb_ids = os.listdir(utils.get_state_dir())
-        for lb_id in lb_ids:
+        pool = eventlet.GreenPool(CONF.Haproxy.stats_workers)
+
+        backend_stats = {}
+        for lb_stats in pool.imap(_collect_lb_stats, lb_ids):
+            backend_stats.update(lb_stats)
+
+        health_states = {}
+        changed_states = []
+        updated_at = timeutils.strtime()
+        for backend_id, stats in backend_stats.iteritems():
+            health_state = stats[constants.STATS_STATUS]
+            health_states[backend_id] = health_state
+            if self.backend_health_states.get(backend_id) != health_state:
+                changed_states.append((backend_id, health_state, updated_at))
+
+        if changed_states:
             try:
-                backend_stats = haproxy_stats.collect_lb_stats(lb_id)
-                _update_backend_health_state(self.plugin_rpc, backend_stats)
+                self.plugin_rpc.update_backend_health_states(changed_states)
             except Exception as e:
-                msg = ("lb-%s: collecting statistic data failed: %s" % (lb_id, e))
-                LOG.warn(msg)
+                # keep previous states so that changes are resent next time
+                LOG.warn("Updating health state of %s backends through RPC "
+                         "failed: %s" % (len(changed_states), e))
+                return
+        self.backend_health_states = health_states
 
     ###############################################################
     # Cleanup on agent startup.
@@ -338,12 +391,19 @@ class HaproxyDriver(object):
 
     def _start_netns_cleanup(self, lbs):
         netns_list = self.ip_wrap.get_namespaces(self.root_helper)
-        lb_ids = [netns[len(constants.NS_PREFIX):]
-                  for netns in netns_list
-                  if netns.startswith(constants.NS_PREFIX)]
-        lb_ids_to_remove = [lb_id for lb_id in lb_ids if lb_id not in lbs]
-        for lb_id in lb_ids_to_remove:
-            self._lb_netns_clean_up(lb_id)
+        netns_to_remove = [netns for netns in netns_list
+                           if (netns.startswith(constants.NS_PREFIX) and
+                               netns[len(constants.NS_PREFIX):] not in lbs)]
+
+        def destroy(netns, devices):
+            self._lb_netns_clean_up(netns[len(constants.NS_PREFIX):],
+                                    device_names=devices)
+
+        # Stale namespaces are removed concurrently, each one with a single
+        # listing of its devices.
+        cleaner = netns_cleaner.NamespaceCleaner(
+            self.root_helper, destroy, workers=CONF.AGENT.cleanup_workers)
+        cleaner.clean(netns_to_remove)
 
     def _start_dir_and_process_cleanup(self, lbs):
         lb_ids = os.listdir(CONF.clb_state_path)
@@ -363,33 +423,64 @@ class HaproxyDriver(object):
         self._start_netns_cleanup(lbs)
 
 
-def _save_certificates(lb):
+def _render_config_files(lb):
+    """Render certificates and Haproxy configuration of load balancer.
+    :return files: file path => file content (dict)
+    """
+    files = {}
     lb_dir = utils.get_load_balancer_dir(lb['id'])
     for certificate in lb['certificates']:
         pem_file_path = os.path.join(lb_dir, '%s.pem' % certificate['id'])
         crt = certificate['certificate'].strip()
         key = certificate['key'].strip()
-        agent_utils.replace_file(pem_file_path, '%s\n%s' % (crt, key))
-
+        files[pem_file_path] = '%s\n%s' % (crt, key)
 
-def _save_haproxy_config(lb):
     cfg_file_path = utils.get_cfg_file_path(lb['id'])
-    cfg_text = haproxy_config.get_haproxy_config_text(lb)
-    agent_utils.replace_file(cfg_file_path, cfg_text)
+    files[cfg_file_path] = haproxy_config.get_haproxy_config_text(lb)
+    return files
 
 
-def _update_backend_health_state(plugin_rpc, backend_stats):
-    for backend_id, stats in backend_stats.iteritems():
-        try:
-            health_state = stats[constants.STATS_STATUS]
-            updated_at = timeutils.strtime()
-            plugin_rpc.update_backend_health_state(backend_id,
-                                                   health_state,
-                                                   updated_at)
-        except Exception as e:
-            msg = ("Updating health state of backend %s through RPC "
-                   "failed: %s")
-            LOG.debug(msg % (backend_id, e))
+def _get_config_hash(files):
+    digest = hashlib.sha1()
+    for path in sorted(files):
+        content = files[path]
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        digest.update('%s\0%d\0' % (os.path.basename(path), len(content)))
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def _save_config_files(lb_id, files):
+    # the hash is only saved once a process runs with these files
+    _clean_up_cfg_hash_file(lb_id)
+    for path, content in files.iteritems():
+        agent_utils.replace_file(path, content)
+
+
+def _load_config_hash(lb_id):
+    """Get hash of the configuration used by running Haproxy process.
+    Kept in load balancer directory so that it survives agent restart.
+    """
+    try:
+        with open(utils.get_cfg_hash_file_path(lb_id), 'r') as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def _save_config_hash(lb_id, config_hash):
+    agent_utils.replace_file(utils.get_cfg_hash_file_path(lb_id),
+                             config_hash)
+
+
+def _collect_lb_stats(lb_id):
+    try:
+        return haproxy_stats.collect_lb_stats(lb_id)
+    except Exception as e:
+        msg = ("lb-%s: collecting statistic data failed: %s" % (lb_id, e))
+        LOG.warn(msg)
+        return {}
 
 
 def _clean_up_sock_file(lb_id):
@@ -414,6 +505,16 @@ def _clean_up_pid_file(lb_id):
                      % (lb_id, pid_file))
 
 
+def _clean_up_cfg_hash_file(lb_id):
+    hash_file = utils.get_cfg_hash_file_path(lb_id)
+    if os.path.exists(hash_file):
+        try:
+            os.remove(hash_file)
+        except OSError as e:
+            LOG.warn("lb-%s: remove config hash file failed: %s"
+                     % (lb_id, e.strerror))
+
+
 def _clean_up_cfg_file(lb_id):
     cfg_file = utils.get_cfg_file_path(lb_id)
     if os.path.exists(cfg_file):
@@ -29,6 +29,9 @@ TYPE_SERVER_REQUEST = 4
 TYPE_BACKEND_RESPONSE = '1'
 TYPE_SERVER_RESPONSE = '2'
 
+SOCKET_RECV_SIZE = 65536
+SOCKET_TIMEOUT = 5
+
 
 def collect_lb_stats(lb_id):
     """Collect load balancer Haproxy process run time information.
@@ -62,20 +65,31 @@ def _get_raw_stats_from_socket(sock_file):
     :param sock_file: unix socket path
     """
     s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    s.connect(sock_file)
+    s.settimeout(SOCKET_TIMEOUT)
+    try:
+        s.connect(sock_file)
+
+        entity_type = TYPE_BACKEND_REQUEST | TYPE_SERVER_REQUEST
+        s.sendall('show stat -1 %s -1\n' % entity_type)
+
+        return _recv_all(s)
+    finally:
+        s.close()
 
-    entity_type = TYPE_BACKEND_REQUEST | TYPE_SERVER_REQUEST
-    s.send('show stat -1 %s -1\n' % entity_type)
 
-    raw_stats = ''
-    chunk_size = 1024
+def _recv_all(s):
+    """Read from socket until Haproxy closes the connection.
+    Chunks are joined once at the end instead of growing a string.
+    :param s: connected socket
+    :return data: (str) whole response
+    """
+    chunks = []
     while True:
-        chunk = s.recv(chunk_size)
-        raw_stats += chunk
-        if len(chunk) < chunk_size:
+        chunk = s.recv(SOCKET_RECV_SIZE)
+        if not chunk:
             break
-
-    return raw_stats
+        chunks.append(chunk)
+    return ''.join(chunks)
 
 
 def _parse_stats(raw_stats):
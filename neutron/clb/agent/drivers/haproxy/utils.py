@@ -32,6 +32,10 @@ def get_cfg_file_path(lb_id):
     return os.path.join(get_load_balancer_dir(lb_id), 'haproxy.cfg')
 
 
+def get_cfg_hash_file_path(lb_id):
+    return os.path.join(get_load_balancer_dir(lb_id), 'haproxy.cfg.sha1')
+
+
 def ensure_state_dir():
     state_dir_path = get_state_dir()
     if not os.path.isdir(state_dir_path):
@@ -46,45 +46,16 @@ class VIF(object):
         ip_wrapper = ip_lib.IPWrapper(self.root_helper, namespace=namespace)
         ip_wrapper.netns.execute(cmd, check_exit_code=False)
 
-    def _add_route(self, namespace, vif_name, network, netmask, gateway_ip): 
-        cmd = ['route', 'add', '-net', network, 'netmask', netmask, 
-               'gw', gateway_ip, 'dev', vif_name]
-        ip_wrapper = ip_lib.IPWrapper(self.root_helper, namespace=namespace)
-        ip_wrapper.netns.execute(cmd, check_exit_code=False)
-
     def _del_route(self, namespace, vif_name, network, netmask):
         cmd = ['route', 'del', '-net', network, 'netmask', netmask,
                'dev', vif_name]
         ip_wrapper = ip_lib.IPWrapper(self.root_helper, namespace=namespace)
         ip_wrapper.netns.execute(cmd, check_exit_code=False)
 
-    def _add_default_route(self, netns, vif_name, gateway_ip):
-        cmd = ['route', 'add', 'default', 'gw', gateway_ip]
-        ip_wrap = ip_lib.IPWrapper(self.root_helper, namespace=netns)
-        ip_wrap.netns.execute(cmd, check_exit_code=False)
-
     def add_route(self, namespace, vif_name, fixed_ip):
-        subnet = fixed_ip['subnet']
-        gateway_ip = subnet.get('gateway_ip')
-        host_routes = subnet.get('host_routes', [])
-
-        if not gateway_ip:
-            return
+        self._setup_l3(namespace, [(vif_name, {'fixed_ips': [fixed_ip]})],
+                       addresses=False)
 
-        network = str(netaddr.IPNetwork(subnet['cidr']).network)
-        netmask = str(netaddr.IPNetwork(subnet['cidr']).netmask)
-        self._add_route(namespace, vif_name, network, netmask, gateway_ip)
-
-        for host_route in host_routes:
-            network = str(netaddr.IPNetwork(host_route['destination']).network)
-            netmask = str(netaddr.IPNetwork(host_route['destination']).netmask)
-            self._add_route(namespace, vif_name, network, netmask,
-                            host_route['nexthop'])
-
-        if self.arp_count > 0:
-            ip = fixed_ip['ip_address']
-            self._send_gratuitous_arp(namespace, vif_name, ip, self.arp_count)
-    
     def del_route(self, namespace, vif_name, fixed_ip):
         gateway_ip = fixed_ip['subnet'].get('gateway_ip')
         if not gateway_ip:
@@ -96,49 +67,113 @@ class VIF(object):
         self._del_route(namespace, vif_name, network, netmask)
 
     def add_routes(self, namespace, vif_name, port):
-        for fixed_ip in port['fixed_ips']:
-            self.add_route(namespace, vif_name, fixed_ip)
+        self._setup_l3(namespace, [(vif_name, port)], addresses=False)
 
     def del_routes(self, namespace, vif_name, port):
         for fixed_ip in port['fixed_ips']:
             self.del_route(namespace, vif_name, fixed_ip)
 
     def add_default_route(self, netns, gateway_ip):
-        cmd = ['route', 'add', 'default', 'gw', gateway_ip]
-        ip_wrap = ip_lib.IPWrapper(self.root_helper, namespace=netns)
-        ip_wrap.netns.execute(cmd, check_exit_code=False)
-
-    def _init_l3(self, dev_name, ip_cidrs, namespace=None):
-        dev = ip_lib.IPDevice(dev_name, self.root_helper,
-                              namespace=namespace)
-        
-        removed_ip_cidrs = {}
-        for addr in dev.addr.list(scope='global', filters=['permanent']):
-            removed_ip_cidrs[addr['cidr']] = addr['ip_version']
-
-        added_ip_cidrs = []
-        for ip_cidr in ip_cidrs:
-            if ip_cidr in removed_ip_cidrs:
-                del removed_ip_cidrs[ip_cidr]
-            else:
-                added_ip_cidrs.append(ip_cidr)
-
-        for ip_cidr, ip_version in removed_ip_cidrs.items():
-            dev.addr.delete(ip_version, ip_cidr)
-        
-        for ip_cidr in added_ip_cidrs:
-            net = netaddr.IPNetwork(ip_cidr)
-            dev.addr.add(net.version, ip_cidr, str(net.broadcast))
+        self._setup_l3(netns, [], addresses=False, default_gateway=gateway_ip)
 
     def setup_ip_addresses(self, namespace, vif_name, port):
-        cidrs = []
+        self._setup_l3(namespace, [(vif_name, port)], routes=False)
 
-        for fixed_ip in port['fixed_ips']:
-            prefixlen = netaddr.IPNetwork(fixed_ip['subnet']['cidr']).prefixlen
-            cidr = '%s/%s' % (fixed_ip['ip_address'], prefixlen)
-            cidrs.append(cidr)
+    def setup_l3(self, namespace, vifs, default_gateway=None,
+                 addresses=True):
+        """Configure addresses and routes of load balancer interfaces.
+        :param namespace: load balancer network namespace
+        :param vifs: list of (vif_name, port) to configure
+        :param default_gateway: default route of the namespace, if any
+        :param addresses: False to only configure the routes
+        """
+        self._setup_l3(namespace, vifs, addresses=addresses,
+                       default_gateway=default_gateway)
 
-        self._init_l3(vif_name, cidrs, namespace=namespace)
+    ######################################################
+    # Batched address and route programming
+    ######################################################
+
+    @staticmethod
+    def _route_dst(dst):
+        if dst == 'default':
+            return dst
+        # The kernel omits the prefix length of host routes
+        return str(netaddr.IPNetwork(dst).cidr)
+
+    def _get_routes(self, batch):
+        routes = set()
+        for route in batch.get_routes():
+            try:
+                dst = self._route_dst(route['destination'])
+            except netaddr.AddrFormatError:
+                # unreachable, blackhole... routes are not managed here
+                continue
+            routes.add((dst, route['via'], route['dev']))
+        return routes
+
+    def _get_vif_routes(self, port):
+        # Route subnets and their host routes through their gateway
+        routes = []
+        for fixed_ip in port['fixed_ips']:
+            subnet = fixed_ip['subnet']
+            gateway_ip = subnet.get('gateway_ip')
+            if not gateway_ip:
+                continue
+            routes.append((self._route_dst(subnet['cidr']), gateway_ip))
+            for host_route in subnet.get('host_routes', []):
+                routes.append((self._route_dst(host_route['destination']),
+                               host_route['nexthop']))
+        return routes
+
+    def _setup_l3(self, namespace, vifs, addresses=True, routes=True,
+                  default_gateway=None):
+        """Diff the addresses and routes of vifs against the namespace and
+        apply the changes with a single ip -batch run.
+        """
+        ip_wrapper = ip_lib.IPWrapper(self.root_helper, namespace=namespace)
+        # Like the route commands this replaces, a failure of one of them
+        # (e.g. route already there) does not stop the others.
+        with ip_wrapper.batch(check_exit_code=False) as batch:
+            for vif_name, port in vifs if addresses else []:
+                device = batch.device(vif_name)
+                removed_ip_cidrs = dict(
+                    (addr['cidr'], addr['ip_version']) for addr in
+                    device.addr.list(scope='global', filters=['permanent']))
+                added_ip_cidrs = []
+                for fixed_ip in port['fixed_ips']:
+                    net = netaddr.IPNetwork(fixed_ip['subnet']['cidr'])
+                    ip_cidr = '%s/%s' % (fixed_ip['ip_address'],
+                                         net.prefixlen)
+                    if removed_ip_cidrs.pop(ip_cidr, None) is None:
+                        added_ip_cidrs.append(ip_cidr)
+                for ip_cidr, ip_version in removed_ip_cidrs.items():
+                    device.addr.delete(ip_version, ip_cidr)
+                for ip_cidr in added_ip_cidrs:
+                    net = netaddr.IPNetwork(ip_cidr)
+                    device.addr.add(net.version, ip_cidr, str(net.broadcast))
+
+            current_routes = self._get_routes(batch)
+            for vif_name, port in vifs if routes else []:
+                for dst, via in self._get_vif_routes(port):
+                    if (dst, via, vif_name) not in current_routes:
+                        # prepend keeps the kernel subnet route, as route(8)
+                        batch.add('route', 'prepend', dst, 'via', via,
+                                  'dev', vif_name)
+
+            if default_gateway and not [
+                    route for route in current_routes
+                    if route[:2] == ('default', default_gateway)]:
+                batch.add('route', 'replace', 'default', 'via',
+                          default_gateway)
+
+        if routes and self.arp_count > 0:
+            for vif_name, port in vifs:
+                for fixed_ip in port['fixed_ips']:
+                    if fixed_ip['subnet'].get('gateway_ip'):
+                        self._send_gratuitous_arp(namespace, vif_name,
+                                                  fixed_ip['ip_address'],
+                                                  self.arp_count)
 
     def plug(self, netns, vif_name, port):
         if ip_lib.device_exists(vif_name, self.root_helper, netns):
@@ -162,132 +197,151 @@ class VIF(object):
     # Open vSwitch interface and port QoS rate limiting 
     ######################################################
 
-    def _ovs_get_interface_uuid(self, port_id):
-        """Get OVS port interface uuid through load balancer interface id.
+    def _ovs_vsctl(self, args):
+        return utils.execute(['ovs-vsctl', '--timeout=2'] + args,
+                             root_helper=self.root_helper)
+
+    def _ovs_vsctl_tables(self, args):
+        result = self._ovs_vsctl(['--format=json'] + args)
+        return [json.loads(line) for line in result.splitlines()
+                if line.strip()]
+
+    @staticmethod
+    def _ovs_qos_rows(qos_table):
+        # QoS rows are [uuid, other_config, queues] in ovs-vsctl JSON
+        qoses = []
+        for qos_uuid, other_config, queues in qos_table['data']:
+            qoses.append({
+                'uuid': qos_uuid[1],
+                'max_rate': dict(other_config[1]).get('max-rate'),
+                'queues': [queue[1] for _key, queue in queues[1]],
+            })
+        return qoses
+
+    def _ovs_get_rate_limit(self, port_id):
+        """Read the current rate limits of a load balancer interface.
+        The OVS interface and the QoS created for it are fetched with a
+        single ovs-vsctl call.
         :param port_id: load balancer interface id
         """
-        args = ['ovs-vsctl', '--timeout=2',
-                '--columns=_uuid',
-                'find', 'Interface',
-                'external_ids:iface-id="%s"' % port_id]
-        result = utils.execute(args, root_helper=self.root_helper)
-
-        if not result:
+        iface_table, qos_table = self._ovs_vsctl_tables([
+            '--', '--columns=name,ingress_policing_rate,'
+                  'ingress_policing_burst',
+            'find', 'Interface', 'external_ids:iface-id="%s"' % port_id,
+            '--', '--columns=_uuid,other_config,queues',
+            'find', 'QoS', 'external_ids:iface-id="%s"' % port_id])
+
+        if not iface_table['data']:
             msg = "Open vSwitch interface for Neutron port %s not found"
             raise RuntimeError(msg % port_id)
 
-        ovs_interface_uuid = result.split(':')[1].strip()
-
-        return ovs_interface_uuid
-
-    def _ovs_get_port_qos_info(self, ovs_interface_uuid):
-        args = ['ovs-vsctl', '--timeout=2',
-                '--columns=_uuid,qos',
-                'find', 'Port',
-                'interfaces=[%s]' % ovs_interface_uuid]
-        result = utils.execute(args, root_helper=self.root_helper)
-
-        if not result:
-            msg = "Open vSwitch port for interface %s not found"
-            raise RuntimeError(msg % ovs_interface_uuid)
-
-        lines = result.splitlines()
-        ovs_port_uuid = lines[0].split(':')[1].strip()
-        ovs_qos_uuid = lines[1].split(':')[1].strip()
-        
-        qos_info = {
-            'port': ovs_port_uuid,
-            'qos': None,
-            'queue': None,
+        name, ingress, ingress_burst = iface_table['data'][0]
+        return {
+            'name': name,
+            'ingress_policing_rate': ingress,
+            'ingress_policing_burst': ingress_burst,
+            'qos': self._ovs_qos_rows(qos_table),
         }
-        
-        if len(ovs_qos_uuid) == 36:
-            qos_info['qos'] = ovs_qos_uuid
-            args = ['ovs-vsctl', '--timeout=2', '--columns=queues',
-                    'list', 'qos', qos_info['qos']]
-            output = utils.execute(args, root_helper=self.root_helper)
-            queues = output.split(':')[1].strip()
-            if len(queues) > 3:
-                qos_info['queue'] = queues[1:-1].split('=')[1]
-
-        return qos_info
-
-    def _ovs_set_interface_ingress(self, interface_uuid, inbound_limit):
-        """Set up ingress rate limiting through OVS interface ingress
-        policy.
+
+    def _ovs_get_untagged_port_qos(self, port_name):
+        """Get the QoS of a port created before QoS rows were tagged with
+        the interface id, so that it is not leaked when replaced.
+        """
+        port_table, = self._ovs_vsctl_tables([
+            '--', '--columns=qos', 'find', 'Port', 'name="%s"' % port_name])
+        if not port_table['data'] or port_table['data'][0][0][0] != 'uuid':
+            return []
+        qos_uuid = port_table['data'][0][0][1]
+        qos_table, = self._ovs_vsctl_tables([
+            '--', '--columns=_uuid,other_config,queues',
+            'list', 'QoS', qos_uuid])
+        return self._ovs_qos_rows(qos_table)
+
+    def _ovs_interface_ingress_args(self, current, inbound_limit):
+        """Get the ovs-vsctl commands setting up ingress rate limiting
+        through OVS interface ingress policy, none if already applied.
         :param inbound_limit: unit is KiB (1024 bytes/second)
         """
         if inbound_limit < 0:
             raise ValueError("inbound_limit is negative.")
-        
+
         burst = 0.1 * inbound_limit * 1024
         if burst < CONF.network_device_mtu:
             burst = CONF.network_device_mtu
-        
+
         ingress = int(inbound_limit * 1024.0 * 8.0 / 1000.0)
         ingress_burst = int(burst * 8.0 / 1000.0)
-        
-        args = ['ovs-vsctl', '--timeout=2',
-                'set', 'Interface', interface_uuid,
-                'ingress_policing_rate=%d' % ingress]
-        utils.execute(args, root_helper=self.root_helper)
-        
-        args = ['ovs-vsctl', '--timeout=2',
-                'set', 'Interface', interface_uuid,
+
+        if (current['ingress_policing_rate'] == ingress and
+                current['ingress_policing_burst'] == ingress_burst):
+            return []
+
+        return ['--', 'set', 'Interface', current['name'],
+                'ingress_policing_rate=%d' % ingress,
                 'ingress_policing_burst=%d' % ingress_burst]
-        utils.execute(args, root_helper=self.root_helper)
 
-    def _ovs_set_port_qos(self, qos_info, outbound_limit):
-        """Set up egress rate limiting through OVS port QoS.
-        :param qos_info: (dict) uuid of Port, QoS and Queue
+    def _ovs_port_qos_args(self, current, port_id, outbound_limit):
+        """Get the ovs-vsctl commands setting up egress rate limiting
+        through OVS port QoS, none if already applied.
         :param outbound_limit: unit is KiB (1024 bytes/second)
         """
         if outbound_limit < 0:
             raise ValueError("outbound_limit is negative.")
-        
-        # remove old qos & queue
-        if qos_info['qos']:
-            args = ['ovs-vsctl', '--timeout=2',
-                    '--', 'destroy', 'qos', qos_info['qos'],
-                    '--', 'clear', 'port', qos_info['port'], 'qos']
 
-            if qos_info['queue']:
-                args = args + ['--', 'destroy', 'queue', qos_info['queue']]
-
-            utils.execute(args, root_helper=self.root_helper)
-        
-        if outbound_limit == 0:
-            return
-        
-        # create new qos & queue, unit is bit/s    
-        out_max_rate = outbound_limit * 1024 * 8 
+        # unit is bit/s
+        out_max_rate = outbound_limit * 1024 * 8
+        qoses = current['qos']
+        if outbound_limit and len(qoses) == 1:
+            if qoses[0]['max_rate'] == str(out_max_rate):
+                return []
+        elif not qoses:
+            qoses = self._ovs_get_untagged_port_qos(current['name'])
+            if not outbound_limit and not qoses:
+                return []
+
+        port_name = current['name']
+        if outbound_limit:
+            args = ['--', 'set', 'Port', port_name, 'qos=@newqos',
+                    '--', '--id=@newqos',
+                    'create', 'QoS', 'type=linux-htb',
+                    'other-config:max-rate=%d' % out_max_rate,
+                    'external_ids:iface-id="%s"' % port_id,
+                    'queues=0=@q0',
+                    '--', '--id=@q0',
+                    'create', 'Queue',
+                    'other-config:max-rate=%d' % out_max_rate]
+        else:
+            args = ['--', 'clear', 'Port', port_name, 'qos']
 
-        args = ['ovs-vsctl', '--timeout=2', 
-                '--', 'set', 'Port', qos_info['port'], 'qos=@newqos',
-                '--', '--id=@newqos',
-                'create', 'QoS', 'type=linux-htb',
-                'other-config:max-rate=%d' % out_max_rate,
-                'queues=0=@q0',
-                '--', '--id=@q0', 
-                'create', 'Queue',
-                'other-config:max-rate=%d' % out_max_rate]
+        # remove old qos & queue
+        for qos in qoses:
+            args += ['--', 'destroy', 'QoS', qos['uuid']]
+            for queue in qos['queues']:
+                args += ['--', 'destroy', 'Queue', queue]
 
-        utils.execute(args, root_helper=self.root_helper)
+        return args
 
     def setup_rate_limit(self, namespace, interface):
         """Rate limit settings for load balancer interfaces.
+        The current limits are read back first, changes are then applied
+        in a single ovs-vsctl transaction and unchanged limits cause no
+        write at all.
         Note: this only works for OVS interface driver.
         :param namespace: load balancer network namespace
         :param interface: complete interface information
         """
         port = interface['port']
-        
-        ovs_interface_uuid = self._ovs_get_interface_uuid(port['id'])
 
+        current = self._ovs_get_rate_limit(port['id'])
+
+        args = []
         if 'inbound_limit' in interface:
-            self._ovs_set_interface_ingress(ovs_interface_uuid,
-                                            interface['inbound_limit'])
+            args += self._ovs_interface_ingress_args(
+                current, interface['inbound_limit'])
 
         if 'outbound_limit' in interface:
-            qos_info = self._ovs_get_port_qos_info(ovs_interface_uuid)
-            self._ovs_set_port_qos(qos_info, interface['outbound_limit'])
+            args += self._ovs_port_qos_args(current, port['id'],
+                                            interface['outbound_limit'])
+
+        if args:
+            self._ovs_vsctl(args)
@@ -1,4 +1,7 @@
+import collections
 import time
+
+import eventlet
 from neutron import context
 from neutron.agent import rpc as agent_rpc
 from neutron.common import rpc
@@ -12,17 +15,82 @@ from neutron.clb.common import constants
 
 LOG = log.getLogger(__name__)
 
+# max number of notifications sent in one notify_batch call
+NOTIFY_BATCH_SIZE = 200
+
 
 class ClbPluginRpcapi(rpc.RpcProxy):
     """RPC calls from agent side to plugin side."""
     API_VERSION = '1.0'
     # history
     #   1.0 Initial version
+    #   1.1 bulk backend health state update
+    #   1.2 batched operation result notifications
 
-    def __init__(self, topic, ctx, host):
+    def __init__(self, topic, ctx, host, notify_interval=1,
+                 notify_backlog=1000):
         super(ClbPluginRpcapi, self).__init__(topic, self.API_VERSION)
         self.context = ctx
         self.host = host
+        # Operation results are queued and sent by a green thread, so that
+        # RPC handlers do not wait for a round-trip to plugin.
+        # resource => latest notification, older ones are coalesced
+        self._notifications = collections.OrderedDict()
+        self.notify_interval = notify_interval
+        self.notify_backlog = notify_backlog
+
+    def start_notifier(self):
+        eventlet.spawn_n(self._notify_loop)
+
+    def _notify_loop(self):
+        interval = self.notify_interval
+        while True:
+            eventlet.sleep(interval)
+            if self.flush_notifications():
+                interval = self.notify_interval
+            else:
+                # back off while plugin is unreachable
+                interval = min(interval * 2, self.notify_interval * 32)
+
+    def flush_notifications(self):
+        """Send queued notifications in notify_batch calls. Notifications
+        which could not be sent are queued again, unless a newer one for
+        the same resource has been queued meanwhile.
+        :return: (bool) True if every notification has been sent
+        """
+        pending = self._notifications.items()
+        self._notifications = collections.OrderedDict()
+
+        for i in range(0, len(pending), NOTIFY_BATCH_SIZE):
+            chunk = pending[i:i + NOTIFY_BATCH_SIZE]
+            try:
+                self.call(
+                    self.context,
+                    self.make_msg('notify_batch',
+                                  notifications=[notification for _key,
+                                                 notification in chunk]),
+                    topic=self.topic,
+                    version='1.2'
+                )
+            except Exception as e:
+                LOG.warn("Sending %d notifications failed, will retry: %s"
+                         % (len(pending) - i, e))
+                requeued = collections.OrderedDict(
+                    (key, notification) for key, notification in pending[i:]
+                    if key not in self._notifications)
+                requeued.update(self._notifications)
+                self._notifications = requeued
+                return False
+        return True
+
+    def _notify(self, method, **kwargs):
+        while len(self._notifications) >= self.notify_backlog:
+            LOG.warn("Notification backlog is full, waiting")
+            eventlet.sleep(self.notify_interval)
+
+        key = tuple(sorted(kwargs.items()))
+        self._notifications.pop(key, None)
+        self._notifications[key] = {'method': method, 'args': kwargs}
 
     def get_all_load_balancers(self):
         return self.call(
@@ -33,102 +101,55 @@ class ClbPluginRpcapi(rpc.RpcProxy):
         )
 
     def notify_create_load_balancer_succ(self, load_balancer_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_create_load_balancer_succ',
-                          load_balancer_id=load_balancer_id),
-            topic=self.topic
-        )
+        return self._notify('notify_create_load_balancer_succ',
+                            load_balancer_id=load_balancer_id)
     
     def notify_create_load_balancer_fail(self, load_balancer_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_create_load_balancer_fail',
-                          load_balancer_id=load_balancer_id),
-            topic=self.topic
-        )
+        return self._notify('notify_create_load_balancer_fail',
+                            load_balancer_id=load_balancer_id)
 
     def notify_delete_load_balancer_succ(self, load_balancer_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_delete_load_balancer_succ',
-                          load_balancer_id=load_balancer_id),
-            topic=self.topic
-        )
+        return self._notify('notify_delete_load_balancer_succ',
+                            load_balancer_id=load_balancer_id)
 
     def notify_delete_load_balancer_fail(self, load_balancer_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_delete_load_balancer_fail',
-                          load_balancer_id=load_balancer_id),
-            topic=self.topic
-        )
+        return self._notify('notify_delete_load_balancer_fail',
+                            load_balancer_id=load_balancer_id)
 
     def notify_sync_load_balancer_succ(self, load_balancer_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_sync_load_balancer_succ',
-                          load_balancer_id=load_balancer_id),
-            topic=self.topic
-        )
+        return self._notify('notify_sync_load_balancer_succ',
+                            load_balancer_id=load_balancer_id)
 
     def notify_sync_load_balancer_fail(self, load_balancer_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_sync_load_balancer_fail',
-                          load_balancer_id=load_balancer_id),
-            topic=self.topic
-        )
+        return self._notify('notify_sync_load_balancer_fail',
+                            load_balancer_id=load_balancer_id)
 
     def notify_create_interface_succ(self, interface_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_create_interface_succ',
-                          interface_id=interface_id),
-            topic=self.topic
-        )
+        return self._notify('notify_create_interface_succ',
+                            interface_id=interface_id)
     
     def notify_create_interface_fail(self, interface_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_create_interface_fail',
-                          interface_id=interface_id),
-            topic=self.topic
-        )
+        return self._notify('notify_create_interface_fail',
+                            interface_id=interface_id)
     
     def notify_delete_interface_succ(self, interface_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_delete_interface_succ',
-                          interface_id=interface_id),
-            topic=self.topic
-        )
+        return self._notify('notify_delete_interface_succ',
+                            interface_id=interface_id)
     
     def notify_delete_interface_fail(self, interface_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_delete_interface_fail',
-                          interface_id=interface_id),
-            topic=self.topic
-        )
+        return self._notify('notify_delete_interface_fail',
+                            interface_id=interface_id)
     
     def notify_update_interface_succ(self, interface_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_update_interface_succ',
-                          interface_id=interface_id),
-            topic=self.topic
-        )
+        return self._notify('notify_update_interface_succ',
+                            interface_id=interface_id)
     
     def notify_update_interface_fail(self, interface_id):
-        return self.call(
-            self.context,
-            self.make_msg('notify_update_interface_fail',
-                          interface_id=interface_id),
-            topic=self.topic
-        ) 
+        return self._notify('notify_update_interface_fail',
+                            interface_id=interface_id)
 
     def notify_plug_interface_port(self, port_id):
+        # never batched, port binding is needed to wire the interface
         return self.call(
             self.context,
             self.make_msg('notify_plug_interface_port',
@@ -148,6 +169,18 @@ class ClbPluginRpcapi(rpc.RpcProxy):
             topic=self.topic
         )
 
+    def update_backend_health_states(self, health_states):
+        """Update health state of several backends at once.
+        :param health_states: list of (backend_id, health_state, updated_at)
+        """
+        return self.call(
+            self.context,
+            self.make_msg('update_backend_health_states',
+                          health_states=health_states),
+            topic=self.topic,
+            version='1.1'
+        )
+
 
 class ClbAgentManager(rpc.RpcCallback, periodic_task.PeriodicTasks):
     """plugin-to-agent RPC calls."""
@@ -182,8 +215,11 @@ class ClbAgentManager(rpc.RpcCallback, periodic_task.PeriodicTasks):
         self.plugin_rpc = ClbPluginRpcapi(
             topics.CLB_PLUGIN_RPC,
             self.context,
-            self.conf.host
+            self.conf.host,
+            notify_interval=self.conf.AGENT.notify_interval,
+            notify_backlog=self.conf.AGENT.notify_backlog
         )
+        self.plugin_rpc.start_notifier()
 
         self.driver = self._load_driver()
         self.agent_state['configurations']['provider'] = self.driver.get_provider_name()
@@ -236,8 +272,14 @@ class ClbAgentManager(rpc.RpcCallback, periodic_task.PeriodicTasks):
             self.plugin_rpc.notify_delete_load_balancer_fail(lb['id'])
 
     def sync_load_balancer(self, context, load_balancer):
+        # load balancers rescheduled from a dead agent carry interfaces
+        if 'interfaces' in load_balancer:
+            self._sync_lb_and_vifs_state(load_balancer)
+        else:
+            self._sync_load_balancer(load_balancer)
+
+    def _sync_load_balancer(self, lb):
         try:
-            lb = load_balancer
             self.driver.sync_load_balancer(lb)
             self.plugin_rpc.notify_sync_load_balancer_succ(lb['id'])
             LOG.info("Load balancer %s successfully syncronized" % lb['id'])
@@ -315,25 +357,42 @@ class ClbAgentManager(rpc.RpcCallback, periodic_task.PeriodicTasks):
         for vif in vifs:
             self._sync_vif_state(lb, vif)
 
+    def _sync_lb_and_vifs_state(self, lb):
+        # interfaces first, so that Haproxy can bind to their addresses
+        self._sync_vifs_state(lb, lb['interfaces'])
+        self._sync_load_balancer(lb)
+
     def _sync_lb_state(self, lb):
         if lb['task_state'] == constants.TASK_CREATING:
             self.create_load_balancer(self.context, lb)
         elif lb['task_state'] == constants.TASK_DELETING:
             self.delete_load_balancer(self.context, lb)
         elif lb['task_state'] == constants.TASK_SYNCRONIZING:
-            self.sync_load_balancer(self.context, lb)
-            self._sync_vifs_state(lb, lb['interfaces'])
+            self._sync_lb_and_vifs_state(lb)
         elif lb['task_state'] == constants.TASK_NONE:
             if lb['state'] != constants.STATE_ERROR:
-                self.sync_load_balancer(self.context, lb)
-                self._sync_vifs_state(lb, lb['interfaces'])
+                self._sync_lb_and_vifs_state(lb)
         else:
             LOG.warn("lb-%(id)s: unknown task state: "
                      "%(task_state)s" % lb)
 
+    def _sync_lb_state_safe(self, lb):
+        try:
+            self._sync_lb_state(lb)
+        except Exception:
+            LOG.exception("lb-%s: resyncronization failed" % lb['id'])
+
     def _sync_lbs_state(self, lbs):
+        """Resyncronize load balancers concurrently. Each load balancer
+        (thus each namespace) is handled by a single green thread, so its
+        own operations keep their order."""
+        start = time.time()
+        pool = eventlet.GreenPool(self.conf.AGENT.resync_workers)
         for lb in lbs:
-            self._sync_lb_state(lb)
+            pool.spawn_n(self._sync_lb_state_safe, lb)
+        pool.waitall()
+        LOG.info("Resyncronized %d load balancers in %.2f seconds"
+                 % (len(lbs), time.time() - start))
 
     def start_cleanup_on_init(self):
         lbs = self._get_load_balancers_hosted_by_this_agent()
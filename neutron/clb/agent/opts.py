@@ -1,4 +1,4 @@
-from oslo.config.cfg import IntOpt, StrOpt
+from oslo.config.cfg import FloatOpt, IntOpt, StrOpt
 
 
 DEFAULT_OPTS = [
@@ -36,6 +36,26 @@ AGENT_OPTS = [
         'driver',
         default='neutron.clb.agent.drivers.haproxy.driver.HaproxyDriver',
         help="Driver used to manage load balancing devices"),
+    IntOpt(
+        'resync_workers',
+        default=16,
+        help="Number of load balancers resyncronized concurrently on "
+             "agent startup"),
+    FloatOpt(
+        'notify_interval',
+        default=1.0,
+        help="Seconds between sending queued operation results to "
+             "server"),
+    IntOpt(
+        'cleanup_workers',
+        default=16,
+        help="Number of stale load balancer namespaces removed "
+             "concurrently on agent startup"),
+    IntOpt(
+        'notify_backlog',
+        default=1000,
+        help="Maximum number of queued operation results, operations "
+             "wait when it is reached"),
 ]
 
 
@@ -56,6 +76,11 @@ HAPROXY_OPTS = [
         'haproxy_bin',
         default='/opt/haproxy/usr/local/sbin/haproxy',
         help="Path of Haproxy binary"),
+    IntOpt(
+        'stats_workers',
+        default=32,
+        help="Number of green threads collecting Haproxy statistics "
+             "concurrently"),
 ]
 
 
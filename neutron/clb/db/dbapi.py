@@ -116,6 +116,11 @@ def _get_collection_query(context, model, filters=None,
     return collection
 
 
+def get_marker_obj(context, model, limit, marker):
+    if limit and marker:
+        return get_resource(context, model, marker)
+
+
 def get_resources(context, model, filters=None, fields=None, 
                   sorts=None, limit=None, marker_obj=None, 
                   page_reverse=False):
@@ -295,9 +300,13 @@ def get_load_balancer(context, load_balancer_id, fields=None):
     return load_balancer_db.dict(fields=fields)
 
 
-def get_load_balancers(context, filters=None, fields=None):
-    return get_resources(context, models.LoadBalancer, filters=filters,
-                         fields=fields)
+def get_load_balancers(context, filters=None, fields=None, sorts=None,
+                       limit=None, marker=None, page_reverse=False):
+    marker_obj = get_marker_obj(context, models.LoadBalancer, limit, marker)
+    return get_resources(context, models.LoadBalancer,
+                         filters=filters, fields=fields,
+                         sorts=sorts, limit=limit, marker_obj=marker_obj,
+                         page_reverse=page_reverse)
 
 
 #################################################
@@ -391,6 +400,21 @@ def sync_load_balancer_start(context, load_balancer_id):
     return load_balancer
 
 
+def reschedule_load_balancer_start(context, load_balancer_id):
+    """Start syncronizing a load balancer moved to a new agent. Unlike a
+    normal syncronization, interfaces are included so that the new agent
+    plugs them too."""
+    load_balancer = sync_load_balancer_start(context, load_balancer_id)
+
+    load_balancer_db = get_resource(context,
+                                    models.LoadBalancer,
+                                    load_balancer_id)
+    load_balancer['interfaces'] = [
+        _prepare_interface_info(context, interface_db)
+        for interface_db in load_balancer_db.interfaces]
+    return load_balancer
+
+
 def sync_load_balancer_succ(context, load_balancer_id):
     load_balancer_db = get_resource(context, 
                                     models.LoadBalancer, 
@@ -664,9 +688,13 @@ def get_interface(context, interface_id, fields=None):
     return interface_db.dict(fields=fields)
 
 
-def get_interfaces(context, filters=None, fields=None):
-    return get_resources(context, models.Interface, filters=filters, 
-                         fields=fields)
+def get_interfaces(context, filters=None, fields=None, sorts=None,
+                   limit=None, marker=None, page_reverse=False):
+    marker_obj = get_marker_obj(context, models.Interface, limit, marker)
+    return get_resources(context, models.Interface,
+                         filters=filters, fields=fields,
+                         sorts=sorts, limit=limit, marker_obj=marker_obj,
+                         page_reverse=page_reverse)
 
 
 #################################################
@@ -746,9 +774,13 @@ def get_certificate(context, certificate_id, fields=None):
     return certificate_db.dict(fields=fields)
 
 
-def get_certificates(context, filters=None, fields=None):
-    return get_resources(context, models.ClbCertificate, filters=filters, 
-                         fields=fields)
+def get_certificates(context, filters=None, fields=None, sorts=None,
+                     limit=None, marker=None, page_reverse=False):
+    marker_obj = get_marker_obj(context, models.ClbCertificate, limit, marker)
+    return get_resources(context, models.ClbCertificate,
+                         filters=filters, fields=fields,
+                         sorts=sorts, limit=limit, marker_obj=marker_obj,
+                         page_reverse=page_reverse)
 
 
 #################################################
@@ -1005,10 +1037,13 @@ def get_listener(context, listener_id, fields=None):
     return listener_db.dict(fields=fields)
 
 
-def get_listeners(context, filters=None, fields=None):
-    return get_resources(context, 
-                         models.Listener, 
-                         filters=filters, fields=fields)
+def get_listeners(context, filters=None, fields=None, sorts=None,
+                  limit=None, marker=None, page_reverse=False):
+    marker_obj = get_marker_obj(context, models.Listener, limit, marker)
+    return get_resources(context, models.Listener,
+                         filters=filters, fields=fields,
+                         sorts=sorts, limit=limit, marker_obj=marker_obj,
+                         page_reverse=page_reverse)
 
 
 #################################################
@@ -1156,9 +1191,13 @@ def get_backend(context, backend_id, fields=None):
     return backend_db.dict(fields=fields)
 
 
-def get_backends(context, filters=None, fields=None):
-    return get_resources(context, models.Backend, 
-                        filters=filters, fields=fields)
+def get_backends(context, filters=None, fields=None, sorts=None,
+                 limit=None, marker=None, page_reverse=False):
+    marker_obj = get_marker_obj(context, models.Backend, limit, marker)
+    return get_resources(context, models.Backend,
+                         filters=filters, fields=fields,
+                         sorts=sorts, limit=limit, marker_obj=marker_obj,
+                         page_reverse=page_reverse)
 
 
 def update_backend_health_state(context, backend_id, health_state, updated_at):
@@ -1167,3 +1206,30 @@ def update_backend_health_state(context, backend_id, health_state, updated_at):
         backend_db.health_state = health_state
         backend_db.updated_at = updated_at
 
+
+def update_backend_health_states(context, health_states):
+    """Update health state of many backends in one transaction.
+    Backends whose health state has not changed are left untouched.
+    :param health_states: list of (backend_id, health_state, updated_at)
+    :return count: (int) number of updated backends
+    """
+    params = []
+    for backend_id, health_state, updated_at in health_states:
+        if isinstance(updated_at, basestring):
+            updated_at = timeutils.parse_strtime(updated_at)
+        params.append({'backend_id': backend_id,
+                       'new_health_state': health_state,
+                       'new_updated_at': updated_at})
+    if not params:
+        return 0
+
+    table = models.Backend.__table__
+    stmt = table.update().where(
+        sql.and_(table.c.id == sql.bindparam('backend_id'),
+                 table.c.health_state != sql.bindparam('new_health_state'))
+    ).values(health_state=sql.bindparam('new_health_state'),
+             updated_at=sql.bindparam('new_updated_at'))
+
+    with context.session.begin(subtransactions=True):
+        result = context.session.execute(stmt, params)
+    return result.rowcount
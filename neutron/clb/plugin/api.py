@@ -1,9 +1,14 @@
+from eventlet import greenthread
+from oslo.config import cfg
+
+from neutron import context as neutron_context
 from neutron import manager
 from neutron.db import agents_db
 from neutron.db import api as neutron_dbapi
 from neutron.common import rpc
 from neutron.extensions import portbindings
 from neutron.openstack.common import log
+from neutron.openstack.common import loopingcall
 
 from neutron.clb.plugin import apibase
 from neutron.clb.common import topics
@@ -17,7 +22,11 @@ LOG = log.getLogger(__name__)
 
 class ClbPluginRpc(rpc.RpcCallback):
     """Plugin side agent-to-plugin callbacks."""
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.2'
+    # history
+    #   1.0 Initial version
+    #   1.1 bulk backend health state update
+    #   1.2 batched operation result notifications
 
     #########################################################
     # Load balancer operation result notification
@@ -77,6 +86,21 @@ class ClbPluginRpc(rpc.RpcCallback):
 
         core_plugin.update_port(context, port_id, {'port': port})
 
+    def notify_batch(self, context, notifications):
+        """Handle several notify_* calls sent by agent in one message.
+        :param notifications: list of {'method': name, 'args': kwargs}
+        """
+        for notification in notifications:
+            method = notification['method']
+            if not method.startswith('notify_') or method == 'notify_batch':
+                LOG.warn("Unknown notification %s" % method)
+                continue
+            try:
+                getattr(self, method)(context, **notification['args'])
+            except Exception:
+                LOG.exception("Handling notification %s(%s) failed"
+                              % (method, notification['args']))
+
     def get_all_load_balancers(self, context, host):
         agent_id = scheduler.get_agent_id_by_host(context, host)
         load_balancer_ids = scheduler.get_load_balancer_ids_by_agent(context,
@@ -90,6 +114,10 @@ class ClbPluginRpc(rpc.RpcCallback):
         dbapi.update_backend_health_state(context, backend_id, health_state,
                                           updated_at)
 
+    def update_backend_health_states(self, context, health_states):
+        count = dbapi.update_backend_health_states(context, health_states)
+        LOG.debug("Health state of %s backends changed" % count)
+
 
 class ClbAgentRpcApi(rpc.RpcProxy):
     """Plugin side plugin-to-agent RPC API."""
@@ -145,11 +173,17 @@ class ClbPluginApi(apibase.ClbPluginApiBase):
 
     supported_extension_aliases = ['clb']
 
+    # Collections are paginated and sorted by the database, see
+    # dbapi.get_resources. Name mangling qualifies these by class.
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self):
         # no service type manager support
         self.agent_rpc = ClbAgentRpcApi(topics.CLB_AGENT_RPC)
         self.scheduler = scheduler.ClbAgentScheduler()
         self._setup_callbacks()
+        self._start_agent_status_check()
     
     def _setup_callbacks(self):
         self.endpoints = [
@@ -166,6 +200,42 @@ class ClbPluginApi(apibase.ClbPluginApiBase):
 
         self.conn.consume_in_threads()
 
+    def _start_agent_status_check(self):
+        interval = cfg.CONF.clb_agent_check_interval
+        if interval > 0:
+            self.agent_status_check = loopingcall.FixedIntervalLoopingCall(
+                self.reschedule_load_balancers_from_down_agents)
+            self.agent_status_check.start(interval=interval,
+                                          initial_delay=interval)
+
+    def reschedule_load_balancers_from_down_agents(self):
+        """Move load balancers of agents which stopped heartbeating to
+        active agents, and ask the new agents to syncronize them."""
+        context = neutron_context.get_admin_context()
+        try:
+            down_agents = self.scheduler.get_down_agents(context)
+            if not down_agents:
+                return
+            rescheduled = self.scheduler.reschedule_load_balancers(
+                context, [agent_db.id for agent_db in down_agents])
+        except Exception:
+            LOG.exception("Rescheduling load balancers from down agents "
+                          "failed")
+            return
+
+        rate = cfg.CONF.clb_reschedule_rate
+        for load_balancer_id, agent in rescheduled:
+            try:
+                load_balancer = dbapi.reschedule_load_balancer_start(
+                    context, load_balancer_id)
+                self.agent_rpc.sync_load_balancer(agent, context,
+                                                  load_balancer)
+            except Exception:
+                msg = "Syncronizing rescheduled load balancer %s failed"
+                LOG.exception(msg % load_balancer_id)
+            if rate > 0:
+                greenthread.sleep(1.0 / rate)
+
     ###################################################
     # agent and scheduler operations used inside class
     ###################################################
@@ -234,9 +304,13 @@ class ClbPluginApi(apibase.ClbPluginApiBase):
         return dbapi.get_load_balancer(context, load_balancer_id, 
                                        fields=fields)
     
-    def get_load_balancers(self, context, filters=None, fields=None):
-        return dbapi.get_load_balancers(context, filters=filters, 
-                                        fields=fields)
+    def get_load_balancers(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
+        return dbapi.get_load_balancers(context, filters=filters,
+                                        fields=fields, sorts=sorts,
+                                        limit=limit, marker=marker,
+                                        page_reverse=page_reverse)
 
     def sync_load_balancer(self, context, load_balancer_id):
         load_balancer = dbapi.sync_load_balancer_start(context, 
@@ -327,8 +401,12 @@ class ClbPluginApi(apibase.ClbPluginApiBase):
     def get_interface(self, context, interface_id, fields=None):
         return dbapi.get_interface(context, interface_id, fields=fields)
     
-    def get_interfaces(self, context, filters=None, fields=None):
-        return dbapi.get_interfaces(context, filters=filters, fields=fields)
+    def get_interfaces(self, context, filters=None, fields=None,
+                       sorts=None, limit=None, marker=None,
+                       page_reverse=False):
+        return dbapi.get_interfaces(context, filters=filters, fields=fields,
+                                    sorts=sorts, limit=limit, marker=marker,
+                                    page_reverse=page_reverse)
 
     #########################################
     # certificate operations
@@ -352,8 +430,12 @@ class ClbPluginApi(apibase.ClbPluginApiBase):
     def get_certificate(self, context, certificate_id, fields=None):
         return dbapi.get_certificate(context, certificate_id, fields=fields)
     
-    def get_certificates(self, context, filters=None, fields=None):
-        return dbapi.get_certificates(context, filters=filters, fields=fields)
+    def get_certificates(self, context, filters=None, fields=None,
+                         sorts=None, limit=None, marker=None,
+                         page_reverse=False):
+        return dbapi.get_certificates(context, filters=filters, fields=fields,
+                                      sorts=sorts, limit=limit, marker=marker,
+                                      page_reverse=page_reverse)
 
     ###########################################
     # listener operations
@@ -376,8 +458,12 @@ class ClbPluginApi(apibase.ClbPluginApiBase):
     def get_listener(self, context, listener_id, fields=None):
         return dbapi.get_listener(context, listener_id, fields=fields)
     
-    def get_listeners(self, context, filters=None, fields=None):
-        return dbapi.get_listeners(context, filters=filters, fields=fields)
+    def get_listeners(self, context, filters=None, fields=None,
+                      sorts=None, limit=None, marker=None,
+                      page_reverse=False):
+        return dbapi.get_listeners(context, filters=filters, fields=fields,
+                                   sorts=sorts, limit=limit, marker=marker,
+                                   page_reverse=page_reverse)
 
     ########################################################
     # backend operations
@@ -400,5 +486,9 @@ class ClbPluginApi(apibase.ClbPluginApiBase):
     def get_backend(self, context, backend_id, fields=None):
         return dbapi.get_backend(context, backend_id, fields=fields)
     
-    def get_backends(self, context, filters=None, fields=None):
-        return dbapi.get_backends(context, filters=filters, fields=fields)
\ No newline at end of file
+    def get_backends(self, context, filters=None, fields=None,
+                     sorts=None, limit=None, marker=None,
+                     page_reverse=False):
+        return dbapi.get_backends(context, filters=filters, fields=fields,
+                                  sorts=sorts, limit=limit, marker=marker,
+                                  page_reverse=page_reverse)
\ No newline at end of file
@@ -36,7 +36,9 @@ class ClbPluginApiBase(service_base.ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_load_balancers(self, context, filters=None, fields=None):
+    def get_load_balancers(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -68,7 +70,9 @@ class ClbPluginApiBase(service_base.ServicePluginBase):
         pass
     
     @abc.abstractmethod
-    def get_interfaces(self, context, filters=None, fields=None):
+    def get_interfaces(self, context, filters=None, fields=None,
+                       sorts=None, limit=None, marker=None,
+                       page_reverse=False):
         pass
 
     #########################################
@@ -92,7 +96,9 @@ class ClbPluginApiBase(service_base.ServicePluginBase):
         pass
     
     @abc.abstractmethod
-    def get_certificates(self, context, filters=None, fields=None):
+    def get_certificates(self, context, filters=None, fields=None,
+                         sorts=None, limit=None, marker=None,
+                         page_reverse=False):
         pass
 
     ###########################################
@@ -116,7 +122,9 @@ class ClbPluginApiBase(service_base.ServicePluginBase):
         pass
     
     @abc.abstractmethod
-    def get_listeners(self, context, filters=None, fields=None):
+    def get_listeners(self, context, filters=None, fields=None,
+                      sorts=None, limit=None, marker=None,
+                      page_reverse=False):
         pass
     
     ###########################################
@@ -140,6 +148,8 @@ class ClbPluginApiBase(service_base.ServicePluginBase):
         pass
     
     @abc.abstractmethod
-    def get_backends(self, context, filters=None, fields=None):
+    def get_backends(self, context, filters=None, fields=None,
+                     sorts=None, limit=None, marker=None,
+                     page_reverse=False):
         pass
 
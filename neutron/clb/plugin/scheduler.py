@@ -1,4 +1,7 @@
+import heapq
 import random
+from oslo.config import cfg
+from sqlalchemy import func
 from sqlalchemy import orm
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 
@@ -12,6 +15,20 @@ from neutron.clb.db import models
 LOG = log.getLogger(__name__)
 
 
+CLB_SCHEDULER_OPTS = [
+    cfg.IntOpt('clb_agent_check_interval',
+               default=10,
+               help="Seconds between checks for dead CLB agents whose load "
+                    "balancers should be rescheduled, 0 to disable"),
+    cfg.IntOpt('clb_reschedule_rate',
+               default=50,
+               help="Maximum number of rescheduled load balancers sent to "
+                    "agents per second, 0 for no limit"),
+]
+
+cfg.CONF.register_opts(CLB_SCHEDULER_OPTS)
+
+
 class ClbAgentSchedulerDbMixin(agentschedulers_db.AgentSchedulerDbMixin):
     
     def get_agent_for_load_balancer(self, context, load_balancer_id,
@@ -60,6 +77,36 @@ class ClbAgentSchedulerDbMixin(agentschedulers_db.AgentSchedulerDbMixin):
 
         return {'load_balancers': load_balancers}
 
+    def get_agents_load(self, context, agent_ids):
+        """Count load balancers, listeners and backends hosted by agents
+        with a single aggregate query.
+        :param agent_ids: ids of agents to count for
+        :return: agent_id => (load balancers, listeners, backends) (dict)
+        """
+        if not agent_ids:
+            return {}
+
+        binding = models.LoadBalancerAgentBinding
+        query = context.session.query(
+            binding.agent_id,
+            func.count(func.distinct(binding.load_balancer_id)),
+            func.count(func.distinct(models.Listener.id)),
+            func.count(func.distinct(models.Backend.id))
+        )
+        query = query.outerjoin(
+            models.Listener,
+            models.Listener.load_balancer_id == binding.load_balancer_id)
+        query = query.outerjoin(
+            models.Backend,
+            models.Backend.listener_id == models.Listener.id)
+        query = query.filter(binding.agent_id.in_(agent_ids))
+        query = query.group_by(binding.agent_id)
+
+        agents_load = dict((agent_id, (0, 0, 0)) for agent_id in agent_ids)
+        for agent_id, lbs, listeners, backends in query:
+            agents_load[agent_id] = (lbs, listeners, backends)
+        return agents_load
+
     def _fields(self, resource, fields):
         if fields:
             return dict(((key, item) for key, item in resource.items()
@@ -82,18 +129,8 @@ class ClbAgentScheduler(ClbAgentSchedulerDbMixin):
             LOG.warn(msg, load_balancer['id'])
             return
         
-        #chosen_agent_db = candidates[0]
-        #chosen_agent = self._make_agent_dict(agent)
-
-        #for agent_db in candidates[1:]:
-        #    agent = self._make_agent_dict(agent)
-        #    if (agent['configurations']['running_load_balancers'] <
-        #        chosen_agent['configurations']['running_load_balancers']):
-        #        chosen_agent_db = agent_db
-        #       chosen_agent = agent
-        #        break
-
-        chosen_agent_db = random.choice(candidates)
+        chosen_agent_db = self._choose_least_loaded_agent(context,
+                                                          candidates)
         
         with context.session.begin(subtransactions=True):
             binding = models.LoadBalancerAgentBinding()
@@ -106,6 +143,85 @@ class ClbAgentScheduler(ClbAgentSchedulerDbMixin):
 
             return self._make_agent_dict(chosen_agent_db)
 
+    def get_down_agents(self, context):
+        query = context.session.query(agents_db.Agent)
+        query = query.filter_by(agent_type=constants.CLB_AGENT_TYPE)
+        return [agent_db for agent_db in query
+                if agents_db.AgentDbMixin.is_agent_down(
+                    agent_db.heartbeat_timestamp)]
+
+    def reschedule_load_balancers(self, context, down_agent_ids):
+        """Move all load balancers hosted by down agents to active agents.
+        Load balancers are spread over the least loaded agents and bindings
+        are updated with one statement per target agent. Every server
+        worker runs this, the bindings are locked so that only the worker
+        which actually moved a load balancer returns it.
+        :param down_agent_ids: ids of agents considered dead
+        :return: list of (load balancer id, new agent dict)
+        """
+        candidates = self.get_agents(context, active=True)
+        binding = models.LoadBalancerAgentBinding
+        rescheduled = []
+        with context.session.begin(subtransactions=True):
+            # bindings already moved by another worker are skipped, the
+            # lock makes the others wait for this transaction
+            query = context.session.query(binding.load_balancer_id)
+            query = query.filter(binding.agent_id.in_(down_agent_ids))
+            query = query.with_lockmode('update')
+            load_balancer_ids = [item[0] for item in query]
+            if not load_balancer_ids:
+                return []
+            if not candidates:
+                msg = "No active agents to reschedule %s load balancers"
+                LOG.warn(msg, len(load_balancer_ids))
+                return []
+
+            agents_load = self.get_agents_load(
+                context, [agent_db.id for agent_db in candidates])
+            heap = [(load, agent_id)
+                    for agent_id, load in agents_load.items()]
+            heapq.heapify(heap)
+
+            assignments = {}
+            for load_balancer_id in load_balancer_ids:
+                (lbs, listeners, backends), agent_id = heapq.heappop(heap)
+                assignments.setdefault(agent_id, []).append(load_balancer_id)
+                heapq.heappush(heap,
+                               ((lbs + 1, listeners, backends), agent_id))
+
+            agents = dict((agent_db.id, self._make_agent_dict(agent_db))
+                          for agent_db in candidates)
+            for agent_id, lb_ids in assignments.items():
+                query = context.session.query(binding)
+                query = query.filter(binding.load_balancer_id.in_(lb_ids))
+                query = query.filter(binding.agent_id.in_(down_agent_ids))
+                moved = query.update({'agent_id': agent_id},
+                                     synchronize_session=False)
+                if moved != len(lb_ids):
+                    # can't tell which ones were moved, leave them to the
+                    # worker which did
+                    msg = ("Only %s of load balancers %s were rescheduled "
+                           "to clb agent %s")
+                    LOG.warn(msg, moved, lb_ids, agent_id)
+                    continue
+                msg = "Load balancers %s are rescheduled to clb agent %s"
+                LOG.info(msg, lb_ids, agent_id)
+                rescheduled += [(lb_id, agents[agent_id])
+                                for lb_id in lb_ids]
+        return rescheduled
+
+    def _choose_least_loaded_agent(self, context, candidates):
+        """Choose the agent hosting the fewest load balancers, then the
+        fewest listeners and backends. Equally loaded agents are picked
+        randomly so that concurrent requests spread over them.
+        """
+        agents_load = self.get_agents_load(
+            context, [agent_db.id for agent_db in candidates])
+        min_load = min(agents_load.values())
+        least_loaded = [agent_db for agent_db in candidates
+                        if agents_load[agent_db.id] == min_load]
+        return random.choice(least_loaded)
+
 
 def get_agent_id_by_host(context, host):
     query = context.session.query(agents_db.Agent)
@@ -0,0 +1,151 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Benchmark concurrent port creation on a single subnet.
+
+A network with one large subnet is created with the configured core plugin,
+then ports are created on it from several threads at once. Run it against a
+test database once per ip_allocation_mode and compare the results:
+
+    python -m neutron.cmd.ip_allocation_benchmark \\
+        --config-file /etc/neutron/neutron.conf --workers 32 --ports 2000
+"""
+
+import sys
+import threading
+import time
+
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import config
+from neutron import context
+from neutron import manager
+
+TENANT_ID = 'ip-allocation-benchmark'
+
+cli_opts = [
+    cfg.IntOpt('workers', default=16,
+               help=_("Number of threads creating ports")),
+    cfg.IntOpt('ports', default=1000,
+               help=_("Total number of ports to create")),
+    cfg.StrOpt('cidr', default='10.128.0.0/16',
+               help=_("CIDR of the subnet the ports are created on")),
+    cfg.BoolOpt('keep', default=False,
+                help=_("Keep the network and its ports once done")),
+]
+
+
+def _create_network(plugin, cxt):
+    network = plugin.create_network(cxt, {'network': {
+        'name': TENANT_ID, 'tenant_id': TENANT_ID,
+        'admin_state_up': True, 'shared': False}})
+    plugin.create_subnet(cxt, {'subnet': {
+        'name': TENANT_ID, 'tenant_id': TENANT_ID,
+        'network_id': network['id'], 'cidr': cfg.CONF.cidr,
+        'ip_version': 4, 'enable_dhcp': False,
+        'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+        'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+        'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+        'host_routes': attributes.ATTR_NOT_SPECIFIED,
+        'ipv6_ra_mode': attributes.ATTR_NOT_SPECIFIED,
+        'ipv6_address_mode': attributes.ATTR_NOT_SPECIFIED}})
+    return network
+
+
+def _create_ports(plugin, network_id, count, results):
+    cxt = context.get_admin_context()
+    for i in range(count):
+        start = time.time()
+        try:
+            port = plugin.create_port(cxt, {'port': {
+                'name': '', 'tenant_id': TENANT_ID,
+                'network_id': network_id, 'admin_state_up': True,
+                'device_id': '', 'device_owner': '',
+                'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                'fixed_ips': attributes.ATTR_NOT_SPECIFIED}})
+        except Exception as e:
+            results.append((None, time.time() - start, e))
+        else:
+            results.append((port, time.time() - start, None))
+
+
+def _percentile(durations, percent):
+    if not durations:
+        return 0
+    return durations[min(len(durations) - 1,
+                         int(len(durations) * percent / 100))]
+
+
+def run(plugin, network_id, workers, ports):
+    """Create ports from workers threads, returns the results.
+
+    Each result is a (port, duration, error) tuple.
+    """
+    results = []
+    threads = []
+    for worker in range(workers):
+        count = ports // workers + (1 if worker < ports % workers else 0)
+        thread = threading.Thread(target=_create_ports,
+                                  args=(plugin, network_id, count, results))
+        threads.append(thread)
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    cfg.CONF.register_cli_opts(cli_opts)
+    config.init(sys.argv[1:])
+    config.setup_logging()
+
+    cxt = context.get_admin_context()
+    plugin = manager.NeutronManager.get_plugin()
+    network = _create_network(plugin, cxt)
+    start = time.time()
+    results = run(plugin, network['id'], cfg.CONF.workers,
+                  cfg.CONF.ports)
+    elapsed = time.time() - start
+
+    durations = sorted(duration for port, duration, error in results
+                       if port)
+    errors = [error for port, duration, error in results if error]
+    addresses = [port['fixed_ips'][0]['ip_address']
+                 for port, duration, error in results
+                 if port and port['fixed_ips']]
+    print(_("ip_allocation_mode %(mode)s, %(workers)d workers: created "
+            "%(created)d ports in %(elapsed).1f seconds (%(rate).1f ports/s),"
+            " %(failed)d failed, %(duplicates)d duplicated addresses, "
+            "latency p50 %(p50).3f s p99 %(p99).3f s") %
+          {'mode': cfg.CONF.ip_allocation_mode,
+           'workers': cfg.CONF.workers,
+           'created': len(durations), 'elapsed': elapsed,
+           'rate': len(durations) / max(elapsed, 0.001),
+           'failed': len(errors),
+           'duplicates': len(addresses) - len(set(addresses)),
+           'p50': _percentile(durations, 50),
+           'p99': _percentile(durations, 99)})
+    for error in set(str(error) for error in errors):
+        print(_("Failure: %s") % error)
+
+    if not cfg.CONF.keep:
+        for port, duration, error in results:
+            if port:
+                plugin.delete_port(cxt, port['id'])
+        plugin.delete_network(cxt, network['id'])
+
+
+if __name__ == "__main__":
+    main()
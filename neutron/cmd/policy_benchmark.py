@@ -0,0 +1,167 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Benchmark the policy checks of a port listing.
+
+A few networks are created with the configured core plugin, then the authZ
+work the API does when listing ports is timed over ports built in memory
+on them: first by checking each port and attribute on its own, as the
+API used to, then with a policy.Checker. Run it with the policy file of the
+deployment:
+
+    python -m neutron.cmd.policy_benchmark \\
+        --config-file /etc/neutron/neutron.conf --ports 5000
+"""
+
+import copy
+import sys
+import time
+import uuid
+
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import config
+from neutron import context
+from neutron import manager
+from neutron.openstack.common import policy as common_policy
+from neutron import policy
+
+TENANT_ID = 'policy-benchmark'
+ACTION = 'get_port'
+
+cli_opts = [
+    cfg.IntOpt('ports', default=5000,
+               help=_("Number of ports listed")),
+    cfg.IntOpt('networks', default=10,
+               help=_("Number of networks the ports are spread over")),
+    cfg.IntOpt('tenants', default=10,
+               help=_("Number of tenants owning the ports")),
+    cfg.IntOpt('repeat', default=3,
+               help=_("Number of runs, the fastest one is reported")),
+    cfg.BoolOpt('admin', default=False,
+                help=_("List the ports with an admin context")),
+]
+
+
+def _create_networks(plugin, cxt, count):
+    return [plugin.create_network(cxt, {'network': {
+        'name': TENANT_ID, 'tenant_id': TENANT_ID,
+        'admin_state_up': True, 'shared': False}})
+        for i in range(count)]
+
+
+def _build_ports(networks, tenants, count):
+    ports = []
+    for i in range(count):
+        port = dict((attr_name, None) for attr_name in
+                    attributes.RESOURCE_ATTRIBUTE_MAP[attributes.PORTS])
+        port.update({'id': str(uuid.uuid4()),
+                     'name': 'port-%d' % i,
+                     'tenant_id': tenants[i % len(tenants)],
+                     'network_id': networks[i % len(networks)]['id'],
+                     'admin_state_up': True,
+                     'fixed_ips': [],
+                     'device_owner': '', 'device_id': ''})
+        ports.append(port)
+    return ports
+
+
+def list_one_by_one(cxt, ports):
+    """Filter ports and find hidden attributes one check at a time."""
+    visible = []
+    for port in ports:
+        rule, target, credentials = policy._prepare_check(cxt, ACTION, port)
+        if common_policy.check(rule, target, credentials):
+            visible.append(port)
+    excluded = []
+    if visible:
+        for attr_name in list(visible[0]):
+            action = '%s:%s' % (ACTION, attr_name)
+            rule, target, credentials = policy._prepare_check(
+                cxt, action, visible[0])
+            if (action in common_policy._rules and
+                    not common_policy.check(rule, target, credentials)):
+                excluded.append(attr_name)
+    return visible, excluded
+
+
+def list_with_checker(cxt, ports):
+    """Filter ports and find hidden attributes with a policy.Checker."""
+    checker = policy.Checker(cxt)
+    visible = checker.filter(ACTION, ports)
+    excluded = []
+    if visible:
+        excluded = checker.get_refused_attributes(ACTION, visible[0].keys(),
+                                                  visible[0])
+    return visible, excluded
+
+
+def _time(func, cxt, ports, repeat):
+    best = None
+    for i in range(repeat):
+        # Parent fields are cached in the ports by the checks
+        run_ports = copy.deepcopy(ports)
+        start = time.time()
+        result = func(cxt, run_ports)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    visible, excluded = result
+    return best, [port['id'] for port in visible], sorted(excluded)
+
+
+def main():
+    cfg.CONF.register_cli_opts(cli_opts)
+    config.init(sys.argv[1:])
+    config.setup_logging()
+    policy.init()
+
+    admin_cxt = context.get_admin_context()
+    plugin = manager.NeutronManager.get_plugin()
+    networks = _create_networks(plugin, admin_cxt, cfg.CONF.networks)
+    try:
+        tenants = ['%s-%d' % (TENANT_ID, i)
+                   for i in range(cfg.CONF.tenants)]
+        ports = _build_ports(networks, tenants, cfg.CONF.ports)
+        if cfg.CONF.admin:
+            cxt = admin_cxt
+        else:
+            cxt = context.Context('policy-benchmark-user', tenants[0])
+
+        before, before_ports, before_excluded = _time(
+            list_one_by_one, cxt, ports, cfg.CONF.repeat)
+        after, after_ports, after_excluded = _time(
+            list_with_checker, cxt, ports, cfg.CONF.repeat)
+
+        print(_("Policy checks for %(ports)d ports on %(networks)d networks, "
+                "%(visible)d visible: %(before).3f s checking one by one, "
+                "%(after).3f s with a checker (%(speedup).1fx)") %
+              {'ports': len(ports), 'networks': len(networks),
+               'visible': len(after_ports), 'before': before,
+               'after': after, 'speedup': before / max(after, 0.000001)})
+        if (before_ports, before_excluded) != (after_ports, after_excluded):
+            print(_("Results differ: %(before)d visible ports and hidden "
+                    "attributes %(before_excluded)s checking one by one, "
+                    "%(after)d and %(after_excluded)s with a checker") %
+                  {'before': len(before_ports),
+                   'before_excluded': before_excluded,
+                   'after': len(after_ports),
+                   'after_excluded': after_excluded})
+            return 1
+    finally:
+        for network in networks:
+            plugin.delete_network(admin_cxt, network['id'])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -69,6 +69,20 @@ core_opts = [
                help=_("Maximum number of host routes per subnet")),
     cfg.IntOpt('max_fixed_ips_per_port', default=5,
                help=_("Maximum number of fixed ips per port")),
+    cfg.StrOpt('ip_allocation_mode', default='locking',
+               choices=['locking', 'optimistic'],
+               help=_("How addresses are taken from the availability ranges "
+                      "of a subnet. 'locking' locks the ranges with SELECT "
+                      "... FOR UPDATE, 'optimistic' stores them in chunks "
+                      "and updates random ones with compare and swap, "
+                      "retrying on conflicts")),
+    cfg.IntOpt('ip_allocation_retries', default=16,
+               help=_("How many compare and swap attempts an optimistic IP "
+                      "allocation makes before locking the ranges")),
+    cfg.IntOpt('ip_allocation_range_size', default=64,
+               help=_("Number of addresses per availability range stored in "
+                      "optimistic mode. Smaller ranges make concurrent "
+                      "allocations less likely to update the same row")),
     cfg.IntOpt('dhcp_lease_duration', default=86400,
                deprecated_name='dhcp_lease_time',
                help=_("DHCP lease duration (in seconds). Use -1 to tell "
@@ -237,6 +237,11 @@ class SudoRequired(NeutronException):
     message = _("Sudo privilege is required to run this command.")
 
 
+class IpBatchCommandFailed(NeutronException):
+    message = _("Batched ip commands failed in namespace %(namespace)s: "
+                "%(errors)s")
+
+
 class QuotaResourceUnknown(NotFound):
     message = _("Unknown quota resources %(unknown)s.")
 
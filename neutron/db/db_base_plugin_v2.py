@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
 import random
 
 import netaddr
@@ -50,6 +51,55 @@ LOG = logging.getLogger(__name__)
 # IP allocations being cleaned up by cascade.
 AUTO_DELETE_PORT_OWNERS = [constants.DEVICE_OWNER_DHCP]
 
+# Values of the ip_allocation_mode option
+IP_ALLOCATION_LOCKING = 'locking'
+IP_ALLOCATION_OPTIMISTIC = 'optimistic'
+# Maximum number of availability ranges a free range is split into in
+# optimistic mode, the addresses past the last chunk stay in one range
+MAX_RANGE_CHUNKS = 256
+
+# Key of the port dict through which create_port_bulk hands the MAC and IP
+# addresses allocated for the whole request to create_port
+BULK_ALLOCATION = '_bulk_allocation'
+
+
+def _free_ranges(first, last, allocations):
+    """Yield the (first, last) ranges of [first, last] not allocated.
+
+    Addresses are integers and allocations is sorted.
+    """
+    start = first
+    for ip in allocations[bisect.bisect_left(allocations, first):]:
+        if ip > last:
+            break
+        if ip > start:
+            yield start, ip - 1
+        start = ip + 1
+    if start <= last:
+        yield start, last
+
+
+def _range_chunks(first, last):
+    """Yield the (first, last) availability ranges stored for [first, last].
+
+    In optimistic mode free addresses are stored in chunks of
+    ip_allocation_range_size addresses: concurrent allocations pick random
+    chunks and so update different rows. At most MAX_RANGE_CHUNKS ranges
+    are yielded, so that IPv6 pools don't turn into billions of rows.
+    Addresses are integers, possibly too large for xrange.
+    """
+    if cfg.CONF.ip_allocation_mode != IP_ALLOCATION_OPTIMISTIC:
+        yield first, last
+        return
+    size = max(cfg.CONF.ip_allocation_range_size, 1)
+    start = first
+    for i in range(MAX_RANGE_CHUNKS - 1):
+        if start + size > last:
+            break
+        yield start, start + size - 1
+        start += size
+    yield start, last
+
 
 class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                         common_db_mixin.CommonDbMixin):
@@ -126,16 +176,20 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return context.session.query(models_v2.Subnet).all()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id):
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = NeutronDbPluginV2._random_mac()
             if NeutronDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -152,6 +206,42 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   max_retries)
         raise n_exc.MacAddressGenerationFailure(net_id=network_id)
 
+    @staticmethod
+    def _generate_macs(context, network_id, count, exclude=()):
+        """Generate count unique MAC addresses on the network.
+
+        All the candidates of an attempt are checked with a single query,
+        exclude holds addresses already taken by the caller.
+        """
+        macs = set()
+        max_retries = cfg.CONF.mac_generation_retries
+        for i in range(max_retries):
+            candidates = set()
+            while len(macs) + len(candidates) < count:
+                mac_address = NeutronDbPluginV2._random_mac()
+                if mac_address not in macs and mac_address not in exclude:
+                    candidates.add(mac_address)
+            macs.update(candidates - NeutronDbPluginV2._get_macs_in_use(
+                context, network_id, candidates))
+            if len(macs) == count:
+                LOG.debug("Generated %(count)d macs for network "
+                          "%(network_id)s", {'count': count,
+                                             'network_id': network_id})
+                return list(macs)
+        LOG.error(_("Unable to generate mac address after %s attempts"),
+                  max_retries)
+        raise n_exc.MacAddressGenerationFailure(net_id=network_id)
+
+    @staticmethod
+    def _get_macs_in_use(context, network_id, mac_addresses):
+        """Return the set of mac_addresses used by ports of the network."""
+        if not mac_addresses:
+            return set()
+        mac_qry = context.session.query(models_v2.Port.mac_address)
+        return set(row.mac_address for row in mac_qry.filter(
+            models_v2.Port.network_id == network_id,
+            models_v2.Port.mac_address.in_(mac_addresses)))
+
     @staticmethod
     def _check_unique_mac(context, network_id, mac_address):
         mac_qry = context.session.query(models_v2.Port)
@@ -208,6 +298,187 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
         return NeutronDbPluginV2._try_generate_ip(context, subnets)
 
+    @staticmethod
+    def _generate_ips(context, subnets, count):
+        """Generate count IP addresses from the subnets in one go.
+
+        The addresses are taken from the start of the availability ranges,
+        each range being updated once whatever the number of addresses
+        taken from it.
+        """
+        ips = []
+        if cfg.CONF.ip_allocation_mode == IP_ALLOCATION_OPTIMISTIC:
+            ips = NeutronDbPluginV2._try_generate_ips_optimistic(
+                context, subnets, count)
+        if len(ips) < count:
+            more = NeutronDbPluginV2._try_generate_ips(context, subnets,
+                                                       count - len(ips))
+            if more is None:
+                # As when a subnet runs out, rebuild the ranges from the
+                # allocations, leaving out the addresses just taken
+                NeutronDbPluginV2._delete_availability_ranges(context,
+                                                              subnets)
+                NeutronDbPluginV2._rebuild_availability_ranges(
+                    context, subnets,
+                    allocated=[ip['ip_address'] for ip in ips])
+                more = NeutronDbPluginV2._try_generate_ips(
+                    context, subnets, count - len(ips))
+            if more is None:
+                raise n_exc.IpAddressGenerationFailure(
+                    net_id=subnets[0]['network_id'])
+            ips.extend(more)
+        return ips
+
+    @staticmethod
+    def _take_ips(subnet_id, first_ip, last_ip, count):
+        """Take up to count addresses from the start of a range.
+
+        Returns the addresses and the new first address of the range, or
+        None if the range is used up.
+        """
+        first = netaddr.IPAddress(first_ip)
+        last = netaddr.IPAddress(last_ip)
+        taken = min(count, int(last) - int(first) + 1)
+        ips = [{'ip_address': str(first + i), 'subnet_id': subnet_id}
+               for i in range(taken)]
+        new_first_ip = str(first + taken) if first + taken <= last else None
+        return ips, new_first_ip
+
+    @staticmethod
+    def _try_generate_ips(context, subnets, count):
+        """Take count addresses from the locked ranges of the subnets.
+
+        Returns None, without changing any range, if they don't hold enough
+        addresses.
+        """
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        ranges = [(subnet['id'], ip_range) for subnet in subnets
+                  for ip_range in range_qry.filter_by(subnet_id=subnet['id'])]
+        available = sum(netaddr.IPRange(ip_range['first_ip'],
+                                        ip_range['last_ip']).size
+                        for subnet_id, ip_range in ranges)
+        if available < count:
+            return
+        ips = []
+        for subnet_id, ip_range in ranges:
+            if len(ips) == count:
+                break
+            taken, new_first_ip = NeutronDbPluginV2._take_ips(
+                subnet_id, ip_range['first_ip'], ip_range['last_ip'],
+                count - len(ips))
+            ips.extend(taken)
+            if new_first_ip:
+                ip_range['first_ip'] = new_first_ip
+            else:
+                context.session.delete(ip_range)
+        return ips
+
+    @staticmethod
+    def _try_generate_ips_optimistic(context, subnets, count):
+        """Take up to count addresses with a compare and swap per range.
+
+        Ranges changed concurrently are skipped, the caller takes the
+        missing addresses with the ranges locked.
+        """
+        ips = []
+        for subnet in subnets:
+            ranges = NeutronDbPluginV2._get_availability_ranges(
+                context, subnet['id'])
+            random.shuffle(ranges)
+            for pool_id, first_ip, last_ip in ranges:
+                if len(ips) == count:
+                    return ips
+                taken, new_first_ip = NeutronDbPluginV2._take_ips(
+                    subnet['id'], first_ip, last_ip, count - len(ips))
+                if NeutronDbPluginV2._swap_availability_range(
+                        context, pool_id, first_ip, last_ip,
+                        new_first_ip=new_first_ip):
+                    ips.extend(taken)
+        return ips
+
+    @staticmethod
+    def _delete_availability_ranges(context, subnets):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        for subnet in subnets:
+            for ip_range in range_qry.filter_by(subnet_id=subnet['id']):
+                context.session.delete(ip_range)
+        # The rebuilt ranges may have the same keys as the deleted ones
+        context.session.flush()
+
+    @staticmethod
+    def _get_availability_ranges(context, subnet_id):
+        """Read the availability ranges of a subnet without locking them.
+
+        Returns (allocation_pool_id, first_ip, last_ip) tuples rather than
+        models, the rows are only changed with compare and swap queries.
+        """
+        return context.session.query(
+            models_v2.IPAvailabilityRange.allocation_pool_id,
+            models_v2.IPAvailabilityRange.first_ip,
+            models_v2.IPAvailabilityRange.last_ip).filter(
+                models_v2.IPAvailabilityRange.allocation_pool_id ==
+                models_v2.IPAllocationPool.id,
+                models_v2.IPAllocationPool.subnet_id == subnet_id).all()
+
+    @staticmethod
+    def _swap_availability_range(context, pool_id, first_ip, last_ip,
+                                 new_first_ip=None, new_last_ip=None):
+        """Compare and swap the bounds of an availability range.
+
+        The range is deleted if no new bound is given. Returns whether the
+        range still was first_ip - last_ip, that is whether it was changed.
+        """
+        query = context.session.query(
+            models_v2.IPAvailabilityRange).filter_by(
+                allocation_pool_id=pool_id, first_ip=first_ip,
+                last_ip=last_ip)
+        if new_first_ip is None and new_last_ip is None:
+            return query.delete(synchronize_session=False) == 1
+        return query.update({'first_ip': new_first_ip or first_ip,
+                             'last_ip': new_last_ip or last_ip},
+                            synchronize_session=False) == 1
+
+    @staticmethod
+    def _try_generate_ip_optimistic(context, subnets):
+        """Generate an IP address without locking the availability ranges.
+
+        The first address of a random range is claimed by moving the start
+        of the range with a compare and swap, so that concurrent allocations
+        update different rows. A failed swap means the range was changed
+        since it was read, another random range is tried then. Returns None
+        once ip_allocation_retries swaps failed.
+        """
+        attempts = cfg.CONF.ip_allocation_retries
+        for subnet in subnets:
+            ranges = NeutronDbPluginV2._get_availability_ranges(
+                context, subnet['id'])
+            random.shuffle(ranges)
+            for pool_id, first_ip, last_ip in ranges:
+                if attempts <= 0:
+                    LOG.debug("Optimistic IP allocation on network "
+                              "%s kept conflicting, locking ranges",
+                              subnet['network_id'])
+                    return
+                attempts -= 1
+                if first_ip == last_ip:
+                    new_first_ip = None
+                else:
+                    new_first_ip = str(netaddr.IPAddress(first_ip) + 1)
+                if NeutronDbPluginV2._swap_availability_range(
+                        context, pool_id, first_ip, last_ip,
+                        new_first_ip=new_first_ip):
+                    LOG.debug("Allocated IP - %(ip_address)s from "
+                              "%(first_ip)s to %(last_ip)s",
+                              {'ip_address': first_ip,
+                               'first_ip': first_ip,
+                               'last_ip': last_ip})
+                    return {'ip_address': first_ip,
+                            'subnet_id': subnet['id']}
+
     @staticmethod
     def _try_generate_ip(context, subnets):
         """Generate an IP address.
@@ -215,6 +486,11 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         The IP address will be generated from one of the subnets defined on
         the network.
         """
+        if cfg.CONF.ip_allocation_mode == IP_ALLOCATION_OPTIMISTIC:
+            ip = NeutronDbPluginV2._try_generate_ip_optimistic(context,
+                                                               subnets)
+            if ip:
+                return ip
         range_qry = context.session.query(
             models_v2.IPAvailabilityRange).join(
                 models_v2.IPAllocationPool).with_lockmode('update')
@@ -246,7 +522,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
 
     @staticmethod
-    def _rebuild_availability_ranges(context, subnets):
+    def _rebuild_availability_ranges(context, subnets, allocated=None):
         """Rebuild availability ranges.
 
         This method is called only when there's no more IP available or by
@@ -254,6 +530,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         _update_subnet_allocation_pools before calling this function deletes
         the IPAllocationPools associated with the subnet that is updating,
         which will result in deleting the IPAvailabilityRange too.
+        allocated lists addresses taken but not stored yet.
         """
         ip_qry = context.session.query(
             models_v2.IPAllocation).with_lockmode('update')
@@ -266,41 +543,75 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             LOG.debug(_("Rebuilding availability ranges for subnet %s")
                       % subnet)
 
-            # Create a set of all currently allocated addresses
+            # Sorted integer values of all currently allocated addresses,
+            # much cheaper than an IPSet on large subnets
             ip_qry_results = ip_qry.filter_by(subnet_id=subnet['id'])
-            allocations = netaddr.IPSet([netaddr.IPAddress(i['ip_address'])
-                                        for i in ip_qry_results])
+            allocations = sorted(
+                [int(netaddr.IPAddress(i['ip_address']))
+                 for i in ip_qry_results] +
+                [int(netaddr.IPAddress(ip)) for ip in allocated or []])
 
             for pool in pool_qry.filter_by(subnet_id=subnet['id']):
-                # Create a set of all addresses in the pool
-                poolset = netaddr.IPSet(netaddr.iter_iprange(pool['first_ip'],
-                                                             pool['last_ip']))
-
-                # Use set difference to find free addresses in the pool
-                available = poolset - allocations
-
-                # Generator compacts an ip set into contiguous ranges
-                def ipset_to_ranges(ipset):
-                    first, last = None, None
-                    for cidr in ipset.iter_cidrs():
-                        if last and last + 1 != cidr.first:
-                            yield netaddr.IPRange(first, last)
-                            first = None
-                        first, last = first if first else cidr.first, cidr.last
-                    if first:
-                        yield netaddr.IPRange(first, last)
-
-                # Write the ranges to the db
-                for ip_range in ipset_to_ranges(available):
-                    available_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=pool['id'],
-                        first_ip=str(netaddr.IPAddress(ip_range.first)),
-                        last_ip=str(netaddr.IPAddress(ip_range.last)))
-                    context.session.add(available_range)
+                first = netaddr.IPAddress(pool['first_ip'])
+                last = netaddr.IPAddress(pool['last_ip'])
+                # Write the free ranges of the pool to the db
+                for free_first, free_last in _free_ranges(
+                        int(first), int(last), allocations):
+                    for range_first, range_last in _range_chunks(
+                            free_first, free_last):
+                        available_range = models_v2.IPAvailabilityRange(
+                            allocation_pool_id=pool['id'],
+                            first_ip=str(netaddr.IPAddress(range_first,
+                                                           first.version)),
+                            last_ip=str(netaddr.IPAddress(range_last,
+                                                          first.version)))
+                        context.session.add(available_range)
+
+    @staticmethod
+    def _allocate_specific_ip_optimistic(context, subnet_id, ip_address):
+        """Take ip_address out of its range with a compare and swap.
+
+        Returns False if the address wasn't found in the ranges read or the
+        range was changed concurrently.
+        """
+        ip = netaddr.IPAddress(ip_address)
+        ranges = NeutronDbPluginV2._get_availability_ranges(context,
+                                                            subnet_id)
+        for pool_id, first_ip, last_ip in ranges:
+            first = netaddr.IPAddress(first_ip)
+            last = netaddr.IPAddress(last_ip)
+            if not first <= ip <= last:
+                continue
+            if first == last:
+                return NeutronDbPluginV2._swap_availability_range(
+                    context, pool_id, first_ip, last_ip)
+            elif first == ip:
+                return NeutronDbPluginV2._swap_availability_range(
+                    context, pool_id, first_ip, last_ip,
+                    new_first_ip=str(ip + 1))
+            elif last == ip:
+                return NeutronDbPluginV2._swap_availability_range(
+                    context, pool_id, first_ip, last_ip,
+                    new_last_ip=str(ip - 1))
+            elif NeutronDbPluginV2._swap_availability_range(
+                    context, pool_id, first_ip, last_ip,
+                    new_last_ip=str(ip - 1)):
+                # Create a new second range for after ip_address
+                context.session.add(models_v2.IPAvailabilityRange(
+                    allocation_pool_id=pool_id,
+                    first_ip=str(ip + 1),
+                    last_ip=last_ip))
+                return True
+            return False
+        return False
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
+        if (cfg.CONF.ip_allocation_mode == IP_ALLOCATION_OPTIMISTIC and
+            NeutronDbPluginV2._allocate_specific_ip_optimistic(
+                context, subnet_id, ip_address)):
+            return
         ip = int(netaddr.IPAddress(ip_address))
         range_qry = context.session.query(
             models_v2.IPAvailabilityRange).join(
@@ -1121,11 +1432,16 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+                first = netaddr.IPAddress(pool['start'])
+                for range_first, range_last in _range_chunks(
+                        int(first), int(netaddr.IPAddress(pool['end']))):
+                    ip_range = models_v2.IPAvailabilityRange(
+                        ipallocationpool=ip_pool,
+                        first_ip=str(netaddr.IPAddress(range_first,
+                                                       first.version)),
+                        last_ip=str(netaddr.IPAddress(range_last,
+                                                      first.version)))
+                    context.session.add(ip_range)
 
         return self._make_subnet_dict(subnet)
 
@@ -1287,11 +1603,116 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._get_collection_count(context, models_v2.Subnet,
                                           filters=filters)
 
+    def _allocate_bulk_ports(self, context, ports):
+        """Allocate the MAC and IP addresses of the ports of a bulk request.
+
+        Requested MACs are checked and missing ones generated with a query
+        per network. Requested fixed IPs are claimed first so that they
+        can't be handed out to the other ports, then ports without fixed
+        IPs get their addresses from a single allocation per network. The
+        results are handed to create_port in the BULK_ALLOCATION key of
+        each port.
+        """
+        ports_by_network = {}
+        for p in ports:
+            ports_by_network.setdefault(p['network_id'], []).append(p)
+        for network_id, net_ports in ports_by_network.iteritems():
+            requested = [p['mac_address'] for p in net_ports
+                         if p['mac_address'] is not
+                         attributes.ATTR_NOT_SPECIFIED]
+            in_use = self._get_macs_in_use(context, network_id, requested)
+            for mac_address in requested:
+                if mac_address in in_use or requested.count(mac_address) > 1:
+                    raise n_exc.MacAddressInUse(net_id=network_id,
+                                                mac=mac_address)
+            macs = iter(self._generate_macs(
+                context, network_id, len(net_ports) - len(requested),
+                exclude=set(requested)))
+            allocations = []
+            for p in net_ports:
+                if p['mac_address'] is attributes.ATTR_NOT_SPECIFIED:
+                    mac_address = next(macs)
+                else:
+                    mac_address = p['mac_address']
+                allocations.append({'mac_address': mac_address,
+                                    'fixed_ips': None})
+                p[BULK_ALLOCATION] = allocations[-1]
+
+            requested_ips = set()
+            for p, allocation in zip(net_ports, allocations):
+                if p['fixed_ips'] is attributes.ATTR_NOT_SPECIFIED:
+                    continue
+                configured_ips = self._test_fixed_ips_for_port(
+                    context, network_id, p['fixed_ips'])
+                for fixed in configured_ips:
+                    if 'ip_address' not in fixed:
+                        continue
+                    # Not stored yet, _test_fixed_ips_for_port can't see
+                    # the other ports of the request
+                    key = (fixed['subnet_id'], fixed['ip_address'])
+                    if key in requested_ips:
+                        raise n_exc.IpAddressInUse(
+                            net_id=network_id,
+                            ip_address=fixed['ip_address'])
+                    requested_ips.add(key)
+                allocation['fixed_ips'] = self._allocate_fixed_ips(
+                    context, configured_ips)
+
+            auto_allocations = [
+                allocation for p, allocation in zip(net_ports, allocations)
+                if p['fixed_ips'] is attributes.ATTR_NOT_SPECIFIED]
+            if auto_allocations:
+                self._allocate_bulk_ips(context, network_id,
+                                        auto_allocations)
+
+    def _allocate_bulk_ips(self, context, network_id, allocations):
+        """Bulk version of _allocate_ips_for_port.
+
+        Fills the fixed_ips of each allocation with an address on every
+        subnet family of the network, as create_port would.
+        """
+        subnets = self.get_subnets(context,
+                                   filters={'network_id': [network_id]})
+        for allocation in allocations:
+            allocation['fixed_ips'] = []
+        v4 = [subnet for subnet in subnets if subnet['ip_version'] == 4]
+        v6 = []
+        for subnet in subnets:
+            if subnet['ip_version'] != 6:
+                continue
+            if not self._check_if_subnet_uses_eui64(subnet):
+                v6.append(subnet)
+                continue
+            ips = [ipv6_utils.get_ipv6_addr_by_EUI64(
+                subnet['cidr'], allocation['mac_address']).format()
+                for allocation in allocations]
+            in_use = context.session.query(
+                models_v2.IPAllocation.ip_address).filter(
+                    models_v2.IPAllocation.subnet_id == subnet['id'],
+                    models_v2.IPAllocation.ip_address.in_(ips)).first()
+            if in_use:
+                raise n_exc.IpAddressInUse(net_id=network_id,
+                                           ip_address=in_use.ip_address)
+            for allocation, ip_address in zip(allocations, ips):
+                allocation['fixed_ips'].append({'ip_address': ip_address,
+                                                'subnet_id': subnet['id']})
+        for version_subnets in (v4, v6):
+            if version_subnets:
+                ips = NeutronDbPluginV2._generate_ips(
+                    context, version_subnets, len(allocations))
+                for allocation, ip in zip(allocations, ips):
+                    allocation['fixed_ips'].append(ip)
+
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        with context.session.begin(subtransactions=True):
+            self._allocate_bulk_ports(
+                context, [item['port'] for item in ports['ports']])
+            return self._create_bulk('port', context, ports)
 
     def create_port(self, context, port):
         p = port['port']
+        # Addresses allocated along with the other ports of a bulk request
+        allocation = p.pop(BULK_ALLOCATION, None)
         port_id = p.get('id') or uuidutils.generate_uuid()
         network_id = p['network_id']
         # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
@@ -1307,7 +1728,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
             # Ensure that a MAC address is defined and it is unique on the
             # network
-            if p['mac_address'] is attributes.ATTR_NOT_SPECIFIED:
+            if allocation:
+                p['mac_address'] = allocation['mac_address']
+            elif p['mac_address'] is attributes.ATTR_NOT_SPECIFIED:
                 #Note(scollins) Add the generated mac_address to the port,
                 #since _allocate_ips_for_port will need the mac when
                 #calculating an EUI-64 address for a v6 subnet
@@ -1338,7 +1761,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             context.session.add(db_port)
 
             # Update the IP's for the port
-            ips = self._allocate_ips_for_port(context, port)
+            if allocation and allocation['fixed_ips'] is not None:
+                ips = allocation['fixed_ips']
+            else:
+                ips = self._allocate_ips_for_port(context, port)
             if ips:
                 for ip in ips:
                     ip_address = ip['ip_address']
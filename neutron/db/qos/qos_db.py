@@ -203,14 +203,16 @@ class QoSDbMixin(ext_qos.QoSPluginBase):
         except orm.exc.NotFound:
             raise QoSPortMappingNotFound()
 
-    def get_qos(self, context, id, fields=None):
+    def _get_qos(self, context, id):
         try:
-            with context.session.begin(subtransactions=True):
-                return self._create_qos_dict(
-                    self._get_by_id(context, QoS, id), fields)
+            return self._get_by_id(context, QoS, id)
         except orm.exc.NotFound:
             raise QoSNotFound()
 
+    def get_qos(self, context, id, fields=None):
+        with context.session.begin(subtransactions=True):
+            return self._create_qos_dict(self._get_qos(context, id), fields)
+
     def get_qoses(self, context, filters=None, fields=None,
                   sorts=None, limit=None,
                   marker=None, page_reverse=False, default_sg=False):
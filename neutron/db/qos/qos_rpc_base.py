@@ -148,3 +148,29 @@ class QoSServerRpcCallbackMixin(object):
             return mapping.qos_id
         except exc.NoResultFound:
             return []
+
+    def get_port_qos_mappings(self, context, **kwargs):
+        """Return the QoS mappings of the given ports with their policies.
+
+        Used by the agents to resynchronize all their ports at once, the
+        mappings and the policies are loaded with one query each.
+        """
+        port_ids = kwargs.get('port_ids') or []
+        if not port_ids:
+            return []
+        query = context.session.query(qos_db.PortQoSMapping)
+        mappings = query.filter(
+            qos_db.PortQoSMapping.port_id.in_(port_ids)).all()
+
+        policies = dict((mapping.qos_id, {}) for mapping in mappings)
+        if policies:
+            query = context.session.query(qos_db.QoSPolicy)
+            query = query.filter(qos_db.QoSPolicy.qos_id.in_(list(policies)))
+            for policy in query:
+                policies[policy.qos_id][policy.key] = policy.value
+
+        return [{'port_id': mapping.port_id,
+                 'ip_address': mapping.ip_address,
+                 'qos_id': mapping.qos_id,
+                 'policy': policies[mapping.qos_id]}
+                for mapping in mappings]
@@ -402,7 +402,9 @@ class FirewallPluginBase(service_base.ServicePluginBase):
         return 'Firewall service plugin'
 
     @abc.abstractmethod
-    def get_firewalls(self, context, filters=None, fields=None):
+    def get_firewalls(self, context, filters=None, fields=None,
+                      sorts=None, limit=None, marker=None,
+                      page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -422,7 +424,9 @@ class FirewallPluginBase(service_base.ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_firewall_rules(self, context, filters=None, fields=None):
+    def get_firewall_rules(self, context, filters=None, fields=None,
+                           sorts=None, limit=None, marker=None,
+                           page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -446,7 +450,9 @@ class FirewallPluginBase(service_base.ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_firewall_policies(self, context, filters=None, fields=None):
+    def get_firewall_policies(self, context, filters=None, fields=None,
+                              sorts=None, limit=None, marker=None,
+                              page_reverse=False):
         pass
 
     @abc.abstractmethod
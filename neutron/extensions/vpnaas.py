@@ -398,7 +398,9 @@ class VPNPluginBase(service_base.ServicePluginBase):
         return 'VPN service plugin'
 
     @abc.abstractmethod
-    def get_vpnservices(self, context, filters=None, fields=None):
+    def get_vpnservices(self, context, filters=None, fields=None,
+                        sorts=None, limit=None, marker=None,
+                        page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -418,7 +420,9 @@ class VPNPluginBase(service_base.ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ipsec_site_connections(self, context, filters=None, fields=None):
+    def get_ipsec_site_connections(self, context, filters=None, fields=None,
+                                   sorts=None, limit=None, marker=None,
+                                   page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -444,7 +448,9 @@ class VPNPluginBase(service_base.ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ikepolicies(self, context, filters=None, fields=None):
+    def get_ikepolicies(self, context, filters=None, fields=None,
+                        sorts=None, limit=None, marker=None,
+                        page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -460,7 +466,9 @@ class VPNPluginBase(service_base.ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ipsecpolicies(self, context, filters=None, fields=None):
+    def get_ipsecpolicies(self, context, filters=None, fields=None,
+                          sorts=None, limit=None, marker=None,
+                          page_reverse=False):
         pass
 
     @abc.abstractmethod
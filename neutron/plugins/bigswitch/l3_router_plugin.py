@@ -49,6 +49,12 @@ class L3RestProxy(cplugin.NeutronRestProxyV2Base,
 
     supported_extension_aliases = ["router", "router_rules"]
 
+    # This attribute specifies whether the plugin supports or not
+    # bulk/pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = False
+    __native_sorting_support = False
+
     @staticmethod
     def get_plugin_type():
         return constants.L3_ROUTER_NAT
@@ -54,6 +54,12 @@ class CiscoRouterPlugin(common_db_mixin.CommonDbMixin,
     """
     supported_extension_aliases = ["router", "extraroute"]
 
+    # This attribute specifies whether the plugin supports or not
+    # bulk/pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = False
+    __native_sorting_support = False
+
     def __init__(self):
         self.setup_rpc()
         # for backlogging of non-scheduled routers
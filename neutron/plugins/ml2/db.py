@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from oslo.db import exception as db_exc
@@ -69,6 +70,24 @@ def get_network_segments(session, network_id, filter_dynamic=False):
         return [_make_segment_dict(record) for record in records]
 
 
+def get_networks_segments(session, network_ids, filter_dynamic=False):
+    """Get the segments of several networks with a single query.
+
+    Returns a dict of network id to its list of segments.
+    """
+    segments = dict((network_id, []) for network_id in network_ids)
+    if not segments:
+        return segments
+    with session.begin(subtransactions=True):
+        query = (session.query(models.NetworkSegment).
+                 filter(models.NetworkSegment.network_id.in_(segments)))
+        if filter_dynamic is not None:
+            query = query.filter_by(is_dynamic=filter_dynamic)
+        for record in query:
+            segments[record.network_id].append(_make_segment_dict(record))
+    return segments
+
+
 def get_segment_by_id(session, segment_id):
     with session.begin(subtransactions=True):
         try:
@@ -199,6 +218,42 @@ def get_port(session, port_id):
             return
 
 
+def get_ports(session, port_ids):
+    """Get port records for update within transaction.
+
+    Returns a dict keyed by the given ids. As for get_port, ids may be
+    truncated; full ids and truncated ids are each looked up with a single
+    query.
+    """
+    port_ids = set(port_ids)
+    full_ids = [port_id for port_id in port_ids
+                if uuidutils.is_uuid_like(port_id)]
+    prefixes = port_ids.difference(full_ids)
+    ports = {}
+    with session.begin(subtransactions=True):
+        if full_ids:
+            query = (session.query(models_v2.Port).
+                     filter(models_v2.Port.id.in_(full_ids)))
+            ports.update((port.id, port) for port in query)
+        if prefixes:
+            query = (session.query(models_v2.Port).
+                     filter(sa.or_(*[models_v2.Port.id.startswith(prefix)
+                                     for prefix in prefixes])))
+            lengths = set(len(prefix) for prefix in prefixes)
+            matches = {}
+            for port in query:
+                for length in lengths:
+                    if port.id[:length] in prefixes:
+                        matches.setdefault(port.id[:length], []).append(port)
+            for prefix, prefix_ports in matches.iteritems():
+                if len(prefix_ports) > 1:
+                    LOG.error(_("Multiple ports have port_id starting "
+                                "with %s"), prefix)
+                    continue
+                ports[prefix] = prefix_ports[0]
+    return ports
+
+
 def get_port_from_device_mac(device_mac):
     LOG.debug(_("get_port_from_device_mac() called for mac %s"), device_mac)
     session = db_api.get_session()
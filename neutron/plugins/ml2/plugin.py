@@ -556,8 +556,11 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             nets = super(Ml2Plugin,
                          self).get_networks(context, filters, None, sorts,
                                             limit, marker, page_reverse)
+            segments = db.get_networks_segments(
+                session, [net['id'] for net in nets])
             for net in nets:
-                self.type_manager._extend_network_dict_provider(context, net)
+                self.type_manager._extend_network_dict_provider(
+                    context, net, segments[net['id']])
 
             nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
@@ -1081,6 +1084,53 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return self._bind_port_if_needed(port_context)
 
+    def get_bound_port_contexts(self, plugin_context, port_ids, host=None):
+        """Set based version of get_bound_port_context.
+
+        Ports, their bindings, networks and segments are all loaded with a
+        few queries, binding is then only attempted for the ports needing
+        it. Returns a dict of the given port ids (possibly truncated) to
+        their port context, ports not found are left out.
+        """
+        port_contexts = {}
+        session = plugin_context.session
+        with session.begin(subtransactions=True):
+            ports = db.get_ports(session, port_ids)
+            network_ids = set(port_db.network_id
+                              for port_db in ports.itervalues())
+            networks = {}
+            if network_ids:
+                networks = dict(
+                    (network['id'], network) for network in self.get_networks(
+                        plugin_context, filters={'id': list(network_ids)}))
+            segments = db.get_networks_segments(session, networks)
+            for port_id, port_db in ports.iteritems():
+                port = self._make_port_dict(port_db)
+                network = networks.get(port['network_id'])
+                if not network:
+                    continue
+                network_segments = segments[network['id']]
+                if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
+                    binding = db.get_dvr_port_binding_by_host(
+                        session, port['id'], host)
+                    if not binding:
+                        LOG.error(_("Binding info for DVR port %s not "
+                                    "found"), port_id)
+                        continue
+                    port_contexts[port_id] = driver_context.DvrPortContext(
+                        self, plugin_context, port, network, binding,
+                        segments=network_segments)
+                else:
+                    port_contexts[port_id] = driver_context.PortContext(
+                        self, plugin_context, port, network,
+                        port_db.port_binding, segments=network_segments)
+
+        # Binding calls into the mechanism drivers outside of the
+        # transaction, it's a no-op for ports already bound.
+        for port_id, port_context in port_contexts.items():
+            port_contexts[port_id] = self._bind_port_if_needed(port_context)
+        return port_contexts
+
     def update_port_status(self, context, port_id, status, host=None):
         """
         Returns port_id (non-truncated uuid) if the port exists.
@@ -1146,6 +1196,65 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return port['id']
 
+    def update_port_statuses(self, context, port_statuses, host=None):
+        """Update the status of several ports in a single transaction.
+
+        :param port_statuses: dict of port id (possibly truncated) to status
+        :param host: if set, ports not bound to this host are skipped
+        :returns: dict of the given port ids to the non-truncated port id,
+                  or None if the port was not found. Skipped ports are
+                  left out.
+        """
+        results = {}
+        mech_contexts = []
+        dvr_port_statuses = {}
+        networks = {}
+        session = context.session
+        with contextlib.nested(lockutils.lock('db-access'),
+                               session.begin(subtransactions=True)):
+            ports = db.get_ports(session, port_statuses.keys())
+            for port_id, status in port_statuses.iteritems():
+                port = ports.get(port_id)
+                if not port:
+                    LOG.warning(_("Port %(port)s updated by agent not found"),
+                                {'port': port_id})
+                    results[port_id] = None
+                    continue
+                if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
+                    dvr_port_statuses[port_id] = status
+                    continue
+                binding = port.port_binding
+                if host and (not binding or binding.host != host):
+                    LOG.debug("Port %(port)s not bound to host %(host)s",
+                              {'port': port_id, 'host': host})
+                    continue
+                results[port_id] = port['id']
+                if port.status == status:
+                    continue
+                original_port = self._make_port_dict(port)
+                port.status = status
+                updated_port = self._make_port_dict(port)
+                network_id = original_port['network_id']
+                if network_id not in networks:
+                    networks[network_id] = self.get_network(context,
+                                                            network_id)
+                mech_context = driver_context.PortContext(
+                    self, context, updated_port, networks[network_id],
+                    binding, original_port=original_port)
+                self.mechanism_manager.update_port_precommit(mech_context)
+                mech_contexts.append(mech_context)
+
+        for mech_context in mech_contexts:
+            self.mechanism_manager.update_port_postcommit(mech_context)
+
+        # DVR interfaces keep a status per host binding
+        for port_id, status in dvr_port_statuses.iteritems():
+            if host and not self.port_bound_to_host(context, port_id, host):
+                continue
+            results[port_id] = self.update_port_status(context, port_id,
+                                                       status, host)
+        return results
+
     def port_bound_to_host(self, context, port_id, host):
         port = db.get_port(context.session, port_id)
         if not port:
@@ -38,7 +38,7 @@ class RpcCallbacks(n_rpc.RpcCallback,
                    type_tunnel.TunnelRpcCallbackMixin,
                    qos_db_rpc.QoSServerRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.3'
+    RPC_API_VERSION = '1.5'
     # history
     #   1.0 Initial version (from openvswitch/linuxbridge)
     #   1.1 Support Security Group RPC
@@ -46,6 +46,8 @@ class RpcCallbacks(n_rpc.RpcCallback,
     #   1.3 get_device_details rpc signature upgrade to obtain 'host' and
     #       return value to include fixed_ips and device_owner for
     #       the device port
+    #   1.4 Support update_device_list
+    #   1.5 Support get_port_qos_mappings
 
     def __init__(self, notifier, type_manager):
         self.setup_tunnel_callback_mixin(notifier, type_manager)
@@ -53,23 +55,21 @@ class RpcCallbacks(n_rpc.RpcCallback,
 
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
-        agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        host = kwargs.get('host')
-        LOG.debug("Device %(device)s details requested by agent "
-                  "%(agent_id)s with host %(host)s",
-                  {'device': device, 'agent_id': agent_id, 'host': host})
+        device = kwargs.pop('device', None)
+        return self.get_devices_details_list(rpc_context, devices=[device],
+                                             **kwargs)[0]
 
-        plugin = manager.NeutronManager.get_plugin()
-        port_id = plugin._device_to_port_id(device)
-        port_context = plugin.get_bound_port_context(rpc_context,
-                                                     port_id,
-                                                     host)
+    def _get_device_details(self, device, port_id, port_context, agent_id):
+        """Build the details of a device out of its port context.
+
+        Returns the details and the status the port should be moved to,
+        or None if it shouldn't be updated.
+        """
         if not port_context:
             LOG.warning(_("Device %(device)s requested by agent "
                           "%(agent_id)s not found in database"),
                         {'device': device, 'agent_id': agent_id})
-            return {'device': device}
+            return {'device': device}, None
 
         segment = port_context.bound_segment
         port = port_context.current
@@ -82,15 +82,12 @@ class RpcCallbacks(n_rpc.RpcCallback,
                          'agent_id': agent_id,
                          'network_id': port['network_id'],
                          'vif_type': port[portbindings.VIF_TYPE]})
-            return {'device': device}
+            return {'device': device}, None
 
         new_status = (q_const.PORT_STATUS_BUILD if port['admin_state_up']
                       else q_const.PORT_STATUS_DOWN)
-        if port['status'] != new_status:
-            plugin.update_port_status(rpc_context,
-                                      port_id,
-                                      new_status,
-                                      host)
+        if port['status'] == new_status:
+            new_status = None
 
         entry = {'device': device,
                  'network_id': port['network_id'],
@@ -104,17 +101,48 @@ class RpcCallbacks(n_rpc.RpcCallback,
                  'device_owner': port['device_owner'],
                  'profile': port[portbindings.PROFILE]}
         LOG.debug(_("Returning: %s"), entry)
-        return entry
+        return entry, new_status
 
     def get_devices_details_list(self, rpc_context, **kwargs):
-        return [
-            self.get_device_details(
-                rpc_context,
-                device=device,
-                **kwargs
-            )
-            for device in kwargs.pop('devices', [])
-        ]
+        """Agent requests the details of several devices.
+
+        All the ports are looked up and bound at once and their statuses
+        are updated in a single transaction.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices') or []
+        host = kwargs.get('host')
+        LOG.debug("Details of %(count)d devices requested by agent "
+                  "%(agent_id)s with host %(host)s",
+                  {'count': len(devices), 'agent_id': agent_id,
+                   'host': host})
+
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = [plugin._device_to_port_id(device) for device in devices]
+        port_contexts = plugin.get_bound_port_contexts(rpc_context,
+                                                       port_ids, host)
+        entries = []
+        port_statuses = {}
+        dvr_port_statuses = {}
+        for device, port_id in zip(devices, port_ids):
+            port_context = port_contexts.get(port_id)
+            entry, new_status = self._get_device_details(
+                device, port_id, port_context, agent_id)
+            entries.append(entry)
+            if not new_status:
+                continue
+            if (port_context.current['device_owner'] ==
+                    q_const.DEVICE_OWNER_DVR_INTERFACE):
+                dvr_port_statuses[port_id] = new_status
+            else:
+                port_statuses[port_id] = new_status
+
+        if port_statuses:
+            plugin.update_port_statuses(rpc_context, port_statuses)
+        # DVR interfaces keep their status in the binding of each host
+        for port_id, status in dvr_port_statuses.iteritems():
+            plugin.update_port_status(rpc_context, port_id, status, host)
+        return entries
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
@@ -172,6 +200,60 @@ class RpcCallbacks(n_rpc.RpcCallback,
             except exceptions.PortNotFound:
                 LOG.debug('Port %s not found during ARP update', port_id)
 
+    def update_device_list(self, rpc_context, **kwargs):
+        """Devices are up or down on agent.
+
+        All the status changes are committed in one transaction, so Nova
+        is notified about them in a single batch.
+        """
+        devices_up = kwargs.get('devices_up') or []
+        devices_down = kwargs.get('devices_down') or []
+        agent_id = kwargs.get('agent_id')
+        host = kwargs.get('host')
+        LOG.debug("Devices %(up)s up and %(down)s down at agent "
+                  "%(agent_id)s",
+                  {'up': devices_up, 'down': devices_down,
+                   'agent_id': agent_id})
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = dict((device, plugin._device_to_port_id(device))
+                        for device in devices_up + devices_down)
+        port_statuses = dict((port_ids[device], q_const.PORT_STATUS_ACTIVE)
+                             for device in devices_up)
+        port_statuses.update((port_ids[device], q_const.PORT_STATUS_DOWN)
+                             for device in devices_down)
+        try:
+            updated = plugin.update_port_statuses(rpc_context, port_statuses,
+                                                  host)
+        except Exception:
+            LOG.exception(_("Failed to update the status of devices "
+                            "reported by agent %s"), agent_id)
+            return {'devices_up': [], 'failed_devices_up': devices_up,
+                    'devices_down': [], 'failed_devices_down': devices_down}
+
+        l3plugin = manager.NeutronManager.get_service_plugins().get(
+            service_constants.L3_ROUTER_NAT)
+        if (l3plugin and
+            utils.is_extension_supported(l3plugin,
+                                         q_const.L3_DISTRIBUTED_EXT_ALIAS)):
+            for device in devices_up:
+                port_id = updated.get(port_ids[device])
+                if not port_id:
+                    continue
+                try:
+                    l3plugin.dvr_vmarp_table_update(rpc_context, port_id,
+                                                    "add")
+                except exceptions.PortNotFound:
+                    LOG.debug('Port %s not found during ARP update',
+                              port_id)
+
+        # Ports not bound to the host are left untouched but still exist
+        devices_down = [{'device': device,
+                         'exists': updated.get(port_ids[device],
+                                               True) is not None}
+                        for device in devices_down]
+        return {'devices_up': devices_up, 'failed_devices_up': [],
+                'devices_down': devices_down, 'failed_devices_down': []}
+
 
 class AgentNotifierApi(n_rpc.RpcProxy,
                        dvr_rpc.DVRAgentRpcApiMixin,
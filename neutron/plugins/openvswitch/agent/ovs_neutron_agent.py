@@ -29,6 +29,7 @@ from six import moves
 from neutron.agent import l2population_rpc
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import ovsdb_monitor
 from neutron.agent.linux import polling
 from neutron.agent.linux import utils
 from neutron.agent import rpc as agent_rpc
@@ -59,6 +60,10 @@ class DeviceListRetrievalError(exceptions.NeutronException):
                 "because of error: %(error)s")
 
 
+class DeviceStatusUpdateError(exceptions.NeutronException):
+    message = _("Unable to update the status of devices: %(devices)s")
+
+
 # A class to represent a VIF (i.e., a port that has 'iface-id' and 'vif-mac'
 # attributes set).
 class LocalVLANMapping:
@@ -139,7 +144,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                  ovsdb_monitor_respawn_interval=(
                      constants.DEFAULT_OVSDBMON_RESPAWN),
                  arp_responder=False,
-                 use_veth_interconnection=False):
+                 use_veth_interconnection=False,
+                 full_rescan_interval=constants.DEFAULT_FULL_RESCAN_INTERVAL):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -162,6 +168,9 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                supported.
         :param use_veth_interconnection: use veths instead of patch ports to
                interconnect the integration bridge to physical bridges.
+        :param full_rescan_interval: Optional, when using polling
+               minimization, the number of seconds between two full rescans
+               of the bridges ports.
         '''
         super(OVSNeutronAgent, self).__init__()
         self.use_veth_interconnection = use_veth_interconnection
@@ -209,6 +218,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         self.polling_interval = polling_interval
         self.minimize_polling = minimize_polling
         self.ovsdb_monitor_respawn_interval = ovsdb_monitor_respawn_interval
+        self.full_rescan_interval = full_rescan_interval
+        self.last_full_rescan = 0
 
         if tunnel_types:
             self.enable_tunneling = True
@@ -962,6 +973,83 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         port_info['removed'] = registered_ports - cur_ports
         return port_info
 
+    def process_ports_events(self, events, registered_ports,
+                             updated_ports=None):
+        """Build port_info from the ovsdb monitor events only.
+
+        Unlike scan_ports, the cost only depends on the number of events.
+        Returns None when the events aren't enough to compute the changes
+        and a full scan is required. Vlan tags are in the Port table, which
+        isn't monitored: a port plugged again is reported as updated, other
+        tag losses are caught by the periodic full scan.
+        """
+        present = {}
+        gone = set()
+        for event, device in events:
+            external_ids = device['external_ids']
+            port_id = external_ids.get('iface-id')
+            if not port_id or 'attached-mac' not in external_ids:
+                if 'xs-vif-uuid' in external_ids:
+                    # The iface-id has to be fetched from XAPI
+                    return
+                continue
+            ofport = device['ofport']
+            if (event != ovsdb_monitor.DEVICE_REMOVED and
+                    isinstance(ofport, int) and ofport > 0):
+                present[port_id] = device['name']
+                gone.discard(port_id)
+            else:
+                # Removed, or not ready or failed and therefore not
+                # considered by get_vif_port_set either
+                present.pop(port_id, None)
+                gone.add(port_id)
+
+        if present:
+            # Only consider the ports of our bridges
+            port_names = set(self.int_br.get_port_name_list())
+            port_names.update(self.ex_br.get_port_name_list())
+            for port_id, name in present.items():
+                if name not in port_names:
+                    del present[port_id]
+                    gone.add(port_id)
+
+        added = set(present) - registered_ports
+        removed = gone & registered_ports
+        cur_ports = (registered_ports - removed) | added
+        self.int_br_device_count = len(cur_ports)
+        port_info = {'current': cur_ports}
+        # Changes of already known ports, like a new ofport, need rewiring
+        updated_ports = set(updated_ports or ())
+        updated_ports.update(set(present) & registered_ports)
+        updated_ports &= cur_ports
+        if updated_ports:
+            port_info['updated'] = updated_ports
+        if added or removed:
+            port_info['added'] = added
+            port_info['removed'] = removed
+        return port_info
+
+    def _full_rescan_due(self):
+        return (time.time() - self.last_full_rescan >=
+                self.full_rescan_interval)
+
+    def _get_port_info(self, polling_manager, registered_ports,
+                       updated_ports, full_rescan):
+        """Return port_info from the monitor events or from a full scan."""
+        full_rescan = full_rescan or self._full_rescan_due()
+        # Always consume the events, a full scan covers them
+        events = polling_manager.get_events()
+        port_info = None
+        if events is not None and not full_rescan:
+            port_info = self.process_ports_events(events, registered_ports,
+                                                  updated_ports)
+        if port_info is None:
+            LOG.debug(_("Agent rpc_loop - iteration:%d - full ports rescan"),
+                      self.iter_num)
+            self.last_full_rescan = time.time()
+            port_info = self.scan_ports(registered_ports, updated_ports)
+        return port_info
+
     def check_changed_vlans(self, registered_ports):
         """Return ports which have lost their vlan tag.
 
@@ -1082,8 +1170,31 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                     br.delete_flows(in_port=ofport)
                     self.tun_br_ofports[tunnel_type].pop(remote_ip, None)
 
+    def _update_device_list(self, devices_up, devices_down):
+        """Report device statuses to the plugin in one call.
+
+        Raises DeviceStatusUpdateError if any device could not be updated.
+        """
+        if not devices_up and not devices_down:
+            return {'devices_up': [], 'devices_down': []}
+        try:
+            res = self.plugin_rpc.update_device_list(self.context,
+                                                     devices_up,
+                                                     devices_down,
+                                                     self.agent_id,
+                                                     cfg.CONF.host)
+        except Exception as e:
+            LOG.debug(_("update_device_list failed: %s"), e)
+            raise DeviceStatusUpdateError(devices=devices_up + devices_down)
+        failed = res['failed_devices_up'] + res['failed_devices_down']
+        if failed:
+            raise DeviceStatusUpdateError(devices=failed)
+        return res
+
     def treat_devices_added_or_updated(self, devices, ovs_restarted):
         skipped_devices = []
+        devices_up = []
+        devices_down = []
         try:
             devices_details_list = self.plugin_rpc.get_devices_details_list(
                 self.context,
@@ -1092,10 +1203,12 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 cfg.CONF.host)
         except Exception as e:
             raise DeviceListRetrievalError(devices=devices, error=e)
+        vif_ports = self.int_br.get_vifs_by_ids(
+            details['device'] for details in devices_details_list)
         for details in devices_details_list:
             device = details['device']
             LOG.debug("Processing port: %s", device)
-            port = self.int_br.get_vif_port_by_id(device)
+            port = vif_ports.get(device)
             if not port:
                 # The port disappeared and cannot be processed
                 LOG.info(_("Port %s was not found on the integration bridge "
@@ -1115,24 +1228,20 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                     details['fixed_ips'],
                                     details['device_owner'],
                                     ovs_restarted)
-                # update plugin about port status
-                # FIXME(salv-orlando): Failures while updating device status
-                # must be handled appropriately. Otherwise this might prevent
-                # neutron server from sending network-vif-* events to the nova
-                # API server, thus possibly preventing instance spawn.
+                # update plugin about port status, in a single call for
+                # every device of this batch
                 if details.get('admin_state_up'):
                     LOG.debug(_("Setting status for %s to UP"), device)
-                    self.plugin_rpc.update_device_up(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_up.append(device)
                 else:
                     LOG.debug(_("Setting status for %s to DOWN"), device)
-                    self.plugin_rpc.update_device_down(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_down.append(device)
                 LOG.info(_("Configuration for device %s completed."), device)
             else:
                 LOG.warn(_("Device %s not defined on plugin"), device)
                 if (port and port.ofport != -1):
                     self.port_dead(port)
+        self._update_device_list(devices_up, devices_down)
         return skipped_devices
 
     def treat_ancillary_devices_added(self, devices):
@@ -1145,53 +1254,56 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         except Exception as e:
             raise DeviceListRetrievalError(devices=devices, error=e)
 
+        devices_up = []
         for details in devices_details_list:
             device = details['device']
             LOG.info(_("Ancillary Port %s added"), device)
+            devices_up.append(device)
 
-            # update plugin about port status
-            self.plugin_rpc.update_device_up(self.context,
-                                             device,
-                                             self.agent_id,
-                                             cfg.CONF.host)
+        # update plugin about port status
+        self._update_device_list(devices_up, [])
 
-    def treat_devices_removed(self, devices):
-        resync = False
-        self.sg_agent.remove_devices_filter(devices)
+    def _report_devices_removed(self, devices):
+        """Report removed devices down.
+
+        Returns the update_device_down results of the devices which were
+        reported and whether a resync is needed.
+        """
+        if not devices:
+            return [], False
         for device in devices:
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-            self.port_unbound(device)
+        try:
+            res = self.plugin_rpc.update_device_list(self.context,
+                                                     [],
+                                                     list(devices),
+                                                     self.agent_id,
+                                                     cfg.CONF.host)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            return [], True
+        if res['failed_devices_down']:
+            LOG.debug(_("port_removed failed for %s"),
+                      res['failed_devices_down'])
+        return res['devices_down'], bool(res['failed_devices_down'])
+
+    def treat_devices_removed(self, devices):
+        self.sg_agent.remove_devices_filter(devices)
+        devices_down, resync = self._report_devices_removed(devices)
+        for details in devices_down:
+            self.port_unbound(details['device'])
         return resync
 
     def treat_ancillary_devices_removed(self, devices):
-        resync = False
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        devices_down, resync = self._report_devices_removed(devices)
+        for details in devices_down:
             if details['exists']:
-                LOG.info(_("Port %s updated."), device)
+                LOG.info(_("Port %s updated."), details['device'])
                 # Nothing to do regarding local networking
             else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
+                LOG.debug(_("Device %s not defined on plugin"),
+                          details['device'])
         return resync
 
     def process_network_ports(self, port_info, ovs_restarted):
@@ -1232,7 +1344,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 # have been actually processed.
                 port_info['current'] = (port_info['current'] -
                                         set(skipped_devices))
-            except DeviceListRetrievalError:
+            except (DeviceListRetrievalError, DeviceStatusUpdateError):
                 # Need to resync as there was an error with server
                 # communication.
                 LOG.exception(_("process_network_ports - iteration:%d - "
@@ -1261,7 +1373,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                             "completed in %(elapsed).3f"),
                         {'iter_num': self.iter_num,
                         'elapsed': time.time() - start})
-            except DeviceListRetrievalError:
+            except (DeviceListRetrievalError, DeviceStatusUpdateError):
                 # Need to resync as there was an error with server
                 # communication.
                 LOG.exception(_("process_ancillary_network_ports - "
@@ -1339,6 +1451,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
             polling_manager = polling.AlwaysPoll()
 
         sync = True
+        full_rescan = True
         ports = set()
         updated_ports_copy = set()
         ancillary_ports = set()
@@ -1358,6 +1471,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 ports.clear()
                 ancillary_ports.clear()
                 sync = False
+                full_rescan = True
                 polling_manager.force_polling()
             ovs_restarted = self.check_ovs_restart()
             if ovs_restarted:
@@ -1379,7 +1493,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 except Exception:
                     LOG.exception(_("Error while synchronizing tunnels"))
                     tunnel_sync = True
-            if self._agent_has_updates(polling_manager) or ovs_restarted:
+            if (self._agent_has_updates(polling_manager) or ovs_restarted or
+                    self._full_rescan_due()):
                 try:
                     LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d - "
                                 "starting polling. Elapsed:%(elapsed).3f"),
@@ -1392,7 +1507,10 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                     updated_ports_copy = self.updated_ports
                     self.updated_ports = set()
                     reg_ports = (set() if ovs_restarted else ports)
-                    port_info = self.scan_ports(reg_ports, updated_ports_copy)
+                    port_info = self._get_port_info(
+                        polling_manager, reg_ports, updated_ports_copy,
+                        full_rescan or ovs_restarted)
+                    full_rescan = False
                     LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d - "
                                 "port information retrieved. "
                                 "Elapsed:%(elapsed).3f"),
@@ -1507,6 +1625,7 @@ def create_agent_config_map(config):
         l2_population=config.AGENT.l2_population,
         arp_responder=config.AGENT.arp_responder,
         use_veth_interconnection=config.OVS.use_veth_interconnection,
+        full_rescan_interval=config.AGENT.full_rescan_interval,
     )
 
     # If enable_tunneling is TRUE, set tunnel_type to default to GRE
@@ -75,6 +75,12 @@ agent_opts = [
                default=constants.DEFAULT_OVSDBMON_RESPAWN,
                help=_("The number of seconds to wait before respawning the "
                       "ovsdb monitor after losing communication with it.")),
+    cfg.IntOpt('full_rescan_interval',
+               default=constants.DEFAULT_FULL_RESCAN_INTERVAL,
+               help=_("When minimizing polling, only the interfaces reported "
+                      "by the ovsdb monitor are processed. This is the "
+                      "number of seconds between two full rescans of the "
+                      "bridges ports done as a safety net.")),
     cfg.ListOpt('tunnel_types', default=DEFAULT_TUNNEL_TYPES,
                 help=_("Network types supported by the agent "
                        "(gre and/or vxlan).")),
@@ -60,6 +60,10 @@ TUN_TABLE = {p_const.TYPE_GRE: GRE_TUN_TO_LV,
 # The default respawn interval for the ovsdb monitor
 DEFAULT_OVSDBMON_RESPAWN = 30
 
+# The default interval between two full rescans of the bridges ports when
+# changes are tracked with the ovsdb monitor
+DEFAULT_FULL_RESCAN_INTERVAL = 600
+
 # Represent invalid OF Port
 OFPORT_INVALID = -1
 
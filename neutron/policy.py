@@ -38,6 +38,10 @@ from neutron.openstack.common import policy
 LOG = log.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# Evaluators compiled from the rules in _COMPILED_RULES, dropped as soon
+# as other rules are loaded
+_COMPILED_CACHE = {}
+_COMPILED_RULES = None
 ADMIN_CTX_POLICY = 'context_is_admin'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
@@ -62,8 +66,12 @@ cfg.CONF.import_opt('policy_file', 'neutron.common.config')
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _COMPILED_CACHE
+    global _COMPILED_RULES
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _COMPILED_CACHE = {}
+    _COMPILED_RULES = None
     policy.reset()
 
 
@@ -252,43 +260,52 @@ class OwnerCheck(policy.Check):
                 reason=err_reason)
         super(OwnerCheck, self).__init__(kind, match)
 
+    def get_parent(self):
+        """Get the parent resource, field and foreign key of the check.
+
+        Only meaningful when the target field isn't part of the target
+        itself but refers to a field of its parent resource.
+        """
+        # target field is in the form resource:field
+        # however if they're not separated by a colon, use an underscore
+        # as a separator for backward compatibility
+
+        def do_split(separator):
+            parent_res, parent_field = self.target_field.split(
+                separator, 1)
+            return parent_res, parent_field
+
+        for separator in (':', '_'):
+            try:
+                parent_res, parent_field = do_split(separator)
+                break
+            except ValueError:
+                LOG.debug(_("Unable to find ':' as separator in %s."),
+                          self.target_field)
+        else:
+            # If we are here split failed with both separators
+            err_reason = (_("Unable to find resource name in %s") %
+                          self.target_field)
+            LOG.exception(err_reason)
+            raise exceptions.PolicyCheckError(
+                policy="%s:%s" % (self.kind, self.match),
+                reason=err_reason)
+        parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+            "%ss" % parent_res, None)
+        if not parent_foreign_key:
+            err_reason = (_("Unable to verify match:%(match)s as the "
+                            "parent resource: %(res)s was not found") %
+                          {'match': self.match, 'res': parent_res})
+            LOG.exception(err_reason)
+            raise exceptions.PolicyCheckError(
+                policy="%s:%s" % (self.kind, self.match),
+                reason=err_reason)
+        return parent_res, parent_field, parent_foreign_key
+
     def __call__(self, target, creds):
         if self.target_field not in target:
             # policy needs a plugin check
-            # target field is in the form resource:field
-            # however if they're not separated by a colon, use an underscore
-            # as a separator for backward compatibility
-
-            def do_split(separator):
-                parent_res, parent_field = self.target_field.split(
-                    separator, 1)
-                return parent_res, parent_field
-
-            for separator in (':', '_'):
-                try:
-                    parent_res, parent_field = do_split(separator)
-                    break
-                except ValueError:
-                    LOG.debug(_("Unable to find ':' as separator in %s."),
-                              self.target_field)
-            else:
-                # If we are here split failed with both separators
-                err_reason = (_("Unable to find resource name in %s") %
-                              self.target_field)
-                LOG.exception(err_reason)
-                raise exceptions.PolicyCheckError(
-                    policy="%s:%s" % (self.kind, self.match),
-                    reason=err_reason)
-            parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
-                "%ss" % parent_res, None)
-            if not parent_foreign_key:
-                err_reason = (_("Unable to verify match:%(match)s as the "
-                                "parent resource: %(res)s was not found") %
-                              {'match': self.match, 'res': parent_res})
-                LOG.exception(err_reason)
-                raise exceptions.PolicyCheckError(
-                    policy="%s:%s" % (self.kind, self.match),
-                    reason=err_reason)
+            parent_res, parent_field, parent_foreign_key = self.get_parent()
             # NOTE(salv-orlando): This check currently assumes the parent
             # resource is handled by the core plugin. It might be worth
             # having a way to map resources to plugins so to make this
@@ -348,6 +365,264 @@ class FieldCheck(policy.Check):
         return target_value == self.value
 
 
+# A compiled rule: evaluate(target, creds, resolver) returns the result
+# of the rule, keys are the functions of the target it depends on or None
+# when that isn't known.
+_Evaluator = collections.namedtuple('_Evaluator', ['evaluate', 'keys'])
+
+_TARGET_FIELD_RE = re.compile(r'%\(([^)]+)\)s')
+
+
+# Keys a missing target field apart from a field set to None
+_MISSING = object()
+
+
+def _field_key(field):
+    return lambda target: target.get(field, _MISSING)
+
+
+def _owner_key(check):
+    """Key an OwnerCheck on its field, or on the id of the parent."""
+    for separator in (':', '_'):
+        if separator in check.target_field:
+            parent_res = check.target_field.split(separator, 1)[0]
+            parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+                "%ss" % parent_res)
+            break
+    else:
+        parent_foreign_key = None
+    field = check.target_field
+    if not parent_foreign_key:
+        return _field_key(field), False
+
+    def key(target):
+        if field in target:
+            return target[field], None
+        return None, target.get(parent_foreign_key)
+    return key, True
+
+
+def _compile_check(rule, rules, keys, seen):
+    """Turn a check tree into a function of (target, creds, resolver).
+
+    Named rules are inlined, the functions of the target the result depends
+    on are added to keys by name, a None name meaning that it can't be
+    told.
+    """
+    if isinstance(rule, policy.TrueCheck):
+        return lambda target, creds, resolver: True
+    if isinstance(rule, policy.FalseCheck):
+        return lambda target, creds, resolver: False
+    if isinstance(rule, policy.NotCheck):
+        check = _compile_check(rule.rule, rules, keys, seen)
+        return lambda target, creds, resolver: not check(target, creds,
+                                                          resolver)
+    if isinstance(rule, policy.AndCheck):
+        checks = [_compile_check(r, rules, keys, seen) for r in rule.rules]
+        return lambda target, creds, resolver: all(
+            check(target, creds, resolver) for check in checks)
+    if isinstance(rule, policy.OrCheck):
+        checks = [_compile_check(r, rules, keys, seen) for r in rule.rules]
+        return lambda target, creds, resolver: any(
+            check(target, creds, resolver) for check in checks)
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in seen:
+            # Recursive rules are left to the policy engine
+            keys[None] = None
+            return lambda target, creds, resolver: rule(target, creds)
+        try:
+            named_rule = rules[rule.match]
+        except (KeyError, TypeError):
+            # We don't have any matching rule; fail closed
+            return lambda target, creds, resolver: False
+        check = _compile_check(named_rule, rules, keys,
+                               seen | set([rule.match]))
+
+        def check_rule(target, creds, resolver):
+            try:
+                return check(target, creds, resolver)
+            except KeyError:
+                # As RuleCheck, a field missing from the target or the
+                # credentials fails closed
+                return False
+        return check_rule
+    if isinstance(rule, policy.RoleCheck):
+        pass
+    elif isinstance(rule, OwnerCheck):
+        key, has_parent = _owner_key(rule)
+        keys[rule.target_field] = key
+        if has_parent:
+            def check_owner(target, creds, resolver):
+                if resolver and rule.target_field not in target:
+                    resolver.resolve(rule)
+                return rule(target, creds)
+            return check_owner
+    elif isinstance(rule, FieldCheck):
+        keys.setdefault(rule.field, _field_key(rule.field))
+    elif isinstance(rule, policy.GenericCheck):
+        for field in _TARGET_FIELD_RE.findall(rule.match):
+            keys.setdefault(field, _field_key(field))
+    else:
+        keys[None] = None
+    return lambda target, creds, resolver: rule(target, creds)
+
+
+def _compile(rule, rules):
+    keys = {}
+    evaluate = _compile_check(rule, rules, keys, set())
+    return _Evaluator(evaluate,
+                      None if None in keys else tuple(keys.values()))
+
+
+def _get_compiled(key, compile_func):
+    global _COMPILED_CACHE
+    global _COMPILED_RULES
+    if policy._rules is not _COMPILED_RULES:
+        _COMPILED_CACHE = {}
+        _COMPILED_RULES = policy._rules
+    try:
+        return _COMPILED_CACHE[key]
+    except KeyError:
+        value = _COMPILED_CACHE[key] = compile_func()
+        return value
+
+
+def _get_evaluator(action, might_not_exist=False):
+    """Get the compiled rule of a read action.
+
+    Returns None if might_not_exist is set and there's no such policy.
+    """
+    def compile_action():
+        rules = policy._rules
+        if might_not_exist and not (rules and action in rules):
+            return
+        return _compile(policy.RuleCheck('rule', action), rules)
+    return _get_compiled((action, might_not_exist), compile_action)
+
+
+def _get_attribute_evaluators(action, attribute_names):
+    """Get the compiled rules of the attributes of a read action.
+
+    Returns (attribute name, action, evaluator) for the attributes which
+    have a policy, the others are visible. Only the rule of each attribute
+    is cached, the attribute names may come from the fields of a request.
+    """
+    evaluators = []
+    for attribute_name in attribute_names:
+        attr_action = '%s:%s' % (action, attribute_name)
+        evaluator = _get_evaluator(attr_action, might_not_exist=True)
+        if evaluator:
+            evaluators.append((attribute_name, attr_action, evaluator))
+    return evaluators
+
+
+class _ParentResolver(object):
+    """Load the parent fields needed by OwnerCheck for a batch of targets.
+
+    The first target missing a parent field triggers a single lookup of
+    the parents of all the targets still missing it.
+    """
+
+    def __init__(self, targets):
+        self.targets = targets
+        self._resolved = set()
+
+    def resolve(self, check):
+        if check.target_field in self._resolved:
+            return
+        self._resolved.add(check.target_field)
+        parent_res, parent_field, parent_foreign_key = check.get_parent()
+        parent_ids = set(target[parent_foreign_key]
+                         for target in self.targets
+                         if check.target_field not in target and
+                         parent_foreign_key in target)
+        if not parent_ids:
+            return
+        # FIXME(ihrachys): if import is put in global, circular
+        # import failure occurs
+        from neutron import manager
+        f = getattr(manager.NeutronManager.get_instance().plugin,
+                    'get_%ss' % parent_res, None)
+        if not f:
+            # Left to OwnerCheck, one parent at a time
+            return
+        context = importutils.import_module('neutron.context')
+        try:
+            parents = f(context.get_admin_context(),
+                        filters={'id': list(parent_ids)},
+                        fields=['id', parent_field])
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_LE('Policy check error while calling %s!'), f)
+        values = dict((parent['id'], parent[parent_field])
+                      for parent in parents)
+        for target in self.targets:
+            if (check.target_field not in target and
+                    target.get(parent_foreign_key) in values):
+                target[check.target_field] = values[
+                    target[parent_foreign_key]]
+
+
+class Checker(object):
+    """Evaluate read policies on the objects returned to a request.
+
+    Rules are compiled once per action and kept until other policies are
+    loaded. Results are memoized by the target fields the rule looks at,
+    so that objects sharing them, e.g. the ports of a tenant, are checked
+    once, and the parents of the objects given to filter() are loaded
+    with a single call.
+    """
+
+    def __init__(self, context):
+        self.credentials = context.to_dict()
+        self._results = {}
+
+    def _check(self, action, evaluator, target, resolver=None):
+        key = None
+        if evaluator.keys is not None:
+            key = (action,) + tuple(get(target) for get in evaluator.keys)
+            try:
+                return self._results[key]
+            except KeyError:
+                pass
+            except TypeError:
+                # Unhashable target value
+                key = None
+        result = evaluator.evaluate(target, self.credentials, resolver)
+        if key is not None:
+            self._results[key] = result
+        return result
+
+    def check(self, action, target, might_not_exist=False):
+        """Verifies that the read action is valid on the target.
+
+        Same as check() for read actions.
+        """
+        evaluator = _get_evaluator(action, might_not_exist)
+        if evaluator is None:
+            return True
+        return self._check(action, evaluator, target)
+
+    def filter(self, action, targets):
+        """Return the targets the read action is valid on."""
+        evaluator = _get_evaluator(action)
+        resolver = _ParentResolver(targets)
+        return [target for target in targets
+                if self._check(action, evaluator, target, resolver)]
+
+    def get_refused_attributes(self, action, attribute_names, target):
+        """Return the attributes of the target the user may not read.
+
+        :param action: the read action, e.g. get_port
+        :param attribute_names: the attributes to check, attributes without
+            a policy for action are always allowed
+        """
+        return [attribute_name
+                for attribute_name, attr_action, evaluator in
+                _get_attribute_evaluators(action, attribute_names)
+                if not self._check(attr_action, evaluator, target)]
+
+
 def _prepare_check(context, action, target):
     """Prepare rule, target, and credentials for the policy engine."""
     # Compare with None to distinguish case in which target is {}
@@ -377,6 +652,10 @@ def check(context, action, target, plugin=None, might_not_exist=False):
     """
     if might_not_exist and not (policy._rules and action in policy._rules):
         return True
+    if not get_resource_and_action(action)[1]:
+        # The rule of a read action doesn't depend on the target
+        return Checker(context).check(action,
+                                      {} if target is None else target)
     return policy.check(*(_prepare_check(context, action, target)))
 
 
@@ -50,6 +50,12 @@ LOG = logging.getLogger(__name__)
 class BrocadeSVIPlugin(router.L3RouterPlugin):
     """Brocade SVI service Plugin."""
 
+    # This attribute specifies whether the plugin supports or not
+    # bulk/pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self):
         """Initialize Brocade Plugin
 
@@ -29,6 +29,12 @@ class ApicL3ServicePlugin(db_base_plugin_v2.NeutronDbPluginV2,
                           extraroute_db.ExtraRoute_db_mixin):
     supported_extension_aliases = ["router", "ext-gw-mode", "extraroute"]
 
+    # This attribute specifies whether the plugin supports or not
+    # bulk/pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self):
         super(ApicL3ServicePlugin, self).__init__()
         self.manager = mechanism_apic.APICMechanismDriver.get_apic_manager()
@@ -52,6 +52,12 @@ class AristaL3ServicePlugin(db_base_plugin_v2.NeutronDbPluginV2,
     supported_extension_aliases = ["router", "ext-gw-mode",
                                    "extraroute"]
 
+    # This attribute specifies whether the plugin supports or not
+    # bulk/pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self, driver=None):
 
         self.driver = driver or AristaL3Driver()
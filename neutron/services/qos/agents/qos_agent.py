@@ -68,8 +68,23 @@ class QoSAgent(QoSPluginRpc, qos_rpc.QoSAgentRpcMixin, manager.Manager):
         super(QoSAgent, self).__init__()
 
         br_name = ovs_lib.get_bridges(self.root_helper)[0]
-        ext_bridge = ovs_lib.OVSBridge(br_name, self.root_helper)
-        self.init_qos(ext_bridge=ext_bridge)
+        self.ext_bridge = ovs_lib.OVSBridge(br_name, self.root_helper)
+        self.init_qos(ext_bridge=self.ext_bridge)
+
+        # Catch up with any cast missed while down, then periodically
+        self.sync_loop = loopingcall.FixedIntervalLoopingCall(self._sync_qos)
+        sync_interval = self.conf.qos_sync_interval
+        if sync_interval:
+            self.sync_loop.start(interval=sync_interval)
+        else:
+            self._sync_qos()
+
+    def _sync_qos(self):
+        try:
+            port_ids = self.ext_bridge.get_vif_port_set()
+            self.sync_port_qos(self.context, port_ids)
+        except Exception:
+            LOG.exception(_("Failed synchronizing port QoS"))
 
 
 class QoSAgentWithStateReport(QoSAgent):
@@ -14,17 +14,24 @@
 
 from neutron.common import topics
 from neutron.openstack.common import importutils
+from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from oslo.config import cfg
 
 LOG = logging.getLogger(__name__)
 QOS_RPC_VERSION = "1.0"
+# get_port_qos_mappings was added in version 1.5 of the plugin RPC API
+QOS_SYNC_RPC_VERSION = "1.5"
 
 
 QoSOpts = [
     cfg.StrOpt(
         'qos_driver',
-        default='neutron.services.qos.drivers.qos_base.py.NoOpQoSDriver')
+        default='neutron.services.qos.drivers.qos_base.py.NoOpQoSDriver'),
+    cfg.IntOpt(
+        'qos_sync_interval', default=300,
+        help=_("Seconds between two full resynchronizations of the port "
+               "QoS with the server, 0 to only synchronize at startup."))
 ]
 
 cfg.CONF.register_opts(QoSOpts)
@@ -93,6 +100,14 @@ class QoSServerRpcApiMixin(object):
                          version=QOS_RPC_VERSION,
                          topic=self.topic)
 
+    def get_port_qos_mappings(self, context, port_ids):
+        LOG.debug(_("Get QoS mappings for %d ports via RPC"), len(port_ids))
+        return self.call(context,
+                         self.make_msg('get_port_qos_mappings',
+                                       port_ids=port_ids),
+                         version=QOS_SYNC_RPC_VERSION,
+                         topic=self.topic)
+
 
 class QoSAgentRpcMixin(object):
 
@@ -108,14 +123,23 @@ class QoSAgentRpcMixin(object):
         qos_policy = self.plugin_rpc.get_policy_for_qos(context, qos_id)
         self.qos.network_qos_updated(qos_policy, network_id)
 
+    @lockutils.synchronized('qos-agent', 'neutron-')
     def port_qos_updated(self, context, qos_id, port_id, ip_address):
         qos_policy = self.plugin_rpc.get_policy_for_qos(context, qos_id)
         self.qos.port_qos_updated(qos_policy, port_id, ip_address)
 
+    @lockutils.synchronized('qos-agent', 'neutron-')
     def port_qos_deleted(self, context, qos_id, port_id, ip_address):
         qos_policy = self.plugin_rpc.get_policy_for_qos(context, qos_id)
         self.qos.delete_qos_for_port(qos_policy, port_id, ip_address)
 
+    @lockutils.synchronized('qos-agent', 'neutron-')
+    def sync_port_qos(self, context, port_ids):
+        """Reconcile the QoS of port_ids with the mappings of the server."""
+        mappings = self.plugin_rpc.get_port_qos_mappings(context,
+                                                         list(port_ids))
+        self.qos.sync_port_qos(mappings)
+
 
 class QoSAgentRpcCallbackMixin(object):
 
@@ -13,8 +13,26 @@
 #    under the License.
 
 from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log as logging
 from neutron.services.qos.drivers import qos_base
 
+LOG = logging.getLogger(__name__)
+
+# Policy used to remove the flows of a queue whose mapping is gone on the
+# server. The non-strict deletion on ip also removes tcp or udp flows.
+STALE_QUEUE_POLICY = {'protocol': 'ip'}
+
+
+def _loads_tables(output):
+    """Parse the JSON tables printed by a multi-command ovs-vsctl call."""
+    return [jsonutils.loads(line) for line in output.splitlines()
+            if line.strip()]
+
+
+def _json_map(value):
+    # ovs-vsctl JSON maps are ["map", [[key, value], ...]]
+    return dict(value[1])
+
 
 class ChinacQoSDriver(qos_base.QoSDriver):
     # TODO(liuzhikun) implement an ovs_lib class to help maintain qos
@@ -26,30 +44,33 @@ class ChinacQoSDriver(qos_base.QoSDriver):
         self.QOS_UUID = ""
         # TODO: use random int instead of increasing int
         self.TOP_QUEUE_REF = 0
-        self.qoses = {}
+        # (port_id, ip_address) -> (queue uuid, queue_ref, ofport)
+        self.queues = {}
+        # queue uuid -> max rate of the queue
+        self.queue_rates = {}
 
         self.init_qos()
-        self.init_qosqueues()
-
 
     def init_qos(self):
-        # Initialize QoS setting
-        qos_id = ""
-        result = self.ext_bridge.run_vsctl(['--format=json',
-                                            '--columns=_uuid,external_ids',
-                                            'list', 'qos'],
-                                           check_error=True)
-        res = jsonutils.loads(result)
-        if res['data']:
-            qos_id = res['data'][0][0][1]
-
-        if qos_id:
-            self.QOS_UUID = qos_id
+        # Fetch the QoS and every queue in a single listing
+        result = self.ext_bridge.run_vsctl(
+            ['--format=json',
+             '--', '--columns=_uuid,external_ids', 'list', 'qos',
+             '--', '--columns=_uuid,external_ids,other_config',
+             'list', 'queue'],
+            check_error=True)
+        qos_table, queue_table = _loads_tables(result)
+
+        if qos_table['data']:
+            qos_uuid, external_ids = qos_table['data'][0]
+            self.QOS_UUID = qos_uuid[1]
+            self.TOP_QUEUE_REF = int(
+                _json_map(external_ids).get('top_queue_ref', 0))
         else:
             # create default qos and queue
             result = self.ext_bridge.run_vsctl(['--',
                             "--id=@qosid", 'create', 'qos', "type=linux-htb",
-                            "external_ids:top_queue_ref=0","queues=0=@q0",
+                            "external_ids:top_queue_ref=0", "queues=0=@q0",
                             '--', "--id=@q0", 'create', 'queue',
                             "other-config:min-rate=1000000000",
                             "other-config:max-rate=1000000000"],
@@ -61,97 +82,169 @@ class ChinacQoSDriver(qos_base.QoSDriver):
                                    'qos', self.QOS_UUID],
                                   check_error=True)
 
-        result = self.ext_bridge.db_get_map('qos',
-                                            self.QOS_UUID,
-                                            'external_ids')
-        self.TOP_QUEUE_REF = int(result['top_queue_ref'])
-
-    def init_qosqueues(self):
-        # Initialize QoS queues for ports
-        result = self.ext_bridge.run_vsctl(['--format=json',
-                                            '--columns=_uuid',
-                                            'list', 'queue'],
-                                           check_error=True)
-        res = jsonutils.loads(result)
-        if not res['data']:
-            return
+        self.init_qosqueues(queue_table['data'])
 
-        for qid in res['data'][0]:
-            result = self.ext_bridge.db_get_map('queue', qid[1],
-                                                'external_ids',
-                                                check_error=True)
-            if not hasattr(result, 'port_id'):
+    def init_qosqueues(self, queue_rows):
+        # Rebuild the port queues index from the queue listing
+        port_queues = {}
+        for queue_uuid, external_ids, other_config in queue_rows:
+            external_ids = _json_map(external_ids)
+            if 'port_id' not in external_ids:
                 continue
-            qos_key = "%s-%s" % (result['port_id'], result['ip_address'])
-            self.qoses[qos_key] = True
+            port_queues[(external_ids['port_id'],
+                         external_ids['ip_address'])] = (
+                queue_uuid[1], int(external_ids['queue_ref']))
+            self.queue_rates[queue_uuid[1]] = (
+                _json_map(other_config).get('max-rate'))
 
+        vifs = self.ext_bridge.get_vifs_by_ids(
+            port_id for port_id, _ip_address in port_queues)
+        for qos_key, (queue_id, queue_ref) in port_queues.iteritems():
+            vif = vifs.get(qos_key[0])
+            self.queues[qos_key] = (queue_id, queue_ref,
+                                    vif.ofport if vif else None)
+        LOG.debug(_("Found %d port queues"), len(self.queues))
+
+    def _get_ofport(self, port_id):
+        # Not cached: the ofport changes when the VIF is plugged again
+        vif = self.ext_bridge.get_vifs_by_ids([port_id]).get(port_id)
+        if vif:
+            return vif.ofport
 
     def _create_queue_for_port(self, policy, port_id, ip_address):
-        self.TOP_QUEUE_REF += 1
-        result = self.ext_bridge.run_vsctl(['create', 'queue',
+        queue_ref = self.TOP_QUEUE_REF + 1
+        # Create the queue and attach it to the QoS in one transaction
+        result = self.ext_bridge.run_vsctl(['--',
+                            '--id=@q', 'create', 'queue',
                             "other-config:min-rate=%s" % policy['max_rate'],
                             "other-config:max-rate=%s" % policy['max_rate'],
                             "external_ids:port_id=%s" % port_id,
                             "external_ids:ip_address=%s" % ip_address,
-                            "external_ids:queue_ref=%s" % self.TOP_QUEUE_REF],
+                            "external_ids:queue_ref=%s" % queue_ref,
+                            '--', 'add', 'qos', self.QOS_UUID, 'queues',
+                            "%s=@q" % queue_ref,
+                            '--', 'set', 'qos', self.QOS_UUID,
+                            "external_ids:top_queue_ref=%s" % queue_ref],
                             check_error=True)
-        queue_id = result.strip()
-        self.ext_bridge.run_vsctl(['add', 'qos', self.QOS_UUID, 'queues',
-                        "%s=%s" % (self.TOP_QUEUE_REF, queue_id),
-                        '--', 'set', 'qos', self.QOS_UUID,
-                        "external_ids:top_queue_ref=%s" % self.TOP_QUEUE_REF],
-                        check_error=True)
-        return self.TOP_QUEUE_REF
-
-    def _delete_queue_for_port(self, policy, port_id, ip_address):
-        result = self.ext_bridge.run_vsctl(['--format=json', '--columns=_uuid',
-                                   'find', 'queue',
-                                   "other-config:min-rate=%s" % policy['max_rate'],
-                                   "other-config:max-rate=%s" % policy['max_rate'],
-                                   "external_ids:port_id=%s" % port_id,
-                                   "external_ids:ip_address=%s" % ip_address],
-                                   check_error=True)
-        res = jsonutils.loads(result)
-        if not res['data']:
+        self.TOP_QUEUE_REF = queue_ref
+        queue_id = result.split()[0]
+        self.queue_rates[queue_id] = str(policy['max_rate'])
+        return queue_id, queue_ref
+
+    def _update_queue_for_port(self, policy, queue_id):
+        max_rate = str(policy['max_rate'])
+        if self.queue_rates.get(queue_id) == max_rate:
             return
+        self.ext_bridge.run_vsctl(['set', 'queue', queue_id,
+                                   "other-config:min-rate=%s" % max_rate,
+                                   "other-config:max-rate=%s" % max_rate],
+                                  check_error=True)
+        self.queue_rates[queue_id] = max_rate
 
-        queue_id = res['data'][0][0][1]
-        result = self.ext_bridge.db_get_map("queue", queue_id,
-                                            'external_ids',
-                                            check_error=True)
-        queue = "%s=%s" % (result['queue_ref'], queue_id)
-        # Remove queue from Qos
-        self.ext_bridge.run_vsctl(['remove', 'qos', self.QOS_UUID,
-                                   'queues', queue])
-        # Delete queue
-        self.ext_bridge.run_vsctl(['destroy', 'queue', queue_id])
-
-    def create_qos_for_port(self, policy, port_id, ip_address):
-        qos_key = "%s-%s" % (port_id, ip_address)
-        ofport = self.ext_bridge.get_vif_port_by_id(port_id).ofport
-        queue_ref = self._create_queue_for_port(policy, port_id, ip_address)
+    def _delete_queue_for_port(self, queue_id, queue_ref):
+        # Remove the queue from the QoS and delete it in one transaction
+        self.ext_bridge.run_vsctl(['--', 'remove', 'qos', self.QOS_UUID,
+                                   'queues', "%s=%s" % (queue_ref, queue_id),
+                                   '--', 'destroy', 'queue', queue_id])
+        self.queue_rates.pop(queue_id, None)
+
+    # The port methods accept an optional br, a deferred bridge on which
+    # the caller batches the flow changes of several ports.
+
+    def _add_port_flow(self, br, policy, ofport, ip_address, queue_ref):
         action = "set_queue:%s,NORMAL" % queue_ref
-        self.ext_bridge.add_flow(in_port=ofport, nw_src=ip_address,
-                                 proto=policy['protocol'],
-                                 actions=action, priority=65535)
+        br.add_flow(in_port=ofport, nw_src=ip_address,
+                    proto=policy['protocol'],
+                    actions=action, priority=65535)
+
+    def _apply_port_qos(self, policy, qos_key, ofport, br):
+        """Make the queue and flow of qos_key match policy on ofport.
+
+        The ofport stored with the queue is the one its flow was added on,
+        the flow is moved if the VIF was plugged again since.
+        """
+        port_id, ip_address = qos_key
+        if ofport is None:
+            LOG.warn(_("Port %s not found on the external bridge, "
+                       "QoS not applied"), port_id)
+            return
+        if qos_key not in self.queues:
+            queue_id, queue_ref = self._create_queue_for_port(
+                policy, port_id, ip_address)
+        else:
+            queue_id, queue_ref, old_ofport = self.queues[qos_key]
+            if old_ofport not in (None, ofport):
+                br.delete_flows(in_port=old_ofport,
+                                proto=STALE_QUEUE_POLICY['protocol'],
+                                nw_src=ip_address)
+            # Keep the queue and its reference, only the rate may change
+            self._update_queue_for_port(policy, queue_id)
+        self.queues[qos_key] = (queue_id, queue_ref, ofport)
+        # Adding a flow with the same match replaces the previous one
+        self._add_port_flow(br, policy, ofport, ip_address, queue_ref)
 
-        self.qoses[qos_key] = True
+    def _delete_port_qos(self, policy, qos_key, ofport, br):
+        queue_id, queue_ref, flow_ofport = self.queues.pop(qos_key)
+        # The flow was added on flow_ofport, the VIF may be on a new one
+        for in_port in set([flow_ofport, ofport]) - set([None]):
+            br.delete_flows(in_port=in_port, proto=policy['protocol'],
+                            nw_src=qos_key[1])
+        self._delete_queue_for_port(queue_id, queue_ref)
 
-    def delete_qos_for_port(self, policy, port_id, ip_address):
-        qos_key = "%s-%s" % (port_id, ip_address)
-        if qos_key not in self.qoses:
+    def create_qos_for_port(self, policy, port_id, ip_address, br=None):
+        self._apply_port_qos(policy, (port_id, ip_address),
+                             self._get_ofport(port_id),
+                             br or self.ext_bridge)
+
+    def delete_qos_for_port(self, policy, port_id, ip_address, br=None):
+        qos_key = (port_id, ip_address)
+        if qos_key not in self.queues:
             return
-        ofport = self.ext_bridge.get_vif_port_by_id(port_id).ofport
-        self.ext_bridge.delete_flows(in_port=ofport,
-                                     proto=policy['protocol'],
-                                     nw_src=ip_address)
-        self._delete_queue_for_port(policy, port_id, ip_address)
-        del self.qoses[qos_key]
-
-    def port_qos_updated(self, policy, port_id, ip_address):
-        # Remove flow, create new one with the updated policy
-        self.delete_qos_for_port(policy, port_id, ip_address)
-        self.create_qos_for_port(policy, port_id, ip_address)
+        self._delete_port_qos(policy, qos_key, self._get_ofport(port_id),
+                              br or self.ext_bridge)
+
+    def port_qos_updated(self, policy, port_id, ip_address, br=None):
+        self._apply_port_qos(policy, (port_id, ip_address),
+                             self._get_ofport(port_id),
+                             br or self.ext_bridge)
+
+    def sync_port_qos(self, mappings):
+        """Apply the differences between the server mappings and the queues.
+
+        Queues with an unchanged rate and ofport are left alone, and the
+        flow changes of every port are applied with one ovs-ofctl run.
+        """
+        desired = dict(((mapping['port_id'], mapping['ip_address']),
+                        mapping['policy']) for mapping in mappings)
+        stale = set(self.queues) - set(desired)
+        vifs = self.ext_bridge.get_vifs_by_ids(
+            set(port_id for port_id, _ip_address in desired) |
+            set(port_id for port_id, _ip_address in stale))
+        created = updated = 0
+        with self.ext_bridge.deferred() as br:
+            for qos_key in stale:
+                vif = vifs.get(qos_key[0])
+                self._delete_port_qos(STALE_QUEUE_POLICY, qos_key,
+                                      vif.ofport if vif else None, br)
+            for qos_key, policy in desired.iteritems():
+                vif = vifs.get(qos_key[0])
+                if vif is None:
+                    # Not plugged on the external bridge of this host
+                    continue
+                entry = self.queues.get(qos_key)
+                if entry is None:
+                    created += 1
+                elif (entry[2] == vif.ofport and
+                      self.queue_rates.get(entry[0]) ==
+                      str(policy['max_rate'])):
+                    continue
+                else:
+                    updated += 1
+                self._apply_port_qos(policy, qos_key, vif.ofport, br)
+        LOG.info(_("QoS synchronized: %(created)d queues created, "
+                   "%(updated)d updated and %(deleted)d deleted"),
+                 {'created': created, 'updated': updated,
+                  'deleted': len(stale)})
 
     def create_qos_for_network(self, policy, network_id):
         pass
@@ -160,4 +253,5 @@ class ChinacQoSDriver(qos_base.QoSDriver):
         pass
 
     def network_qos_updated(self, policy, network_id):
-        pass
\ No newline at end of file
+        pass
+
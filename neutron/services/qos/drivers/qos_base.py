@@ -35,6 +35,14 @@ class QoSDriver(object):
     def port_qos_updated(self, policy, port_id, ip_address):
         pass
 
+    def sync_port_qos(self, mappings):
+        """Reconcile the port QoS with the full list of server mappings.
+
+        mappings is a list of dicts with port_id, ip_address, qos_id and
+        policy keys. Drivers without any local state have nothing to do.
+        """
+        pass
+
 
 class NoOpQoSDriver(QoSDriver):
 
@@ -0,0 +1,136 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.clb.agent.drivers.haproxy import vif
+from neutron.openstack.common import jsonutils
+from neutron.tests import base
+
+PORT_ID = 'port-id'
+PORT_NAME = 'tapport-id'
+
+# 1024 KiB/s in the units ovs-vsctl is given
+INGRESS_RATE = 8388
+INGRESS_BURST = 838
+MAX_RATE = 8388608
+
+
+def _table(headings, rows):
+    return jsonutils.dumps({'headings': headings, 'data': rows})
+
+
+def _qos_row(qos_uuid, max_rate, queues):
+    return [['uuid', qos_uuid], ['map', [['max-rate', str(max_rate)]]],
+            ['map', [[i, ['uuid', queue]] for i, queue in enumerate(queues)]]]
+
+
+def _listing(qos_rows, ingress=INGRESS_RATE, burst=INGRESS_BURST):
+    return '%s\n%s\n' % (
+        _table(['name', 'ingress_policing_rate', 'ingress_policing_burst'],
+               [[PORT_NAME, ingress, burst]]),
+        _table(['_uuid', 'other_config', 'queues'], qos_rows))
+
+
+class VifRateLimitTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(VifRateLimitTestCase, self).setUp()
+        self.execute = mock.patch.object(vif.utils, 'execute').start()
+        mock.patch.object(vif.VIF, '__init__', return_value=None).start()
+        mock.patch.object(vif, 'CONF').start().network_device_mtu = 1500
+        self.addCleanup(mock.patch.stopall)
+        self.vif = vif.VIF()
+        self.vif.root_helper = 'sudo'
+
+    def _setup_rate_limit(self, inbound_limit=1024, outbound_limit=1024):
+        self.vif.setup_rate_limit('ns', {
+            'port': {'id': PORT_ID}, 'inbound_limit': inbound_limit,
+            'outbound_limit': outbound_limit})
+
+    def _write_args(self):
+        args = self.execute.call_args[0][0]
+        self.assertEqual(['ovs-vsctl', '--timeout=2'], args[:2])
+        self.assertNotIn('--format=json', args)
+        return args[2:]
+
+    def test_unchanged_limits_are_not_written(self):
+        self.execute.return_value = _listing(
+            [_qos_row('qos-1', MAX_RATE, ['queue-1'])])
+        self._setup_rate_limit()
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_changed_outbound_rate_replaces_qos(self):
+        self.execute.side_effect = [
+            _listing([_qos_row('qos-1', MAX_RATE // 2, ['queue-1'])]), '']
+        self._setup_rate_limit()
+        self.assertEqual(2, self.execute.call_count)
+        self.assertEqual(
+            ['--', 'set', 'Port', PORT_NAME, 'qos=@newqos',
+             '--', '--id=@newqos', 'create', 'QoS', 'type=linux-htb',
+             'other-config:max-rate=%d' % MAX_RATE,
+             'external_ids:iface-id="%s"' % PORT_ID, 'queues=0=@q0',
+             '--', '--id=@q0', 'create', 'Queue',
+             'other-config:max-rate=%d' % MAX_RATE,
+             '--', 'destroy', 'QoS', 'qos-1',
+             '--', 'destroy', 'Queue', 'queue-1'],
+            self._write_args())
+
+    def test_zero_outbound_limit_clears_tagged_qos(self):
+        self.execute.side_effect = [
+            _listing([_qos_row('qos-1', MAX_RATE, ['queue-1', 'queue-2'])]),
+            '']
+        self._setup_rate_limit(outbound_limit=0)
+        self.assertEqual(2, self.execute.call_count)
+        self.assertEqual(
+            ['--', 'clear', 'Port', PORT_NAME, 'qos',
+             '--', 'destroy', 'QoS', 'qos-1',
+             '--', 'destroy', 'Queue', 'queue-1',
+             '--', 'destroy', 'Queue', 'queue-2'],
+            self._write_args())
+
+    def test_untagged_qos_is_destroyed(self):
+        self.execute.side_effect = [
+            _listing([]),
+            _table(['qos'], [[['uuid', 'legacy-qos']]]),
+            _table(['_uuid', 'other_config', 'queues'],
+                   [_qos_row('legacy-qos', MAX_RATE, ['legacy-queue'])]),
+            '']
+        self._setup_rate_limit(outbound_limit=0)
+        self.assertEqual(4, self.execute.call_count)
+        self.assertIn('name="%s"' % PORT_NAME,
+                      self.execute.call_args_list[1][0][0])
+        self.assertIn('legacy-qos', self.execute.call_args_list[2][0][0])
+        self.assertEqual(
+            ['--', 'clear', 'Port', PORT_NAME, 'qos',
+             '--', 'destroy', 'QoS', 'legacy-qos',
+             '--', 'destroy', 'Queue', 'legacy-queue'],
+            self._write_args())
+
+    def test_no_qos_and_no_outbound_limit_is_not_written(self):
+        self.execute.side_effect = [
+            _listing([]), _table(['qos'], [[['set', []]]])]
+        self._setup_rate_limit(outbound_limit=0)
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_changed_inbound_limit_only_sets_interface(self):
+        self.execute.side_effect = [
+            _listing([_qos_row('qos-1', MAX_RATE, ['queue-1'])],
+                     ingress=0, burst=0), '']
+        self._setup_rate_limit()
+        self.assertEqual(
+            ['--', 'set', 'Interface', PORT_NAME,
+             'ingress_policing_rate=%d' % INGRESS_RATE,
+             'ingress_policing_burst=%d' % INGRESS_BURST],
+            self._write_args())
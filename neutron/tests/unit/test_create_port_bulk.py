@@ -0,0 +1,79 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import webob.exc
+
+from neutron.tests.unit import test_db_plugin
+
+
+class CreatePortBulkTestCase(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def _create_ports(self, subnet, fixed_ips_list):
+        ports = []
+        for fixed_ips in fixed_ips_list:
+            port = {'network_id': subnet['subnet']['network_id'],
+                    'tenant_id': self._tenant_id}
+            if fixed_ips is not None:
+                port['fixed_ips'] = fixed_ips
+            ports.append(port)
+        return self._create_bulk_from_list(self.fmt, 'port', ports)
+
+    def _ips(self, ports):
+        return [ip['ip_address'] for port in ports
+                for ip in port['fixed_ips']]
+
+    def test_auto_allocated_ips_are_contiguous(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            res = self._create_ports(subnet, [None] * 3)
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4'],
+                             self._ips(ports))
+            # The ranges were updated for the ports created after them
+            res = self._create_ports(subnet, [None])
+            port = self.deserialize(self.fmt, res)['ports'][0]
+            self.assertEqual(['10.0.0.5'], self._ips([port]))
+
+    def test_requested_ip_is_not_auto_allocated(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.3'}]
+            res = self._create_ports(subnet, [fixed_ips, None, None])
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            ports = self.deserialize(self.fmt, res)['ports']
+            ips = self._ips(ports)
+            self.assertEqual('10.0.0.3', ips[0])
+            self.assertEqual(3, len(set(ips)))
+
+    def test_requested_ip_twice_is_conflict(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.3'}]
+            res = self._create_ports(subnet, [fixed_ips, None, fixed_ips])
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+            self.assertEqual([], self._list('ports')['ports'])
+
+    def test_exhausted_ranges_are_rebuilt(self):
+        allocation_pools = [{'start': '10.0.0.2', 'end': '10.0.0.4'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=allocation_pools) as subnet:
+            res = self._create_ports(subnet, [None] * 3)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self._delete('ports', ports[1]['id'])
+            res = self._create_ports(subnet, [None])
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            port = self.deserialize(self.fmt, res)['ports'][0]
+            self.assertEqual(['10.0.0.3'], self._ips([port]))
+            res = self._create_ports(subnet, [None])
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
@@ -0,0 +1,141 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import netaddr
+from oslo.config import cfg
+
+from neutron import context
+from neutron.db import db_base_plugin_v2
+from neutron.tests import base
+from neutron.tests.unit import test_db_plugin
+
+PLUGIN = db_base_plugin_v2.NeutronDbPluginV2
+
+
+class FreeRangesTestCase(base.BaseTestCase):
+
+    def _free_ranges(self, first, last, allocations):
+        return list(db_base_plugin_v2._free_ranges(first, last, allocations))
+
+    def test_no_allocations(self):
+        self.assertEqual([(2, 10)], self._free_ranges(2, 10, []))
+
+    def test_allocations_split_range(self):
+        self.assertEqual([(3, 4), (6, 9)],
+                         self._free_ranges(2, 10, [1, 2, 5, 10, 12]))
+
+    def test_adjacent_allocations(self):
+        self.assertEqual([(2, 3), (7, 10)],
+                         self._free_ranges(2, 10, [4, 5, 6]))
+
+    def test_all_allocated(self):
+        self.assertEqual([], self._free_ranges(2, 4, [2, 3, 4]))
+
+    def test_range_chunks(self):
+        cfg.CONF.set_override('ip_allocation_range_size', 4)
+        self.assertEqual([(2, 10)],
+                         list(db_base_plugin_v2._range_chunks(2, 10)))
+        cfg.CONF.set_override('ip_allocation_mode', 'optimistic')
+        self.assertEqual([(2, 5), (6, 9), (10, 10)],
+                         list(db_base_plugin_v2._range_chunks(2, 10)))
+
+    def test_range_chunks_ipv6(self):
+        cfg.CONF.set_override('ip_allocation_mode', 'optimistic')
+        cfg.CONF.set_override('ip_allocation_range_size', 4)
+        first = int(netaddr.IPAddress('2001:db8::2'))
+        last = int(netaddr.IPAddress('2001:db8::ffff:ffff:fffe'))
+        chunks = list(db_base_plugin_v2._range_chunks(first, last))
+        self.assertEqual(db_base_plugin_v2.MAX_RANGE_CHUNKS, len(chunks))
+        self.assertEqual((first, first + 3), chunks[0])
+        tail_first = first + 4 * (db_base_plugin_v2.MAX_RANGE_CHUNKS - 1)
+        self.assertEqual((tail_first, last), chunks[-1])
+
+
+class OptimisticIpAllocationTestCase(
+        test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        cfg.CONF.set_override('ip_allocation_mode', 'optimistic')
+        cfg.CONF.set_override('ip_allocation_range_size', 4)
+        super(OptimisticIpAllocationTestCase, self).setUp()
+        self.context = context.get_admin_context()
+
+    def _ranges(self, subnet):
+        return sorted(
+            (first_ip, last_ip) for pool_id, first_ip, last_ip in
+            PLUGIN._get_availability_ranges(self.context,
+                                            subnet['subnet']['id']))
+
+    def _ports_ips(self, subnet, count):
+        ips = []
+        for i in range(count):
+            res = self._create_port(self.fmt, subnet['subnet']['network_id'])
+            port = self.deserialize(self.fmt, res)['port']
+            ips.extend(ip['ip_address'] for ip in port['fixed_ips'])
+        return ips
+
+    def test_ranges_stored_in_chunks(self):
+        allocation_pools = [{'start': '10.0.0.2', 'end': '10.0.0.11'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=allocation_pools) as subnet:
+            self.assertEqual([('10.0.0.10', '10.0.0.11'),
+                              ('10.0.0.2', '10.0.0.5'),
+                              ('10.0.0.6', '10.0.0.9')],
+                             self._ranges(subnet))
+
+    def test_ipv6_ranges_are_capped(self):
+        with self.subnet(cidr='2001:db8::/64', ip_version=6) as subnet:
+            ranges = self._ranges(subnet)
+            self.assertEqual(db_base_plugin_v2.MAX_RANGE_CHUNKS, len(ranges))
+            self.assertIn('2001:db8::ffff:ffff:ffff:fffe',
+                          [last_ip for first_ip, last_ip in ranges])
+            self.assertEqual(1, len(self._ports_ips(subnet, 1)))
+
+    def test_swap_fails_on_changed_range(self):
+        allocation_pools = [{'start': '10.0.0.2', 'end': '10.0.0.5'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=allocation_pools) as subnet:
+            pool_id, first_ip, last_ip = PLUGIN._get_availability_ranges(
+                self.context, subnet['subnet']['id'])[0]
+            self.assertEqual(('10.0.0.2', '10.0.0.5'), (first_ip, last_ip))
+            self.assertTrue(PLUGIN._swap_availability_range(
+                self.context, pool_id, first_ip, last_ip,
+                new_first_ip='10.0.0.3'))
+            # The range read before doesn't exist anymore
+            self.assertFalse(PLUGIN._swap_availability_range(
+                self.context, pool_id, first_ip, last_ip,
+                new_first_ip='10.0.0.3'))
+            self.assertTrue(PLUGIN._swap_availability_range(
+                self.context, pool_id, '10.0.0.3', last_ip))
+            self.assertNotIn(('10.0.0.3', last_ip), self._ranges(subnet))
+
+    def test_allocated_ips_are_unique(self):
+        allocation_pools = [{'start': '10.0.0.2', 'end': '10.0.0.11'}]
+        with self.subnet(cidr='10.0.0.0/24',
+                         allocation_pools=allocation_pools) as subnet:
+            ips = self._ports_ips(subnet, 10)
+            self.assertEqual(['10.0.0.%d' % i for i in range(2, 12)],
+                             sorted(ips, key=lambda ip: int(ip.split('.')[3])))
+            self.assertEqual([], self._ranges(subnet))
+
+    def test_conflicts_fall_back_to_locking(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            with mock.patch.object(PLUGIN, '_swap_availability_range',
+                                   return_value=False) as swap:
+                ips = self._ports_ips(subnet, 1)
+            self.assertEqual(cfg.CONF.ip_allocation_retries, swap.call_count)
+            self.assertEqual(1, len(ips))
+            self.assertNotIn(ips[0], [first_ip for first_ip, last_ip in
+                                      self._ranges(subnet)])
@@ -0,0 +1,162 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ip_lib
+from neutron.common import exceptions
+from neutron.tests import base
+
+NETNS_SAMPLE = ('1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue '
+                'state UNKNOWN \\    link/loopback 00:00:00:00:00:00 brd '
+                '00:00:00:00:00:00\n'
+                '7: tap0@if8: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 '
+                'qdisc pfifo_fast state UP \\    link/ether '
+                'fa:16:3e:00:00:01 brd ff:ff:ff:ff:ff:ff\n'
+                '1: lo    inet 127.0.0.1/8 scope host lo\\       '
+                'valid_lft forever preferred_lft forever\n'
+                '7: tap0    inet 10.0.0.2/24 brd 10.0.0.255 scope global '
+                'tap0\\       valid_lft forever preferred_lft forever\n'
+                'default via 10.0.0.1 dev tap0 \n'
+                '10.0.0.0/24 dev tap0  proto kernel  scope link  '
+                'src 10.0.0.2 \n')
+
+
+class IpBatchTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpBatchTestCase, self).setUp()
+        self.execute = mock.patch.object(ip_lib.utils, 'execute').start()
+        self.addCleanup(mock.patch.stopall)
+        self.ip = ip_lib.IPWrapper('sudo', namespace='ns')
+
+    def _batch_input(self, call_index=-1):
+        args, kwargs = self.execute.call_args_list[call_index]
+        self.assertEqual(['ip', 'netns', 'exec', 'ns', 'ip', '-force',
+                          '-batch', '-'], args[0])
+        return kwargs['process_input'].splitlines()
+
+    def test_operations_run_in_one_process(self):
+        self.execute.return_value = ('', '')
+        with self.ip.batch() as batch:
+            device = batch.device('tap0')
+            device.link.set_up()
+            device.addr.add(4, '10.0.0.2/24', '10.0.0.255')
+            device.route.add_gateway('10.0.0.1')
+            device.neigh.add(4, '10.0.0.3', 'fa:16:3e:00:00:02')
+            self.assertFalse(self.execute.called)
+        self.assertEqual(1, self.execute.call_count)
+        self.assertEqual(
+            ['link set tap0 up',
+             'addr add 10.0.0.2/24 brd 10.0.0.255 scope global dev tap0',
+             'route replace default via 10.0.0.1 dev tap0',
+             'neigh replace 10.0.0.3 lladdr fa:16:3e:00:00:02 nud '
+             'permanent dev tap0'],
+            self._batch_input())
+
+    def test_nothing_runs_when_block_raises(self):
+        def fail():
+            with self.ip.batch() as batch:
+                batch.device('tap0').link.set_up()
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertFalse(self.execute.called)
+
+    def test_failures_map_to_operations(self):
+        self.execute.return_value = (
+            '', 'RTNETLINK answers: File exists\nCommand failed -:2\n')
+        try:
+            with self.ip.batch() as batch:
+                batch.device('tap0').link.set_up()
+                batch.add('route', 'add', '10.1.0.0/16', 'via', '10.0.0.1')
+                batch.device('tap0').link.set_mtu(1400)
+        except exceptions.IpBatchCommandFailed:
+            pass
+        else:
+            self.fail('IpBatchCommandFailed not raised')
+        self.assertEqual([('route add 10.1.0.0/16 via 10.0.0.1',
+                           'RTNETLINK answers: File exists')],
+                         batch.failures)
+
+    def test_batch_process_failure(self):
+        self.execute.side_effect = RuntimeError(
+            'Cannot open network namespace "ns": No such file or directory')
+        try:
+            with self.ip.batch() as batch:
+                batch.device('tap0').link.set_up()
+                batch.device('tap0').link.set_mtu(1400)
+        except exceptions.IpBatchCommandFailed as e:
+            self.assertIn('Cannot open network namespace', str(e))
+        else:
+            self.fail('IpBatchCommandFailed not raised')
+        self.assertEqual([1], self.execute.call_args[1]['extra_ok_codes'])
+        self.assertEqual(['link set tap0 up', 'link set tap0 mtu 1400'],
+                         [line for line, error in batch.failures])
+
+    def test_unreported_failure_fails_all_lines(self):
+        self.execute.return_value = ('', 'sudo: no tty present\n')
+        with self.ip.batch(check_exit_code=False) as batch:
+            batch.device('tap0').link.set_up()
+        self.assertEqual([('link set tap0 up', 'sudo: no tty present')],
+                         batch.failures)
+
+    def test_snapshot_read_failure_raises(self):
+        self.execute.side_effect = RuntimeError()
+        with self.ip.batch() as batch:
+            self.assertRaises(RuntimeError, batch.get_devices)
+
+    def test_snapshot_serves_reads_and_tracks_changes(self):
+        self.execute.side_effect = [(NETNS_SAMPLE, ''), ('', '')]
+        with self.ip.batch() as batch:
+            device = batch.device('tap0')
+            device.addr.add(4, '10.0.0.9/24', '10.0.0.255')
+            self.assertEqual(['lo', 'tap0'], batch.get_devices())
+            self.assertEqual(['tap0'],
+                             batch.get_devices(exclude_loopback=True))
+            self.assertEqual(
+                ['10.0.0.2/24', '10.0.0.9/24'],
+                [a['cidr'] for a in device.addr.list(scope='global')])
+            device.addr.delete(4, '10.0.0.2/24')
+            self.assertEqual(['10.0.0.9/24'],
+                             [a['cidr'] for a in device.addr.list()])
+            self.assertEqual(
+                [{'destination': 'default', 'via': '10.0.0.1',
+                  'dev': 'tap0'},
+                 {'destination': '10.0.0.0/24', 'via': None, 'dev': 'tap0'}],
+                batch.get_routes())
+        # One read for the snapshot, one run for the changes
+        self.assertEqual(2, self.execute.call_count)
+        self.assertEqual(['addr add 10.0.0.9/24 brd 10.0.0.255 scope '
+                          'global dev tap0', 'addr del 10.0.0.2/24 dev tap0'],
+                         self._batch_input())
+
+    def test_reads_run_at_once(self):
+        self.execute.side_effect = [
+            'default via 10.0.0.1 dev tap0 \n',
+            '    inet 10.0.0.2/24 brd 10.0.0.255 scope global tap0\n',
+            ('', '')]
+        with self.ip.batch() as batch:
+            device = batch.device('tap0')
+            device.route.delete_gateway('10.0.0.1')
+            self.assertEqual({'gateway': '10.0.0.1'},
+                             device.route.get_gateway())
+            self.assertEqual(
+                ['10.0.0.2/24'],
+                [a['cidr'] for a in device.addr.list(to='10.0.0.2')])
+            self.assertEqual(2, self.execute.call_count)
+            self.assertEqual(['ip', 'netns', 'exec', 'ns', 'ip', 'route',
+                              'list', 'dev', 'tap0'],
+                             self.execute.call_args_list[0][0][0][:9])
+        self.assertEqual(['route del default via 10.0.0.1 dev tap0'],
+                         self._batch_input())
@@ -0,0 +1,187 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import iptables_manager
+from neutron.tests import base
+
+BINARY_NAME = 'test-agent'
+
+FILTER_DUMP = ('# Generated by iptables_manager\n'
+               '*filter\n'
+               ':INPUT ACCEPT [0:0]\n'
+               ':FORWARD ACCEPT [0:0]\n'
+               ':OUTPUT ACCEPT [0:0]\n'
+               ':foreign-chain - [0:0]\n'
+               '[5:100] -A INPUT -j foreign-chain\n'
+               'COMMIT\n'
+               '# Completed by iptables_manager\n')
+
+
+class IptablesManagerModifyRulesTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerModifyRulesTestCase, self).setUp()
+        self.execute = mock.Mock()
+        self.iptables = iptables_manager.IptablesManager(
+            _execute=self.execute, state_less=True,
+            binary_name=BINARY_NAME)
+        self.table = self.iptables.ipv4['filter']
+
+    def _modify(self, dump=FILTER_DUMP):
+        return self.iptables._modify_rules(dump.split('\n')[:-1],
+                                           self.table, 'filter')
+
+    def test_foreign_rules_are_kept(self):
+        new_lines = self._modify()
+        self.assertIn(':foreign-chain - [0:0]', new_lines)
+        self.assertIn('[5:100] -A INPUT -j foreign-chain', new_lines)
+
+    def test_new_rule_gets_zero_counters(self):
+        self.table.add_rule('INPUT', '-s 1.2.3.4 -j DROP')
+        new_lines = self._modify()
+        self.assertIn('[0:0] -A %s-INPUT -s 1.2.3.4 -j DROP' % BINARY_NAME,
+                      new_lines)
+
+    def test_existing_counters_are_preserved(self):
+        self.table.add_rule('INPUT', '-s 1.2.3.4 -j DROP')
+        dump = FILTER_DUMP.replace(
+            'COMMIT',
+            ':%(bn)s-INPUT - [0:0]\n'
+            '[7:700] -A %(bn)s-INPUT -s 1.2.3.4 -j DROP\n'
+            'COMMIT' % {'bn': BINARY_NAME})
+        new_lines = self._modify(dump)
+        rule = '-A %s-INPUT -s 1.2.3.4 -j DROP' % BINARY_NAME
+        self.assertIn('[7:700] ' + rule, new_lines)
+        self.assertEqual(1, len([l for l in new_lines if rule in l]))
+
+    def test_stale_wrapped_rules_are_dropped(self):
+        dump = FILTER_DUMP.replace(
+            'COMMIT',
+            '[7:700] -A %s-INPUT -s 5.6.7.8 -j DROP\n'
+            'COMMIT' % BINARY_NAME)
+        new_lines = self._modify(dump)
+        self.assertFalse([l for l in new_lines if '5.6.7.8' in l])
+
+    def test_removed_unwrapped_rule(self):
+        self.table.add_rule('INPUT', '-j foreign-chain', wrap=False)
+        self.table.remove_rule('INPUT', '-j foreign-chain', wrap=False)
+        new_lines = self._modify()
+        self.assertFalse([l for l in new_lines
+                          if '-A INPUT -j foreign-chain' in l])
+        self.assertEqual([], self.table.remove_rules)
+
+    def test_chains_declared_before_rules(self):
+        self.table.add_chain('extra')
+        self.table.add_rule('INPUT', '-j $extra')
+        new_lines = self._modify()
+        chain_idx = new_lines.index(':%s-extra - [0:0]' % BINARY_NAME)
+        rule_idx = [i for i, l in enumerate(new_lines)
+                    if l.startswith('[')][0]
+        self.assertTrue(chain_idx < rule_idx)
+
+    def test_saved_lines_are_scanned_once(self):
+        nrules = 100
+        self.table.add_chain('bench')
+        for i in range(nrules):
+            self.table.add_rule('bench', '-d 10.0.0.%d -j ACCEPT' % i)
+        first_pass = self._modify()
+
+        # Looking up every rule in the saved table would strip each saved
+        # line once per rule, so count the strips.
+        stripped = []
+
+        class SavedLine(str):
+            def strip(self, *args):
+                stripped.append(self)
+                return str.strip(self, *args)
+
+        second_pass = self.iptables._modify_rules(
+            [SavedLine(line) for line in first_pass], self.table, 'filter')
+        self.assertEqual(len(first_pass), len(stripped))
+
+        bench_rules = [l for l in second_pass
+                       if '-A %s-bench ' % BINARY_NAME in l]
+        self.assertEqual(nrules, len(bench_rules))
+        self.assertEqual(first_pass, second_pass)
+
+
+class IptablesManagerIncrementalApplyTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalApplyTestCase, self).setUp()
+        self.execute = mock.Mock(return_value=FILTER_DUMP)
+        self.iptables = iptables_manager.IptablesManager(
+            _execute=self.execute, state_less=True,
+            binary_name=BINARY_NAME)
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _restore_call(self):
+        restores = [c for c in self.execute.call_args_list
+                    if c[0][0][0] == 'iptables-restore']
+        self.assertEqual(1, len(restores))
+        return restores[0]
+
+    def test_apply_without_changes_is_noop(self):
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_wrapped_change_restores_dirty_chain_only(self):
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-s 1.2.3.4 -j DROP')
+        self.iptables.apply()
+        self.execute.assert_any_call(['iptables-save', '-c', '-t', 'filter'],
+                                     root_helper=None)
+        restore = self._restore_call()
+        self.assertEqual(['iptables-restore', '-c', '--noflush'],
+                         restore[0][0])
+        restored = restore[1]['process_input'].split('\n')
+        self.assertIn(':%s-INPUT - [0:0]' % BINARY_NAME, restored)
+        self.assertNotIn(':%s-OUTPUT - [0:0]' % BINARY_NAME, restored)
+        self.assertNotIn(':foreign-chain - [0:0]', restored)
+
+    def test_unwrapped_change_restores_whole_table(self):
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j foreign-chain',
+                                              wrap=False)
+        self.iptables.apply()
+        restore = self._restore_call()
+        self.assertEqual(['iptables-restore', '-c'], restore[0][0])
+        self.assertIn(':foreign-chain - [0:0]',
+                      restore[1]['process_input'].split('\n'))
+
+    def test_chain_removal_restores_whole_table(self):
+        self.iptables.ipv4['filter'].add_chain('extra')
+        self.iptables.apply()
+        self.execute.reset_mock()
+        self.iptables.ipv4['filter'].remove_chain('extra')
+        self.iptables.apply()
+        self.assertEqual(['iptables-restore', '-c'],
+                         self._restore_call()[0][0])
+
+    def test_failed_restore_keeps_table_dirty(self):
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-s 1.2.3.4 -j DROP')
+        self.execute.side_effect = [FILTER_DUMP, RuntimeError()]
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.assertTrue(self.iptables.ipv4['filter'].is_dirty())
+
+    def test_retry_after_failed_restore_restores_whole_table(self):
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-s 1.2.3.4 -j DROP')
+        self.execute.side_effect = [FILTER_DUMP, RuntimeError()]
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.execute.reset_mock()
+        self.execute.side_effect = None
+        self.iptables.apply()
+        self.assertEqual(['iptables-restore', '-c'],
+                         self._restore_call()[0][0])
@@ -0,0 +1,70 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+
+from neutron.agent.linux import ip_lib
+from neutron.agent.linux import netns_cleaner
+from neutron.tests import base
+
+
+class NamespaceCleanerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(NamespaceCleanerTestCase, self).setUp()
+        self.get_devices = mock.patch.object(
+            ip_lib.IPWrapper, 'get_devices',
+            side_effect=lambda exclude_loopback: ['tap-x']).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_bounded_concurrency_and_single_listing(self):
+        running = []
+        max_running = []
+
+        def destroy(namespace, devices):
+            self.assertEqual(['tap-x'], devices)
+            running.append(namespace)
+            max_running.append(len(running))
+            eventlet.sleep(0.01)
+            running.remove(namespace)
+
+        cleaner = netns_cleaner.NamespaceCleaner('sudo', destroy, workers=3)
+        namespaces = ['qrouter-%d' % i for i in range(10)]
+        states = cleaner.clean(namespaces)
+
+        self.assertEqual(dict((ns, netns_cleaner.DONE) for ns in namespaces),
+                         states)
+        self.assertEqual(3, max(max_running))
+        self.assertEqual(10, self.get_devices.call_count)
+
+    def test_devices_not_listed(self):
+        destroy = mock.Mock()
+        cleaner = netns_cleaner.NamespaceCleaner('sudo', destroy,
+                                                 list_devices=False)
+        cleaner.clean(['qrouter-1'])
+        destroy.assert_called_once_with('qrouter-1', None)
+        self.assertFalse(self.get_devices.called)
+
+    def test_failures_do_not_stop_others(self):
+        def destroy(namespace, devices):
+            if namespace == 'qrouter-bad':
+                raise RuntimeError()
+
+        cleaner = netns_cleaner.NamespaceCleaner('sudo', destroy)
+        states = cleaner.clean(['qrouter-bad', 'qrouter-good'])
+        self.assertEqual({'qrouter-bad': netns_cleaner.FAILED,
+                          'qrouter-good': netns_cleaner.DONE}, states)
+        self.assertEqual({'pending': 0, 'running': 0, 'done': 1,
+                          'failed': 1}, cleaner.get_progress())
@@ -0,0 +1,87 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import ovsdb_client
+from neutron.tests import base
+
+QUEUE_UUID = 'b0000000-0000-0000-0000-000000000001'
+PORT_UUID = 'b0000000-0000-0000-0000-000000000002'
+
+
+class VsctlStrTestCase(base.BaseTestCase):
+
+    def _assert_vsctl_str(self, expected, table, column, value):
+        self.assertEqual(expected, ovs_lib._vsctl_str(
+            value, ovsdb_client.COLUMN_TYPES[table][column]))
+
+    def test_strings(self):
+        self._assert_vsctl_str('br-int', 'Bridge', 'name', 'br-int')
+        self._assert_vsctl_str('"tap1"', 'Interface', 'name', 'tap1')
+        self._assert_vsctl_str('""', 'Interface', 'type', '')
+        self._assert_vsctl_str('"true"', 'Interface', 'type', 'true')
+        self._assert_vsctl_str('"a\\"b"', 'Interface', 'type', 'a"b')
+        self._assert_vsctl_str('"abcdefab-abcd-abcd-abcd-abcdefabcdef"',
+                               'Interface', 'type',
+                               'abcdefab-abcd-abcd-abcd-abcdefabcdef')
+
+    def test_optional_values(self):
+        self._assert_vsctl_str('[]', 'Port', 'tag', [])
+        self._assert_vsctl_str('5', 'Port', 'tag', 5)
+        self._assert_vsctl_str('[]', 'Bridge', 'fail_mode', [])
+        self._assert_vsctl_str('secure', 'Bridge', 'fail_mode', 'secure')
+
+    def test_sets(self):
+        self._assert_vsctl_str('[%s]' % PORT_UUID, 'Bridge', 'ports',
+                               PORT_UUID)
+        self._assert_vsctl_str('[%s, %s]' % (QUEUE_UUID, PORT_UUID),
+                               'Bridge', 'ports', [PORT_UUID, QUEUE_UUID])
+        self._assert_vsctl_str('["OpenFlow10", "OpenFlow13"]', 'Bridge',
+                               'protocols', ['OpenFlow13', 'OpenFlow10'])
+
+    def test_maps(self):
+        self._assert_vsctl_str('{}', 'Interface', 'external_ids', {})
+        self._assert_vsctl_str(
+            '{attached-mac="fa:16:3e:00:00:01", iface-id="%s", '
+            'iface-status=active}' % PORT_UUID, 'Interface', 'external_ids',
+            {'iface-status': 'active', 'iface-id': PORT_UUID,
+             'attached-mac': 'fa:16:3e:00:00:01'})
+        self._assert_vsctl_str('{0=%s}' % QUEUE_UUID, 'QoS', 'queues',
+                               {0: QUEUE_UUID})
+
+
+class OvsdbConnectionTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(OvsdbConnectionTestCase, self).setUp()
+        cfg.CONF.set_override('ovsdb_interface', 'native')
+        self.addCleanup(cfg.CONF.reset)
+        self.get_connection = mock.patch.object(
+            ovsdb_client, 'get_connection').start()
+        mock.patch.object(ovs_lib, '_ovsdb_failed', False).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_unreachable_connection_is_not_retried(self):
+        self.get_connection.side_effect = ovsdb_client.OvsdbError(
+            method='connect', error='refused')
+        self.assertIsNone(ovs_lib.get_ovsdb_connection())
+        self.assertIsNone(ovs_lib.get_ovsdb_connection())
+        self.assertEqual(1, self.get_connection.call_count)
+
+    def test_connection(self):
+        self.assertEqual(self.get_connection.return_value,
+                         ovs_lib.get_ovsdb_connection())
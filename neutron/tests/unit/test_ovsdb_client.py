@@ -0,0 +1,170 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+
+import eventlet
+from eventlet.green import socket as green_socket
+import mock
+
+from neutron.agent.linux import ovsdb_client
+from neutron.tests import base
+
+BRIDGE_UUID = 'b0000000-0000-0000-0000-000000000001'
+PORT_UUID = 'b0000000-0000-0000-0000-000000000002'
+IFACE_UUID = 'b0000000-0000-0000-0000-000000000003'
+
+INITIAL_TABLES = {
+    'Bridge': {BRIDGE_UUID: {'new': {
+        'name': 'br-int', 'ports': ['uuid', PORT_UUID],
+        'datapath_id': '0000aabbccddeeff',
+        'external_ids': ['map', []]}}},
+    'Port': {PORT_UUID: {'new': {
+        'name': 'tap1', 'interfaces': ['uuid', IFACE_UUID],
+        'tag': ['set', []]}}},
+    'Interface': {IFACE_UUID: {'new': {
+        'name': 'tap1', 'ofport': 5,
+        'external_ids': ['map', [['iface-id', 'port-1'],
+                                 ['attached-mac', 'fa:16:3e:00:00:01']]]}}},
+}
+
+
+class StubOvsdbServer(object):
+    """Minimal ovsdb-server answering monitor, echo and transact."""
+
+    def __init__(self, path):
+        self.requests = []
+        self.listener = eventlet.listen(path, family=socket.AF_UNIX)
+        self.thread = eventlet.spawn(self._serve)
+        self.client = None
+
+    def _serve(self):
+        self.client, _addr = self.listener.accept()
+        decoder = json.JSONDecoder()
+        buf = ''
+        while True:
+            data = self.client.recv(4096)
+            if not data:
+                return
+            buf += data
+            while buf:
+                try:
+                    msg, end = decoder.raw_decode(buf)
+                except ValueError:
+                    break
+                buf = buf[end:]
+                self.requests.append(msg)
+                self._reply(msg)
+
+    def _send(self, msg):
+        self.client.sendall(json.dumps(msg))
+
+    def _reply(self, msg):
+        if msg['method'] == 'monitor':
+            self._send({'id': msg['id'], 'result': INITIAL_TABLES,
+                        'error': None})
+        elif msg['method'] == 'echo':
+            self._send({'id': msg['id'], 'result': msg['params'],
+                        'error': None})
+        elif msg['method'] == 'transact':
+            # Report the change before the reply, as ovsdb-server does
+            self.send_update({'Port': {PORT_UUID: {
+                'old': {'tag': ['set', []]},
+                'new': {'name': 'tap1', 'interfaces': ['uuid', IFACE_UUID],
+                        'tag': 10}}}})
+            self._send({'id': msg['id'],
+                        'result': [{'count': 1}] * (len(msg['params']) - 1),
+                        'error': None})
+
+    def send_update(self, table_updates):
+        self._send({'id': None, 'method': 'update',
+                    'params': [None, table_updates]})
+
+    def stop(self):
+        self.thread.kill()
+        self.listener.close()
+
+
+class OvsdbClientTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(OvsdbClientTestCase, self).setUp()
+        # Tests aren't monkey patched, make the client cooperate with the
+        # stub server running in the same process.
+        mock.patch.object(ovsdb_client, 'socket', green_socket).start()
+        self.addCleanup(mock.patch.stopall)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'db.sock')
+        self.server = StubOvsdbServer(path)
+        self.addCleanup(self.server.stop)
+        self.conn = ovsdb_client.Connection('unix:%s' % path, timeout=5)
+        self.conn.start()
+        self.addCleanup(self.conn.stop)
+
+    def test_initial_replica(self):
+        iface = self.conn.get_row('Interface', 'tap1')
+        self.assertEqual(5, iface['ofport'])
+        self.assertEqual('port-1', iface['external_ids']['iface-id'])
+        self.assertEqual([], self.conn.get_row('Port', 'tap1')['tag'])
+        self.assertEqual(iface, self.conn.get_row('Interface', IFACE_UUID))
+        self.assertEqual('br-int', self.conn.get_bridge_for_iface('tap1'))
+        self.assertEqual(['tap1'], self.conn.get_bridge_port_names('br-int'))
+
+    def test_monitor_update(self):
+        self.server.send_update({'Interface': {IFACE_UUID: {
+            'old': {'ofport': 5},
+            'new': {'name': 'tap1', 'ofport': 7,
+                    'external_ids': ['map', []]}}}})
+        self.conn.mark_stale()
+        self.assertEqual(7, self.conn.get_row('Interface', 'tap1')['ofport'])
+
+    def test_monitor_delete(self):
+        self.server.send_update({'Interface': {IFACE_UUID: {
+            'old': {'name': 'tap1'}}}})
+        self.conn.mark_stale()
+        self.assertIsNone(self.conn.get_row('Interface', 'tap1'))
+        self.assertIsNone(self.conn.get_bridge_for_iface('tap1'))
+
+    def test_transact_sends_all_operations_at_once(self):
+        operations = [
+            {'op': 'update', 'table': 'Port',
+             'where': [['name', '==', 'tap1']], 'row': {'tag': 10}},
+            {'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+             'mutations': [['next_cfg', '+=', 1]]},
+        ]
+        self.conn.transact(operations)
+        transacts = [r for r in self.server.requests
+                     if r['method'] == 'transact']
+        self.assertEqual(1, len(transacts))
+        self.assertEqual(['Open_vSwitch'] + operations,
+                         transacts[0]['params'])
+        self.assertEqual(10, self.conn.get_row('Port', 'tap1')['tag'])
+
+    def test_split_messages_are_reassembled(self):
+        update = json.dumps({'id': None, 'method': 'update',
+                             'params': [None, {'Port': {PORT_UUID: {
+                                 'new': {'name': 'tap1', 'tag': 3,
+                                         'interfaces': ['uuid',
+                                                        IFACE_UUID]}}}}]})
+        half = len(update) // 2
+        self.server.client.sendall(update[:half])
+        eventlet.sleep(0.01)
+        self.server.client.sendall(update[half:])
+        self.conn.mark_stale()
+        self.assertEqual(3, self.conn.get_row('Port', 'tap1')['tag'])
@@ -0,0 +1,75 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import async_process
+from neutron.agent.linux import ovsdb_monitor
+from neutron.openstack.common import jsonutils
+from neutron.tests import base
+
+HEADINGS = ['row', 'action', 'name', 'ofport', 'external_ids']
+
+EXTERNAL_IDS = ['map', [['attached-mac', 'fa:16:3e:00:00:01'],
+                        ['iface-id', 'port-1']]]
+
+
+def _output(*rows):
+    return jsonutils.dumps({'headings': HEADINGS, 'data': list(rows)})
+
+
+class SimpleInterfaceMonitorEventsTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(SimpleInterfaceMonitorEventsTestCase, self).setUp()
+        self.monitor = ovsdb_monitor.SimpleInterfaceMonitor()
+        self.output = []
+        mock.patch.object(self.monitor, 'iter_stdout',
+                          side_effect=self._iter_stdout).start()
+        mock.patch.object(ovsdb_monitor.SimpleInterfaceMonitor, 'is_active',
+                          new_callable=mock.PropertyMock,
+                          return_value=True).start()
+        self.addCleanup(mock.patch.stopall)
+        # Events are only trusted after a first full scan
+        self.assertIsNone(self.monitor.get_events())
+
+    def _iter_stdout(self):
+        output, self.output = self.output, []
+        return iter(output)
+
+    def test_row_actions_are_mapped_to_events(self):
+        self.output = [
+            _output(['u1', 'insert', 'tap1', ['set', []], EXTERNAL_IDS]),
+            _output(['u1', 'old', ['set', []], ['set', []], ['set', []]],
+                    ['u1', 'new', 'tap1', 5, EXTERNAL_IDS]),
+            _output(['u1', 'delete', 'tap1', 5, EXTERNAL_IDS]),
+        ]
+        self.assertTrue(self.monitor.has_updates)
+        events = self.monitor.get_events()
+        self.assertEqual(['added', 'modified', 'removed'],
+                         [event for event, _device in events])
+        self.assertEqual([[], 5, 5],
+                         [device['ofport'] for _event, device in events])
+        self.assertEqual('port-1', events[1][1]['external_ids']['iface-id'])
+        self.assertEqual([], self.monitor.get_events())
+
+    def test_respawn_requires_full_scan(self):
+        with mock.patch.object(async_process.AsyncProcess, '_kill'):
+            self.monitor._kill()
+        self.output = [_output(['u1', 'initial', 'tap1', 5, EXTERNAL_IDS])]
+        self.assertIsNone(self.monitor.get_events())
+
+    def test_unparsable_output_requires_full_scan(self):
+        self.output = ['{"data": [']
+        self.assertIsNone(self.monitor.get_events())
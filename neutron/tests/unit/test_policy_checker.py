@@ -0,0 +1,139 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+
+import mock
+
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import policy as common_policy
+from neutron import policy
+from neutron.tests import base
+
+RULES = {
+    "context_is_admin": "role:admin",
+    "admin_or_owner": "rule:context_is_admin or tenant_id:%(tenant_id)s",
+    "admin_or_network_owner": "rule:context_is_admin or "
+                              "tenant_id:%(network:tenant_id)s",
+    "admin_only": "rule:context_is_admin",
+    "default": "rule:admin_or_owner",
+    "get_port": "rule:admin_or_owner or rule:admin_or_network_owner",
+    "get_port:binding:host_id": "rule:admin_only",
+    "get_port:queue_id": "rule:admin_or_network_owner",
+    "get_port:device_id": "tenant:%(missing)s",
+    "get_network": "http://policy.example.com/%(id)s",
+}
+
+NETWORK_OWNERS = {'net-1': 'tenant-a', 'net-2': 'tenant-b',
+                  'net-3': 'tenant-c'}
+
+ATTRIBUTES = ['id', 'binding:host_id', 'queue_id', 'device_id', 'name']
+
+
+def _context(tenant_id, roles=()):
+    return mock.Mock(**{'to_dict.return_value': {
+        'tenant_id': tenant_id, 'roles': list(roles),
+        'is_admin': 'admin' in roles}})
+
+
+class PolicyCheckerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(PolicyCheckerTestCase, self).setUp()
+        policy.reset()
+        common_policy.set_rules(common_policy.Rules.load_json(
+            jsonutils.dumps(RULES), 'default'))
+        self.addCleanup(policy.reset)
+        self.plugin = mock.Mock()
+        self.plugin.get_network.side_effect = (
+            lambda context, id, fields=None: {
+                'tenant_id': NETWORK_OWNERS[id]})
+        self.plugin.get_networks.side_effect = (
+            lambda context, filters=None, fields=None: [
+                {'id': id, 'tenant_id': NETWORK_OWNERS[id]}
+                for id in filters['id']])
+        manager = mock.patch('neutron.manager.NeutronManager.get_instance')
+        manager.start().return_value.plugin = self.plugin
+        mock.patch('neutron.context.get_admin_context').start()
+        self.addCleanup(mock.patch.stopall)
+        self.ports = [{'id': 'port-%d' % i,
+                       'tenant_id': ('tenant-a', 'tenant-b')[i % 2],
+                       'network_id': sorted(NETWORK_OWNERS)[i % 3],
+                       'binding:host_id': 'host', 'queue_id': None,
+                       'device_id': '', 'name': ''}
+                      for i in range(12)]
+
+    def _original_check(self, context, action, target,
+                        might_not_exist=False):
+        """Check with the policy engine, one rule tree per target."""
+        if might_not_exist and action not in common_policy._rules:
+            return True
+        return common_policy.check(*policy._prepare_check(
+            context, action, copy.deepcopy(target)))
+
+    def _assert_same_results(self, context):
+        expected = [port['id'] for port in self.ports
+                    if self._original_check(context, 'get_port', port)]
+        self.plugin.reset_mock()
+        checker = policy.Checker(context)
+        ports = checker.filter('get_port', copy.deepcopy(self.ports))
+        self.assertEqual(expected, [port['id'] for port in ports])
+        lookups = (self.plugin.get_network.call_count,
+                   self.plugin.get_networks.call_count)
+        for port in self.ports:
+            refused = [name for name in ATTRIBUTES
+                       if not self._original_check(
+                           context, 'get_port:%s' % name, port,
+                           might_not_exist=True)]
+            self.assertEqual(refused, checker.get_refused_attributes(
+                'get_port', ATTRIBUTES, copy.deepcopy(port)))
+        return ports, lookups
+
+    def test_owner(self):
+        ports, lookups = self._assert_same_results(_context('tenant-a'))
+        # tenant-a owns its ports and the ports on net-1
+        self.assertEqual(8, len(ports))
+
+    def test_admin(self):
+        ports, lookups = self._assert_same_results(
+            _context('tenant-x', ['admin']))
+        self.assertEqual(12, len(ports))
+        self.assertEqual((0, 0), lookups)
+
+    def test_network_owner_parents_loaded_once(self):
+        ports, lookups = self._assert_same_results(_context('tenant-c'))
+        self.assertEqual(4, len(ports))
+        self.assertEqual((0, 1), lookups)
+
+    def test_missing_target_field_fails_closed(self):
+        checker = policy.Checker(_context('tenant-a', ['admin']))
+        self.assertIn('device_id', checker.get_refused_attributes(
+            'get_port', ATTRIBUTES, self.ports[0]))
+
+    def test_http_rule_is_not_memoized(self):
+        networks = [{'id': id, 'tenant_id': 'tenant-a'}
+                    for id in sorted(NETWORK_OWNERS)]
+        with mock.patch.object(common_policy.urllib2, 'urlopen') as urlopen:
+            urlopen.side_effect = lambda url, data: mock.Mock(**{
+                'read.return_value': str(url.endswith('net-2'))})
+            expected = [network['id'] for network in networks
+                        if self._original_check(_context('tenant-a'),
+                                                'get_network', network)]
+            urlopen.reset_mock()
+            checker = policy.Checker(_context('tenant-a'))
+            self.assertEqual(['net-2'], expected)
+            self.assertEqual(expected, [
+                network['id'] for network in
+                checker.filter('get_network', networks)])
+            self.assertEqual(3, urlopen.call_count)
@@ -0,0 +1,138 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ovs_lib
+from neutron.openstack.common import jsonutils
+from neutron.services.qos.drivers import chinac_driver
+from neutron.tests import base
+
+QOS_UUID = 'qos-uuid'
+QUEUE_UUID = 'queue-uuid'
+
+POLICY = {'max_rate': '1000000', 'protocol': 'ip'}
+
+
+def _listing(queues):
+    qos = {'headings': ['_uuid', 'external_ids'],
+           'data': [[['uuid', QOS_UUID],
+                     ['map', [['top_queue_ref', '1']]]]]}
+    queue = {'headings': ['_uuid', 'external_ids', 'other_config'],
+             'data': queues}
+    return '%s\n%s\n' % (jsonutils.dumps(qos), jsonutils.dumps(queue))
+
+
+class ChinacQoSDriverTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(ChinacQoSDriverTestCase, self).setUp()
+        self.br = mock.Mock(spec=ovs_lib.OVSBridge)
+        self.br.get_port_name_list.return_value = ['eth1']
+        self.vif = mock.Mock(ofport=7)
+        self.br.get_vifs_by_ids.side_effect = (
+            lambda port_ids: dict((port_id, self.vif)
+                                  for port_id in port_ids))
+        queues = [
+            [['uuid', QUEUE_UUID],
+             ['map', [['port_id', 'port1'], ['ip_address', '10.0.0.2'],
+                      ['queue_ref', '1']]],
+             ['map', [['max-rate', '1000000'], ['min-rate', '1000000']]]],
+            # The default queue of the QoS isn't bound to any port
+            [['uuid', 'default-queue'], ['map', []], ['map', []]],
+        ]
+        self.br.run_vsctl.side_effect = [_listing(queues), '']
+        self.driver = chinac_driver.ChinacQoSDriver(self.br)
+        self.br.run_vsctl.reset_mock()
+        self.br.run_vsctl.side_effect = None
+        self.br.deferred.return_value = mock.MagicMock()
+
+    def test_index_rebuilt_from_single_listing(self):
+        self.assertEqual(QOS_UUID, self.driver.QOS_UUID)
+        self.assertEqual(1, self.driver.TOP_QUEUE_REF)
+        self.assertEqual({('port1', '10.0.0.2'): (QUEUE_UUID, 1, 7)},
+                         self.driver.queues)
+
+    def test_create_is_one_transaction(self):
+        self.br.run_vsctl.return_value = 'new-queue\n'
+        self.driver.create_qos_for_port(POLICY, 'port2', '10.0.0.3')
+        self.assertEqual(1, self.br.run_vsctl.call_count)
+        self.assertEqual(('new-queue', 2, 7),
+                         self.driver.queues[('port2', '10.0.0.3')])
+        self.br.add_flow.assert_called_once_with(
+            in_port=7, nw_src='10.0.0.3', proto='ip',
+            actions='set_queue:2,NORMAL', priority=65535)
+
+    def test_delete_is_one_transaction(self):
+        self.driver.delete_qos_for_port(POLICY, 'port1', '10.0.0.2')
+        self.br.run_vsctl.assert_called_once_with(
+            ['--', 'remove', 'qos', QOS_UUID, 'queues',
+             '1=%s' % QUEUE_UUID, '--', 'destroy', 'queue', QUEUE_UUID])
+        self.assertEqual({}, self.driver.queues)
+
+    def test_unchanged_update_does_not_touch_ovsdb(self):
+        deferred_br = mock.Mock()
+        self.driver.port_qos_updated(POLICY, 'port1', '10.0.0.2',
+                                     br=deferred_br)
+        self.assertFalse(self.br.run_vsctl.called)
+        self.assertTrue(deferred_br.add_flow.called)
+
+    def test_update_moves_flow_of_replugged_port(self):
+        self.vif.ofport = 9
+        self.driver.port_qos_updated(POLICY, 'port1', '10.0.0.2')
+        self.br.delete_flows.assert_called_once_with(
+            in_port=7, proto='ip', nw_src='10.0.0.2')
+        self.br.add_flow.assert_called_once_with(
+            in_port=9, nw_src='10.0.0.2', proto='ip',
+            actions='set_queue:1,NORMAL', priority=65535)
+        self.assertEqual((QUEUE_UUID, 1, 9),
+                         self.driver.queues[('port1', '10.0.0.2')])
+
+    def test_delete_of_replugged_port(self):
+        self.vif.ofport = 9
+        self.driver.delete_qos_for_port(POLICY, 'port1', '10.0.0.2')
+        self.assertEqual(
+            [mock.call(in_port=7, proto='ip', nw_src='10.0.0.2'),
+             mock.call(in_port=9, proto='ip', nw_src='10.0.0.2')],
+            sorted(self.br.delete_flows.call_args_list,
+                   key=lambda call: call[1]['in_port']))
+
+    def _deferred_br(self):
+        return self.br.deferred.return_value.__enter__.return_value
+
+    def _mapping(self, port_id, ip_address, max_rate):
+        return {'port_id': port_id, 'ip_address': ip_address,
+                'qos_id': 'qos', 'policy': {'max_rate': max_rate,
+                                            'protocol': 'ip'}}
+
+    def test_sync_unchanged_mappings_is_noop(self):
+        self.driver.sync_port_qos(
+            [self._mapping('port1', '10.0.0.2', '1000000')])
+        self.assertFalse(self.br.run_vsctl.called)
+        deferred_br = self._deferred_br()
+        self.assertFalse(deferred_br.add_flow.called)
+        self.assertFalse(deferred_br.delete_flows.called)
+
+    def test_sync_applies_deltas(self):
+        self.br.run_vsctl.return_value = 'new-queue\n'
+        self.driver.sync_port_qos(
+            [self._mapping('port2', '10.0.0.3', '2000000')])
+        deferred_br = self._deferred_br()
+        deferred_br.delete_flows.assert_called_once_with(
+            in_port=7, proto='ip', nw_src='10.0.0.2')
+        deferred_br.add_flow.assert_called_once_with(
+            in_port=7, nw_src='10.0.0.3', proto='ip',
+            actions='set_queue:2,NORMAL', priority=65535)
+        self.assertEqual(['new-queue'],
+                         [entry[0] for entry in self.driver.queues.values()])
@@ -71,6 +71,16 @@ class QoSServerRpcApiTestCase(base.BaseTestCase):
                        version=qos_agent_rpc.QOS_RPC_VERSION,
                        topic='fake_topic')])
 
+    def test_get_port_qos_mappings(self):
+        self.rpc.get_port_qos_mappings(None, ['fake-port'])
+        self.rpc.call.assert_has_calls(
+            [mock.call(None,
+                       {'args': {'port_ids': ['fake-port']},
+                        'method': 'get_port_qos_mappings',
+                        'namespace': None},
+                       version=qos_agent_rpc.QOS_SYNC_RPC_VERSION,
+                       topic='fake_topic')])
+
 
 class QoSAgentRpcTestCase(base.BaseTestCase):
     def setUp(self):
@@ -105,6 +115,15 @@ class QoSAgentRpcTestCase(base.BaseTestCase):
         self.agent.qos.delete_qos_for_port.assert_has_calls(
             [mock.call('fake-port')])
 
+    def test_sync_port_qos(self):
+        mappings = [{'port_id': 'fake-port', 'ip_address': '10.0.0.2',
+                     'qos_id': 'fake-qos', 'policy': self.fake_policy}]
+        self.agent.plugin_rpc.get_port_qos_mappings.return_value = mappings
+        self.agent.sync_port_qos(None, set(['fake-port']))
+        self.agent.plugin_rpc.get_port_qos_mappings.assert_called_once_with(
+            None, ['fake-port'])
+        self.agent.qos.sync_port_qos.assert_called_once_with(mappings)
+
 
 class FakeQoSNotifierApi(proxy.RpcProxy,
                          qos_agent_rpc.QoSAgentRpcApiMixin):
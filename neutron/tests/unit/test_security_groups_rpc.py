@@ -0,0 +1,86 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent import securitygroups_rpc as sg_rpc
+from neutron.tests import base
+
+
+def _port(port_id, device_owner, device_id=None):
+    return {'id': port_id, 'device': port_id, 'device_owner': device_owner,
+            'device_id': device_id}
+
+
+def _firewall(namespace=None):
+    firewall = mock.MagicMock()
+    firewall.namespace = namespace
+    firewall.ports = {}
+    firewall.prepare_port_filter.side_effect = (
+        lambda port: firewall.ports.__setitem__(port['id'], port))
+    firewall.remove_port_filter.side_effect = (
+        lambda port: firewall.ports.pop(port['id']))
+    return firewall
+
+
+class FakeSGAgent(sg_rpc.SecurityGroupAgentRpcMixin):
+
+    def __init__(self):
+        self.context = mock.Mock()
+        self.plugin_rpc = mock.Mock()
+        self.init_firewall()
+        self.firewall = _firewall()
+        self._use_enhanced_rpc = False
+
+
+class SecurityGroupAgentNamespaceTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(SecurityGroupAgentNamespaceTestCase, self).setUp()
+        driver = mock.patch.object(sg_rpc.iptables_firewall,
+                                   'OVSHybridIptablesFirewallDriver').start()
+        driver.side_effect = _firewall
+        self.addCleanup(mock.patch.stopall)
+        self.agent = FakeSGAgent()
+        self.ports = [_port('vm-1', 'compute:nova'),
+                      _port('gw-1', 'network:router_gateway', 'router-1'),
+                      _port('vm-2', 'compute:nova'),
+                      _port('gw-2', 'network:router_gateway', 'router-1'),
+                      _port('gw-3', 'network:router_gateway', 'router-2')]
+        self.agent.plugin_rpc.security_group_rules_for_devices.return_value = (
+            dict((port['id'], port) for port in self.ports))
+        self.agent.prepare_devices_filter([port['id'] for port in self.ports])
+
+    def test_one_defer_apply_per_namespace(self):
+        namespaces = self.agent.firewall_namespaces
+        self.assertEqual(['qrouter-router-1', 'qrouter-router-2'],
+                         sorted(namespaces))
+        for firewall, ports in [(self.agent.firewall, ['vm-1', 'vm-2']),
+                                (namespaces['qrouter-router-1'],
+                                 ['gw-1', 'gw-2']),
+                                (namespaces['qrouter-router-2'], ['gw-3'])]:
+            self.assertEqual(1, firewall.defer_apply.call_count)
+            self.assertEqual(ports, sorted(firewall.ports))
+        self.assertIs(namespaces['qrouter-router-1'],
+                      self.agent.firewall_router['gw-2'])
+
+    def test_namespace_without_filtered_ports_is_evicted(self):
+        self.agent.remove_devices_filter(['gw-1', 'vm-1', 'gw-3'])
+        self.assertEqual(['qrouter-router-1'],
+                         list(self.agent.firewall_namespaces))
+        self.assertEqual(['gw-2'], list(self.agent.firewall_router))
+        self.agent.remove_devices_filter(['gw-2'])
+        self.assertEqual({}, self.agent.firewall_namespaces)
+        self.assertEqual({}, self.agent.firewall_router)
+        self.assertEqual(['vm-2'], list(self.agent.firewall.ports))